@@ -0,0 +1,52 @@
+import random
+import sys
+import time
+from unittest.mock import Mock, MagicMock
+
+import click
+
+from routing_experiment.propagation import RandomRoutePicker
+from routing_experiment.route_storage import RouteStore
+
+
+# Stores routes which are hundreds of hops long, one segment per hop, and times the store operations that walk them.
+@click.command()
+@click.option("--hops", default=2000, help="length of the longest route")
+@click.option("--routes", default=2000, help="number of inserted routes")
+@click.option("--seed", default=0)
+def main(hops: int, routes: int, seed: int):
+    rnd = random.Random(seed)
+    store = RouteStore(0, MagicMock(), Mock(), True, True, lazy_distances=True)
+    lengths = [rnd.randint(1, hops) for _ in range(routes)] + [hops]
+    print(f"recursion limit: {sys.getrecursionlimit()}, longest route: {hops} hops")
+
+    with _timed("insert"):
+        for length in lengths:
+            store.insert(length, [1] * length, length)
+    with _timed("shortest_route"):
+        for length in lengths:
+            store.shortest_route(length)
+    with _timed("has_routes_starting_with"):
+        for length in lengths:
+            store.has_routes_starting_with([1] * length)
+    with _timed("random route"):
+        picker = RandomRoutePicker(1 / hops, rnd)
+        for _ in lengths:
+            picker.pick(store)
+    with _timed("remove_routes_starting_with"):
+        store.remove_routes_starting_with([1] * (hops // 2))
+
+
+class _timed:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        print(f"{self.name}: {time.perf_counter() - self.start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
-from .experiments import Experiment, Candidate, ExperimentRunner, init_experiment_runner
+from .experiments import Experiment, Candidate, ExperimentRunner, init_experiment_runner, apply_patch
+from .random_streams import RandomStreams
@@ -1,11 +1,15 @@
 import copy
-import random
+import pickle
 import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from typing import Callable, Optional
 
 import experimentation
 
 from .metering import MetricName, MetricValue
+from .random_streams import RandomStreams
 from . import plotting
 
 
@@ -16,12 +20,66 @@ class Candidate:
     def scrape_metrics(self, metrics: list[MetricName]) -> dict[MetricName, MetricValue]:
         raise Exception("not implemented")
 
+    def prepare_scrape(self, metrics: list[MetricName]) -> Callable[[], dict[MetricName, MetricValue]]:
+        # A picklable job computing the metrics of the current state, which may run in another process while the
+        # candidate continues. Candidates which cannot capture their state scrape right away.
+        return _ScrapedMetrics(self.scrape_metrics(metrics))
+
+    def close(self):
+        # releases the resources held by the candidate, e.g. processes, after the run
+        pass
+
+
+class _ScrapedMetrics:
+    def __init__(self, metrics: dict[MetricName, MetricValue]):
+        self.metrics = metrics
+
+    def __call__(self) -> dict[MetricName, MetricValue]:
+        return self.metrics
+
+
+def _run_scrape_job(job: bytes) -> dict[MetricName, MetricValue]:
+    return pickle.loads(job)()
+
 
 class Experiment:
     def __init__(self, candidates: dict[str, Candidate]):
         self.candidates = candidates
 
 
+class StoppingCriterion:
+    # A candidate has converged once every metric changed by less than epsilon over the last window scrapes. All
+    # candidates stop once the experiment ran for longer than the wall-clock budget.
+    def __init__(self, metrics: list[MetricName], epsilon: float, window: int, wall_clock_seconds: Optional[float]):
+        self.metrics = metrics
+        self.epsilon = epsilon
+        self.window = window
+        self.wall_clock_seconds = wall_clock_seconds
+
+    def converged(self, history: deque[dict[MetricName, MetricValue]]) -> bool:
+        if len(self.metrics) == 0 or len(history) < self.window:
+            return False
+        return all(
+            max(sample[metric] for sample in history) - min(sample[metric] for sample in history) < self.epsilon
+            for metric in self.metrics
+        )
+
+    def out_of_time(self, elapsed_seconds: float) -> bool:
+        return self.wall_clock_seconds is not None and elapsed_seconds > self.wall_clock_seconds
+
+
+def create_stopping_criterion(config) -> StoppingCriterion:
+    window = config["window"] if "window" in config else 5
+    if window < 2:
+        raise Exception(f"a convergence window needs at least two scrapes, not {window}")
+    return StoppingCriterion(
+        metrics=config["metrics"] if "metrics" in config else [],
+        epsilon=config["epsilon"] if "epsilon" in config else 0.001,
+        window=window,
+        wall_clock_seconds=config["wall_clock_seconds"] if "wall_clock_seconds" in config else None,
+    )
+
+
 class ExperimentRunner:
     def __init__(
             self,
@@ -41,28 +99,95 @@ class ExperimentRunner:
         self.steps: int = config["measurement"]["steps"]
         samples = config["measurement"]["samples"]
         self.scrape_interval: int = self.steps // samples
+        self.stopping: Optional[StoppingCriterion] = (
+            create_stopping_criterion(config["measurement"]["stopping"])
+            if "stopping" in config["measurement"]
+            else None
+        )
+        if self.stopping is not None:
+            self.metrics += [metric for metric in self.stopping.metrics if metric not in self.metrics]
+        # Candidates which stopped are no longer stepped or scraped, their last sample is repeated so that every
+        # sample still covers all candidates.
+        self.running: set[str] = set(experiment.candidates.keys())
+        self.histories: dict[str, deque[dict[MetricName, MetricValue]]] = {
+            name: deque(maxlen=self.stopping.window if self.stopping is not None else 1)
+            for name in experiment.candidates.keys()
+        }
+        self.started = time.perf_counter()
+        # With scrape workers, the metrics are computed in a process pool while the candidates continue. At most one
+        # pending scrape per worker is kept, then the runner waits for the oldest. Samples are emitted in order.
+        self.scrape_workers: int = (
+            config["measurement"]["scrape_workers"]
+            if "scrape_workers" in config["measurement"]
+            else 0
+        )
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pending_scrapes: deque[dict[str, Future]] = deque()
 
     def run(self):
-        for step in range(self.steps):
-            if step % self.scrape_interval == 0:
-                sample = self.scrape()
-                self.emit_sample(sample)
-            self.run_step()
-        sample = self.scrape()
-        self.emit_sample(sample)
+        self.started = time.perf_counter()
+        if self.scrape_workers > 0:
+            self.pool = ProcessPoolExecutor(self.scrape_workers)
+        try:
+            for step in range(self.steps):
+                if step % self.scrape_interval == 0:
+                    self.scrape()
+                    if len(self.running) == 0:
+                        break
+                self.run_step()
+            else:
+                self.scrape()
+            self._emit_samples(backlog=0)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            for candidate in self.experiment.candidates.values():
+                candidate.close()
         self.figure_maker.make_figures()
 
     def run_step(self):
-        for _, candidate in self.experiment.candidates.items():
-            candidate.run_step()
+        for name, candidate in self.experiment.candidates.items():
+            if name in self.running:
+                candidate.run_step()
 
     def scrape(self):
-        return {
-            "candidates": {
-                name: candidate.scrape_metrics(self.metrics)
-                for name, candidate in self.experiment.candidates.items()
-            },
-        }
+        scrape = {}
+        for name, candidate in self.experiment.candidates.items():
+            if name in self.running:
+                if self.pool is None:
+                    scrape[name] = Future()
+                    scrape[name].set_result(candidate.scrape_metrics(self.metrics))
+                else:
+                    # pickled before the candidate continues, the job may share state with it
+                    job = pickle.dumps(candidate.prepare_scrape(self.metrics), protocol=pickle.HIGHEST_PROTOCOL)
+                    scrape[name] = self.pool.submit(_run_scrape_job, job)
+        self.pending_scrapes.append(scrape)
+        self._emit_samples(backlog=self.scrape_workers)
+
+    def _emit_samples(self, backlog: int):
+        # emits the finished scrapes in order, waiting for the oldest while more than backlog are pending
+        while len(self.pending_scrapes) != 0:
+            scrape = self.pending_scrapes[0]
+            if len(self.pending_scrapes) <= backlog and not all(future.done() for future in scrape.values()):
+                return
+            self.pending_scrapes.popleft()
+            candidate_samples = {}
+            for name in self.experiment.candidates.keys():
+                if name in scrape:
+                    self.histories[name].append(scrape[name].result())
+                    self._check_stopping(name)
+                candidate_samples[name] = self.histories[name][-1]
+            self.emit_sample({
+                "candidates": candidate_samples,
+            })
+
+    def _check_stopping(self, name: str):
+        if self.stopping is None:
+            return
+        if self.stopping.converged(self.histories[name]) or self.stopping.out_of_time(
+                time.perf_counter() - self.started):
+            self.running.discard(name)
 
 
 def apply_patch(original: dict, patch: dict) -> dict:
@@ -76,13 +201,14 @@ def apply_patch(original: dict, patch: dict) -> dict:
 
 
 def _create_experiment(
-        candidate_creator_function: Callable[[dict, random.Random], Candidate],
-        rnd: random.Random,
+        candidate_creator_function: Callable[[dict, RandomStreams], Candidate],
+        streams: RandomStreams,
         candidate_configs: dict[str, dict],
 ) -> Experiment:
+    # every candidate draws from its own streams, named after the candidate
     return Experiment(
         candidates={
-            candidate_name: candidate_creator_function(candidate_config, rnd)
+            candidate_name: candidate_creator_function(candidate_config, streams.derive("candidate", candidate_name))
             for candidate_name, candidate_config in candidate_configs.items()
         },
     )
@@ -90,9 +216,9 @@ def _create_experiment(
 
 def init_experiment_runner(
         config: dict[str],
-        rnd: random.Random,
+        streams: RandomStreams,
         figure_folder: Optional[str],
-        candidate_creator_function: Callable[[dict, random.Random], Candidate],
+        candidate_creator_function: Callable[[dict, RandomStreams], Candidate],
 ):
     default_candidate_config = config["default_candidate_config"]
     candidate_configs = {
@@ -101,7 +227,7 @@ def init_experiment_runner(
     }
     experiment_runner = experimentation.ExperimentRunner(
         config=config,
-        experiment=_create_experiment(candidate_creator_function, rnd, candidate_configs),
+        experiment=_create_experiment(candidate_creator_function, streams, candidate_configs),
         figure_folder=figure_folder,
     )
     return experiment_runner
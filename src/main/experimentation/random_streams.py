@@ -0,0 +1,22 @@
+import hashlib
+import random
+from typing import Optional, Union
+
+PathElement = Union[str, int]
+
+
+class RandomStreams:
+    # Independent random number generators derived from one seed. Every generator is identified by a path, e.g.
+    # ("candidate", name, "node", 3, "propagation"), and seeded by a hash of the seed and the path. A generator
+    # therefore only depends on its own path and not on which other generators were created or used, or in which
+    # order, so candidates give the same results serially, in parallel or on their own.
+    def __init__(self, seed: Optional[int] = None, path: tuple[PathElement, ...] = ()):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self.path = path
+
+    def derive(self, *path: PathElement) -> 'RandomStreams':
+        return RandomStreams(self.seed, self.path + path)
+
+    def rnd(self, *path: PathElement) -> random.Random:
+        digest = hashlib.sha256(repr((self.seed,) + self.path + path).encode()).digest()
+        return random.Random(int.from_bytes(digest[:16], "big"))
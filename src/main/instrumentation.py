@@ -1,4 +1,3 @@
-import copy
 import time
 from collections import defaultdict
 
@@ -48,6 +47,8 @@ class Session:
         raise Exception("not implemented")
 
     def get(self, name) -> float:
+        if name not in self.after:
+            raise Exception(f"metric {name} not available")
         return self.after[name]
 
     def rate(self, sum_metric: str, count_metric: str) -> float:
@@ -74,7 +75,8 @@ class MeasurementReader:
             name: counter.value
             for name, counter in self.counters.items()
         }
-        before = copy.copy(self.before)
+        # a plain dict, so that sessions can be pickled
+        before = {name: self.before[name] for name in current}
         self.before = current
         return Session(before, current)
 
@@ -1,5 +1,4 @@
 import os
-import random
 from datetime import datetime
 from typing import Optional
 
@@ -32,10 +31,12 @@ def run(config: str, target: Optional[str]):
 
 
 def run_experiment(config: dict[str], target: Optional[str]):
-    rnd = random.Random()
+    streams = experimentation.RandomStreams(config["seed"] if "seed" in config else None)
+    # runs without a configured seed can be reproduced with the printed one
+    click.echo(f"seed: {streams.seed}")
     experiment_runner = experimentation.init_experiment_runner(
         config=config,
-        rnd=rnd,
+        streams=streams,
         figure_folder=target,
         candidate_creator_function=routing_experiment.create_candidate,
     )
@@ -1,6 +1,8 @@
+import heapq
+
 from routing_experiment import stacking, route_storage
 from routing_experiment.extendable_router import ExtendableRouter
-from routing_experiment.net import NodeId, Cost
+from routing_experiment.net import NodeId, Cost, PortNumber
 from routing_experiment.propagation import Propagator
 from routing_experiment.routing import Route
 
@@ -11,6 +13,13 @@ class RouteAdvertisement:
         self.target = target
 
 
+class RouteAdvertisementBatch:
+    # Several routes in one message. Each route is relative to the advertising node, which is reached via the
+    # origin of the datagram.
+    def __init__(self, entries: list[tuple[NodeId, Route, Cost]]):
+        self.entries = entries
+
+
 class SelfAdvertiser(ExtendableRouter.Task):
     def __init__(self, stack_engine: stacking.StackEngine, address: NodeId):
         self.address = address
@@ -42,19 +51,79 @@ class RouteAdvertiser(ExtendableRouter.Task):
     def execute(self):
         choice = self.propagator.pick(self.store, self.stack_engine.adapter)
         if choice is not None:
-            (_, target, route, cost) = choice
-            self._send_route_propagation(target, route, cost)
+            (port_num, target, route, cost) = choice
+            self._send_route_propagation(port_num, target, route, cost)
 
-    def _send_route_propagation(self, target: NodeId, route: Route, cost: Cost):
-        self.stack_engine.send_datagram(
-            datagram=stacking.Datagram(
-                origin=route,
-                payload=RouteAdvertisement(
-                    target=target,
-                    cost=cost,
-                ),
+    def _send_route_propagation(self, port_num: PortNumber, target: NodeId, route: Route, cost: Cost):
+        datagram = stacking.Datagram(
+            origin=route,
+            payload=RouteAdvertisement(
+                target=target,
+                cost=cost,
+            ),
+        )
+        if self.propagator.directed:
+            self.stack_engine.send_on_port(port_num, datagram)
+        else:
+            self.stack_engine.send_datagram(datagram)
+
+
+class BatchRouteAdvertiser(ExtendableRouter.Task):
+    def __init__(
+            self,
+            propagator: Propagator,
+            store: route_storage.RouteStore,
+            stack_engine: stacking.StackEngine,
+            batch_size: int,
+            selection: str,
+    ):
+        self.stack_engine = stack_engine
+        self.store = store
+        self.propagator = propagator
+        self.batch_size = batch_size
+        self.selection = selection
+
+    def execute(self):
+        if self.selection == "sample":
+            entries = self._sample_entries()
+        elif self.selection == "nearest":
+            entries = self._nearest_entries()
+        else:
+            raise Exception(f"unknown advertisement selection: {self.selection}")
+        if len(entries) != 0:
+            self.stack_engine.send_datagram(
+                datagram=stacking.Datagram(
+                    origin=[],
+                    payload=RouteAdvertisementBatch(entries),
+                )
             )
+
+    def _sample_entries(self) -> list[tuple[NodeId, Route, Cost]]:
+        # picks of the propagator, keeping the cheapest route per target
+        picked: dict[NodeId, tuple[Route, Cost]] = {}
+        for _ in range(self.batch_size):
+            choice = self.propagator.pick(self.store, self.stack_engine.adapter)
+            if choice is None:
+                continue
+            (_, target, route, cost) = choice
+            if target not in picked or cost < picked[target][1]:
+                picked[target] = (route, cost)
+        return [(target, route, cost) for target, (route, cost) in picked.items()]
+
+    def _nearest_entries(self) -> list[tuple[NodeId, Route, Cost]]:
+        self.store.ensure_distances()
+        targets = heapq.nsmallest(
+            self.batch_size,
+            self.store.nodes.keys(),
+            key=lambda node_id: self.store.nodes[node_id].distance,
         )
+        entries = []
+        for target in targets:
+            priced_route = self.store.shortest_route(target)
+            # reading one route may expire segments of the others
+            if priced_route is not None:
+                entries.append((target, priced_route.path, priced_route.cost))
+        return entries
 
 
 class AdvertisementHandler(ExtendableRouter.MessageHandler):
@@ -69,15 +138,60 @@ class AdvertisementHandler(ExtendableRouter.MessageHandler):
         self.auto_forward_propagations = auto_forward_propagations
 
     def handle(self, datagram: stacking.Datagram):
-        if self.store is not None:
-            incoming_port = datagram.origin[0]
-            port_cost = self.stack_engine.adapter.port_cost(incoming_port)
+        incoming_port = datagram.origin[0]
+        port_cost = self.stack_engine.adapter.port_cost(incoming_port)
+        if isinstance(datagram.payload, RouteAdvertisementBatch):
+            batch: RouteAdvertisementBatch = datagram.payload
+            payload = RouteAdvertisementBatch([
+                (target, route, cost + port_cost)
+                for target, route, cost in batch.entries
+            ])
+            if self.store is not None:
+                self.store.insert_many([
+                    (target, datagram.origin + route, cost)
+                    for target, route, cost in payload.entries
+                ])
+        else:
             advertisement: RouteAdvertisement = datagram.payload
-            advertisement.cost += port_cost
-            self.store.insert(
-                target=datagram.payload.target,
-                route=datagram.origin,
-                cost=datagram.payload.cost,
+            payload = RouteAdvertisement(
+                target=advertisement.target,
+                cost=advertisement.cost + port_cost,
             )
-        if self.auto_forward_propagations:
-            self.stack_engine.send_datagram(datagram)
+            if self.store is not None:
+                self.store.insert(
+                    target=payload.target,
+                    route=datagram.origin,
+                    cost=payload.cost,
+                )
+        # answers to searches are addressed to this node and end here
+        if self.auto_forward_propagations and datagram.destination is None:
+            self.stack_engine.send_datagram(
+                stacking.Datagram(
+                    payload=payload,
+                    origin=datagram.origin,
+                )
+            )
+
+
+def create_route_advertiser(
+        config,
+        propagator: Propagator,
+        store: route_storage.RouteStore,
+        stack_engine: stacking.StackEngine,
+) -> ExtendableRouter.Task:
+    batch_size = config["batch_size"] if "batch_size" in config else 1
+    if batch_size == 1:
+        return RouteAdvertiser(
+            propagator=propagator,
+            store=store,
+            stack_engine=stack_engine,
+        )
+    if propagator.directed:
+        raise Exception("batched advertisements are broadcast and cannot use a directed propagation strategy")
+    return BatchRouteAdvertiser(
+        propagator=propagator,
+        store=store,
+        stack_engine=stack_engine,
+        batch_size=batch_size,
+        selection=config["selection"] if "selection" in config else "sample",
+    )
@@ -0,0 +1,191 @@
+import copy
+import functools
+import random
+from collections import deque
+
+import instrumentation
+from routing_experiment import net, measurements
+from routing_experiment.net import NodeId, PortNumber
+
+# a port of a node, which sends the messages of one direction of a link
+PortId = tuple[NodeId, PortNumber]
+
+
+class Measurements:
+    def __init__(self, tracker: instrumentation.Tracker):
+        self.offered_transmission_count = tracker.get_counter(measurements.OFFERED_TRANSMISSION_COUNT)
+        self.dropped_transmission_count = tracker.get_counter(measurements.DROPPED_TRANSMISSION_COUNT)
+        self.queued_transmission_sum = tracker.get_counter(measurements.QUEUED_TRANSMISSION_SUM)
+        self.queue_sample_count = tracker.get_counter(measurements.QUEUE_SAMPLE_COUNT)
+
+
+class DropPolicy:
+    def admits(self, queue: '_PortQueue') -> bool:
+        raise Exception("not implemented")
+
+
+class DropTail(DropPolicy):
+    def __init__(self, queue_limit: int):
+        self.queue_limit = queue_limit
+
+    def admits(self, queue: '_PortQueue') -> bool:
+        return queue.backlog() < self.queue_limit
+
+
+class RandomEarlyDrop(DropPolicy):
+    # Drops arrivals with a probability which grows linearly between the thresholds of the average queue length. The
+    # average is an exponentially weighted moving average, so short bursts pass while lasting congestion is signalled
+    # early. The queue limit still applies. Both count only the backlog beyond the capacity left in the step.
+    def __init__(
+            self,
+            queue_limit: int,
+            min_threshold: float,
+            max_threshold: float,
+            max_probability: float,
+            weight: float,
+            rnd: random.Random,
+    ):
+        self.queue_limit = queue_limit
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.max_probability = max_probability
+        self.weight = weight
+        self.rnd = rnd
+
+    def admits(self, queue: '_PortQueue') -> bool:
+        backlog = queue.backlog()
+        queue.average_length += self.weight * (backlog - queue.average_length)
+        if backlog >= self.queue_limit or queue.average_length >= self.max_threshold:
+            return False
+        if queue.average_length < self.min_threshold:
+            return True
+        probability = (
+                self.max_probability
+                * (queue.average_length - self.min_threshold)
+                / (self.max_threshold - self.min_threshold)
+        )
+        return self.rnd.random() >= probability
+
+
+class _PortQueue:
+    def __init__(self, capacity: int):
+        self.messages = deque()
+        self.average_length = 0.0
+        # number of messages the port can still send in the current step
+        self.remaining_capacity = capacity
+
+    def backlog(self) -> int:
+        # the messages which have to wait for a later step, only these count against the queue limit
+        return max(0, len(self.messages) - self.remaining_capacity)
+
+
+class CongestedNetwork(net.Network):
+    # Every port sends at most capacity messages per step. Messages are queued at the sending port, the drop policy
+    # decides whether an arriving message still fits into the backlog beyond the capacity left in the step. The queues
+    # are drained in end_step, in rounds of one message per port, so messages sent while handling a message travel on
+    # in the same step as long as their port has capacity left. Messages beyond the capacity wait for the next step,
+    # messages queued on a failing link are dropped.
+    def __init__(self, node_count: int, tracker: instrumentation.Tracker, capacity: int, drop_policy: DropPolicy):
+        super().__init__(node_count, tracker)
+        self.congestion_measurements = Measurements(tracker)
+        self.capacity = capacity
+        self.drop_policy = drop_policy
+        self.queues: dict[PortId, _PortQueue] = {}
+        # ports with queued messages, each at most once
+        self._ready: deque[PortId] = deque()
+        self._ready_ports: set[PortId] = set()
+
+    def _send(self, sender_node_id: int, sender_port_num: int, message):
+        self._enqueue((sender_node_id, sender_port_num), copy.deepcopy(message))
+
+    def _send_many(self, sender_node_id: int, sender_port_nums: list[PortNumber], message):
+        # recipients share the payload as in Network._send_many
+        shared_message = copy.deepcopy(message)
+        for sender_port_num in sender_port_nums:
+            self._enqueue((sender_node_id, sender_port_num), copy.copy(shared_message))
+
+    def _enqueue(self, port_id: PortId, message):
+        self.congestion_measurements.offered_transmission_count.increase(1)
+        if port_id not in self.queues:
+            self.queues[port_id] = _PortQueue(self.capacity)
+        queue = self.queues[port_id]
+        if not self.drop_policy.admits(queue):
+            self.congestion_measurements.dropped_transmission_count.increase(1)
+            return
+        queue.messages.append(message)
+        if port_id not in self._ready_ports:
+            self._ready_ports.add(port_id)
+            self._ready.append(port_id)
+
+    def disconnect(self, node_id: NodeId, port_num: PortNumber) -> None:
+        port = self.nodes[node_id].ports[port_num]
+        for port_id in [(node_id, port_num), (port.target_node, port.target_port_num)]:
+            if port_id in self.queues:
+                self.congestion_measurements.dropped_transmission_count.increase(
+                    len(self.queues.pop(port_id).messages)
+                )
+        super().disconnect(node_id, port_num)
+
+    def end_step(self) -> None:
+        exhausted: list[PortId] = []
+        while len(self._ready) != 0:
+            port_id = self._ready.popleft()
+            self._ready_ports.discard(port_id)
+            # the queue is gone if its link failed
+            if port_id not in self.queues:
+                continue
+            queue = self.queues[port_id]
+            if queue.remaining_capacity == 0:
+                exhausted.append(port_id)
+                continue
+            queue.remaining_capacity -= 1
+            message = queue.messages.popleft()
+            if len(queue.messages) != 0:
+                self._ready_ports.add(port_id)
+                self._ready.append(port_id)
+            self._deliver(port_id, message)
+        for port_id in exhausted:
+            if port_id not in self._ready_ports:
+                self._ready_ports.add(port_id)
+                self._ready.append(port_id)
+        for queue in self.queues.values():
+            queue.remaining_capacity = self.capacity
+        self.congestion_measurements.queued_transmission_sum.increase(
+            sum(len(queue.messages) for queue in self.queues.values())
+        )
+        self.congestion_measurements.queue_sample_count.increase(2 * len(self.links))
+        super().end_step()
+
+    def _deliver(self, port_id: PortId, message):
+        node_id, port_num = port_id
+        port = self.nodes[node_id].ports[port_num]
+        adapter = self.adapters[port.target_node]
+        if adapter.handler is None:
+            raise Exception("no handler registered")
+        self.measurements.transmission_count.increase(1)
+        adapter.handler.handle(port.target_port_num, message)
+
+
+def create_drop_policy(config, rnd: random.Random) -> DropPolicy:
+    queue_limit = config["queue_limit"] if "queue_limit" in config else 64
+    policy = config["drop_policy"] if "drop_policy" in config else "drop_tail"
+    if policy == "drop_tail":
+        return DropTail(queue_limit)
+    if policy == "red":
+        return RandomEarlyDrop(
+            queue_limit=queue_limit,
+            min_threshold=config["min_threshold"] if "min_threshold" in config else queue_limit / 4,
+            max_threshold=config["max_threshold"] if "max_threshold" in config else queue_limit * 3 / 4,
+            max_probability=config["max_probability"] if "max_probability" in config else .1,
+            weight=config["weight"] if "weight" in config else .2,
+            rnd=rnd,
+        )
+    raise Exception(f"unknown drop policy: {policy}")
+
+
+def create_network_type(config, rnd: random.Random):
+    return functools.partial(
+        CongestedNetwork,
+        capacity=config["capacity"] if "capacity" in config else 16,
+        drop_policy=create_drop_policy(config, rnd),
+    )
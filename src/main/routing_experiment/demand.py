@@ -0,0 +1,138 @@
+import random
+from array import array
+from collections.abc import Mapping
+from typing import Iterator, Sequence
+
+from routing_experiment.net import NodeId
+
+
+class AliasTable:
+    # Walker's alias method: samples an index proportionally to its weight with one random number in O(1).
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = sum(weights)
+        self.probabilities = array("d", [1.0] * n)
+        self.aliases = array("l", range(n))
+        if total == 0:
+            return
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while len(small) != 0 and len(large) != 0:
+            less = small.pop()
+            more = large[-1]
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(large.pop())
+        # leftovers only differ from 1 by rounding errors
+        for i in small + large:
+            self.probabilities[i] = 1.0
+
+    def sample(self, rnd: random.Random) -> int:
+        position = rnd.random() * len(self.probabilities)
+        index = int(position)
+        if position - index < self.probabilities[index]:
+            return index
+        return self.aliases[index]
+
+
+class DemandMatrix:
+    def __init__(self, node_count: int):
+        self.node_count = node_count
+
+    def demand(self, source: NodeId, target: NodeId) -> float:
+        raise Exception("not implemented")
+
+    def sample_target(self, source: NodeId, rnd: random.Random) -> NodeId:
+        raise Exception("not implemented")
+
+    def sample_pair(self, rnd: random.Random) -> tuple[NodeId, NodeId]:
+        raise Exception("not implemented")
+
+    def row(self, source: NodeId) -> 'DemandRow':
+        return DemandRow(self, source)
+
+
+class DemandRow(Mapping):
+    # read-only view of the demand of one source, so that routers do not hold a copy of it
+    def __init__(self, matrix: DemandMatrix, source: NodeId):
+        self.matrix = matrix
+        self.source = source
+
+    def __getitem__(self, target: NodeId) -> float:
+        if not 0 <= target < self.matrix.node_count:
+            raise KeyError(target)
+        return self.matrix.demand(self.source, target)
+
+    def __len__(self) -> int:
+        return self.matrix.node_count
+
+    def __iter__(self) -> Iterator[NodeId]:
+        return iter(range(self.matrix.node_count))
+
+    def sample(self, rnd: random.Random) -> NodeId:
+        return self.matrix.sample_target(self.source, rnd)
+
+
+class RandomDemandMatrix(DemandMatrix):
+    # Independent uniformly distributed demand for every pair, kept in one array of doubles. The alias table of a row
+    # is built when its source samples the first time, so that no table per source is built up front.
+    def __init__(self, node_count: int, rnd: random.Random):
+        super().__init__(node_count)
+        self.demands = array("d", [0.0]) * (node_count * node_count)
+        for position in range(node_count * node_count):
+            self.demands[position] = rnd.random()
+        self._row_tables: dict[NodeId, AliasTable] = {}
+        self._source_table = AliasTable([
+            sum(self.demands[source * node_count:(source + 1) * node_count])
+            for source in range(node_count)
+        ])
+
+    def demand(self, source: NodeId, target: NodeId) -> float:
+        return self.demands[source * self.node_count + target]
+
+    def sample_target(self, source: NodeId, rnd: random.Random) -> NodeId:
+        if source not in self._row_tables:
+            self._row_tables[source] = AliasTable(self.demands[source * self.node_count:(source + 1) * self.node_count])
+        return self._row_tables[source].sample(rnd)
+
+    def sample_pair(self, rnd: random.Random) -> tuple[NodeId, NodeId]:
+        source = self._source_table.sample(rnd)
+        return source, self.sample_target(source, rnd)
+
+
+class PopularityDemandMatrix(DemandMatrix):
+    # every source demands a target according to the target's popularity, so one row serves all sources
+    def __init__(self, popularity: Sequence[float]):
+        super().__init__(len(popularity))
+        self.popularity = array("d", popularity)
+        self._table = AliasTable(self.popularity)
+
+    def demand(self, source: NodeId, target: NodeId) -> float:
+        return self.popularity[target]
+
+    def sample_target(self, source: NodeId, rnd: random.Random) -> NodeId:
+        return self._table.sample(rnd)
+
+    def sample_pair(self, rnd: random.Random) -> tuple[NodeId, NodeId]:
+        return int(rnd.random() * self.node_count), self._table.sample(rnd)
+
+
+def _zipf_popularity(node_count: int, exponent: float, rnd: random.Random) -> list[float]:
+    ranks = list(range(node_count))
+    rnd.shuffle(ranks)
+    return [1 / (rank + 1) ** exponent for rank in ranks]
+
+
+def create_demand_matrix(config, node_count: int, rnd: random.Random) -> DemandMatrix:
+    model = config["model"] if "model" in config else "random"
+    if model == "random":
+        return RandomDemandMatrix(node_count, rnd)
+    if model == "uniform":
+        return PopularityDemandMatrix([1.0] * node_count)
+    if model == "zipf":
+        exponent = config["exponent"] if "exponent" in config else 1.0
+        return PopularityDemandMatrix(_zipf_popularity(node_count, exponent, rnd))
+    raise Exception(f"unknown demand model: {model}")
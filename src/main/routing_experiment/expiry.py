@@ -0,0 +1,25 @@
+from typing import Optional
+
+from routing_experiment import route_storage
+from routing_experiment.extendable_router import ExtendableRouter
+
+
+class ExpirySweeper(ExtendableRouter.Task):
+    # Advances the time of a store with segment aging by one step per tick and checks the segments of a few nodes, so
+    # that segments which are never read again expire as well, without scanning the whole store at once.
+    def __init__(self, store: route_storage.RouteStore, nodes_per_tick: int):
+        self.store = store
+        self.nodes_per_tick = nodes_per_tick
+
+    def execute(self):
+        self.store.advance_time()
+        self.store.sweep(self.nodes_per_tick)
+
+
+def create_expiry_sweeper(config, store: route_storage.RouteStore) -> Optional[ExpirySweeper]:
+    if store.segment_ttl is None:
+        return None
+    return ExpirySweeper(
+        store=store,
+        nodes_per_tick=config["sweep_nodes_per_tick"] if "sweep_nodes_per_tick" in config else 4,
+    )
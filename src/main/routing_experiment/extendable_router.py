@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from typing import Optional
 
 from overrides import override
@@ -34,7 +35,7 @@ class ExtendableRouter(StackEngineRouter):
             stack_engine: stacking.StackEngine,
             scheduled_tasks: list[Task],
             message_handlers: dict[type, MessageHandler],
-            demand_map: dict[NodeId, float],
+            demand_map: Mapping[NodeId, float],
             auto_forward_propagations: bool,
             port_disconnected_tasks: list[PortDisconnectedTask],
             store: Optional[route_storage.RouteStore] = None,
@@ -58,17 +59,29 @@ class ExtendableRouter(StackEngineRouter):
     def receive_datagram(self, datagram: stacking.Datagram):
         self.message_handlers[type(datagram.payload)].handle(datagram)
 
+    # route and has_route are for metrics, they read the store without changing it
+
     def route(self, target: NodeId) -> Optional[Route]:
         if self.store is not None:
-            priced_route = self.store.shortest_route(target)
+            priced_route = self.store.fresh_route(target)
             if priced_route is not None:
                 return priced_route.path
         return None
 
     def has_route(self, target: NodeId) -> bool:
         if self.store is not None:
-            return self.store.has_route(target)
+            return self.store.fresh_route(target) is not None
         return False
 
     def demand(self, target) -> float:
         return self.demand_map[target]
+
+    def route_store_bytes(self) -> int:
+        if self.store is not None:
+            return self.store.footprint()
+        return 0
+
+    def stored_target_count(self) -> int:
+        if self.store is not None:
+            return len(self.store.nodes) - 1
+        return 0
@@ -0,0 +1,76 @@
+from collections.abc import Mapping
+from typing import Optional
+
+import instrumentation
+from routing_experiment import routing, net
+from routing_experiment.extendable_router import ExtendableRouter
+from routing_experiment.net import NodeId
+from routing_experiment.routing import Route
+
+
+class FrozenRouter(routing.Router):
+    # Snapshot of the shortest routes of a router, which can be pickled and evaluated away from the simulation. Only
+    # the shortest-path tree is kept: the predecessor of every target and the segment from it, the routes are joined
+    # from the segments when they are read.
+    def __init__(
+            self,
+            source: NodeId,
+            tree: dict[NodeId, tuple[NodeId, Route]],
+            store_bytes: int,
+            demand_map: Optional[Mapping[NodeId, float]],
+    ):
+        self.source = source
+        self.tree = tree
+        self.store_bytes = store_bytes
+        self.demand_map = demand_map
+
+    def tick(self) -> None:
+        raise Exception("frozen routers do not run")
+
+    def handler(self) -> net.Adapter.Handler:
+        raise Exception("frozen routers do not run")
+
+    def has_route(self, target: NodeId) -> bool:
+        return target == self.source or target in self.tree
+
+    def route(self, target: NodeId) -> Optional[Route]:
+        if not self.has_route(target):
+            return None
+        segments = []
+        node_id = target
+        while node_id != self.source:
+            node_id, segment = self.tree[node_id]
+            segments.append(segment)
+        route = []
+        for segment in reversed(segments):
+            route.extend(segment)
+        return route
+
+    def demand(self, target) -> float:
+        return self.demand_map[target]
+
+    def route_store_bytes(self) -> int:
+        return self.store_bytes
+
+    def stored_target_count(self) -> int:
+        return len(self.tree)
+
+
+def freeze_router(router: ExtendableRouter, demand_map: Optional[Mapping[NodeId, float]] = None) -> FrozenRouter:
+    # the segments are shared with the store, the snapshot has to be pickled before the router runs again
+    store = router.store
+    if store is None:
+        return FrozenRouter(None, {}, router.route_store_bytes(), demand_map)
+    # the routes as lookups would see them, without changing the store
+    tree = {
+        node_id: (predecessor, segment.path)
+        for node_id, (predecessor, segment) in store.fresh_tree().items()
+    }
+    return FrozenRouter(store.source, tree, router.route_store_bytes(), demand_map)
+
+
+def freeze_network(network: net.Network) -> net.Network:
+    # copy of the topology without handlers, enough to evaluate routes
+    frozen_network = net.Network(len(network.nodes), instrumentation.Tracker({}))
+    frozen_network.restore_topology(*network.export_topology())
+    return frozen_network
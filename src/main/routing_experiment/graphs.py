@@ -1,5 +1,7 @@
+import heapq
 import math
 import random
+from collections import deque
 from typing import Callable
 
 CostGraph = dict[int, dict[int, float]]
@@ -36,6 +38,40 @@ def distances(adj_lists: CostGraph) -> list[list[float]]:
     return dist
 
 
+def connected_components(adj_lists: CostGraph) -> list[int]:
+    # the component of every node, labeled by its smallest node, for graphs whose edges exist in both directions
+    labels = [-1 for _ in range(len(adj_lists))]
+    for start in range(len(adj_lists)):
+        if labels[start] != -1:
+            continue
+        labels[start] = start
+        frontier = [start]
+        while len(frontier) != 0:
+            for v in adj_lists[frontier.pop()].keys():
+                if labels[v] == -1:
+                    labels[v] = start
+                    frontier.append(v)
+    return labels
+
+
+def distance(adj_lists: CostGraph, source: int, target: int) -> float:
+    # Dijkstra from the source which stops once the target is settled
+    dist = {source: 0}
+    queue = [(0, source)]
+    while len(queue) != 0:
+        d, u = heapq.heappop(queue)
+        if u == target:
+            return d
+        if d > dist[u]:
+            continue
+        for v, cost in adj_lists[u].items():
+            alt = d + cost
+            if alt < dist.get(v, math.inf):
+                dist[v] = alt
+                heapq.heappush(queue, (alt, v))
+    return math.inf
+
+
 def generate_gilbert_graph(
         n: int,
         p: float, rnd: random.Random,
@@ -69,3 +105,40 @@ def generate_watts_strogatz_graph(n: int, k: int, beta: float, rnd: random.Rando
     return graph
 
 
+def partition_ldg(adj_lists: CostGraph, k: int) -> list[int]:
+    # Linear deterministic greedy streaming partitioning: the nodes are visited in breadth-first order and each one
+    # joins the partition holding most of its neighbors, weighted by the room left in the partition.
+    n = len(adj_lists)
+    capacity = math.ceil(n / k)
+    assignment = [-1] * n
+    sizes = [0] * k
+    for root in range(n):
+        if assignment[root] != -1:
+            continue
+        queue = deque([root])
+        visited = {root}
+        while len(queue) != 0:
+            node = queue.popleft()
+            neighbor_counts = [0] * k
+            for neighbor in adj_lists[node].keys():
+                if assignment[neighbor] != -1:
+                    neighbor_counts[assignment[neighbor]] += 1
+                if neighbor not in visited and assignment[neighbor] == -1:
+                    visited.add(neighbor)
+                    queue.append(neighbor)
+            partition = max(
+                (i for i in range(k) if sizes[i] < capacity),
+                key=lambda i: (neighbor_counts[i] * (1 - sizes[i] / capacity), -sizes[i]),
+            )
+            assignment[node] = partition
+            sizes[partition] += 1
+    return assignment
+
+
+def cut_edge_count(adj_lists: CostGraph, assignment: list[int]) -> int:
+    return sum(
+        1
+        for node, neighbors in adj_lists.items()
+        for neighbor in neighbors.keys()
+        if node < neighbor and assignment[node] != assignment[neighbor]
+    )
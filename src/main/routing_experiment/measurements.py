@@ -3,3 +3,28 @@ ROUTE_UPDATE_SECONDS_SUM = "route_update_seconds_sum"
 DISTANCE_UPDATE_SECONDS_SUM = "distance_update_seconds_sum"
 RECEIVED_ROUTE_LENGTH = "received_route_length"
 TRANSMISSION_COUNT = "transmission_count"
+LINK_FAILURE_COUNT = "link_failure_count"
+LINK_FAILURE_ADVERTISEMENT_COUNT = "link_failure_advertisement_count"
+DUPLICATE_LINK_FAILURE_ADVERTISEMENT_COUNT = "duplicate_link_failure_advertisement_count"
+SEARCH_TRANSMISSION_COUNT = "search_transmission_count"
+SUCCESSFUL_SEARCH_COUNT = "successful_search_count"
+SEARCH_CACHE_LOOKUP_COUNT = "search_cache_lookup_count"
+SEARCH_CACHE_HIT_COUNT = "search_cache_hit_count"
+DISTANCE_RECOMPUTE_COUNT = "distance_recompute_count"
+DISTANCE_RECOMPUTE_AVOIDED_COUNT = "distance_recompute_avoided_count"
+SUMMARY_TRANSMISSION_COUNT = "summary_transmission_count"
+SUMMARY_BYTE_COUNT = "summary_byte_count"
+DIRECTED_SEARCH_COUNT = "directed_search_count"
+SUMMARY_FALSE_POSITIVE_COUNT = "summary_false_positive_count"
+STEP_CPU_SECONDS_SUM = "step_cpu_seconds_sum"
+STEP_WALL_SECONDS_SUM = "step_wall_seconds_sum"
+DATAGRAM_SEND_COUNT = "datagram_send_count"
+DATAGRAM_LOSS_COUNT = "datagram_loss_count"
+TRANSMITTED_BYTE_COUNT = "transmitted_byte_count"
+OFFERED_TRANSMISSION_COUNT = "offered_transmission_count"
+DROPPED_TRANSMISSION_COUNT = "dropped_transmission_count"
+QUEUED_TRANSMISSION_SUM = "queued_transmission_sum"
+QUEUE_SAMPLE_COUNT = "queue_sample_count"
+EVICTED_SEGMENT_COUNT = "evicted_segment_count"
+EVICTED_TARGET_COUNT = "evicted_target_count"
+EXPIRED_SEGMENT_COUNT = "expired_segment_count"
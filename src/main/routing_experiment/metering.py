@@ -1,11 +1,106 @@
+import math
+import random
+from typing import Callable, Optional
+
+import numpy as np
+
 import instrumentation
 from experimentation.metering import MetricName
-from routing_experiment import net, measurements, graphs, routing
+from experimentation.random_streams import RandomStreams
+from routing_experiment import net, measurements, graphs, routing, route_validation, demand
 from routing_experiment.graphs import CostGraph
 from routing_experiment.net import NodeId, Cost
 from routing_experiment.routing import Route
 
 
+# pairs that actually contribute to a ratio before its standard error is trusted
+_MIN_EFFECTIVE_SAMPLES = 30
+
+
+class Estimation:
+    def __init__(
+            self,
+            min_samples: int,
+            max_samples: int,
+            target_error: float,
+            demand_matrix: demand.DemandMatrix,
+            rnd: random.Random,
+            streams: Optional[RandomStreams] = None,
+    ):
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.target_error = target_error
+        self.demand_matrix = demand_matrix
+        self.rnd = rnd
+        self.streams = streams
+        self.fork_count = 0
+
+    def fork(self) -> 'Estimation':
+        # an estimation with its own generator for one scrape. With streams the n-th fork always samples from the
+        # stream ("scrape", n), no matter whether the scrape runs right away or in another process.
+        if self.streams is not None:
+            rnd = self.streams.rnd("scrape", self.fork_count)
+        else:
+            rnd = random.Random(self.rnd.getrandbits(64))
+        self.fork_count += 1
+        return Estimation(
+            min_samples=self.min_samples,
+            max_samples=self.max_samples,
+            target_error=self.target_error,
+            demand_matrix=self.demand_matrix,
+            rnd=rnd,
+        )
+
+    def sample_pair(self, demanded: bool) -> tuple[NodeId, NodeId]:
+        if demanded:
+            return self.demand_matrix.sample_pair(self.rnd)
+        node_count = self.demand_matrix.node_count
+        return int(self.rnd.random() * node_count), int(self.rnd.random() * node_count)
+
+    def estimate(self, draw: Callable[[], tuple[float, float]], default: float) -> tuple[float, float]:
+        # ratio estimator sum(y) / sum(x), sampling in growing batches until the standard error is small enough
+        ys: list[float] = []
+        xs: list[float] = []
+        estimate, error = default, math.inf
+        while len(ys) < self.max_samples:
+            batch_size = self.min_samples if len(ys) == 0 else min(len(ys), self.max_samples - len(ys))
+            for _ in range(batch_size):
+                y, x = draw()
+                ys.append(y)
+                xs.append(x)
+            estimate, error = _ratio_estimate(ys, xs, default)
+            if error <= self.target_error:
+                break
+        return estimate, error
+
+
+def _ratio_estimate(ys: list[float], xs: list[float], default: float) -> tuple[float, float]:
+    n = len(ys)
+    sum_x = sum(xs)
+    if sum_x == 0:
+        return default, math.inf
+    if sum(1 for x in xs if x != 0) < _MIN_EFFECTIVE_SAMPLES:
+        return sum(ys) / sum_x, math.inf
+    ratio = sum(ys) / sum_x
+    mean_x = sum_x / n
+    residuals = sum((y - ratio * x) ** 2 for y, x in zip(ys, xs))
+    return ratio, math.sqrt(residuals / (n * (n - 1))) / mean_x
+
+
+def create_estimation(config, demand_matrix: demand.DemandMatrix, streams: RandomStreams) -> Optional[Estimation]:
+    if "estimation" not in config:
+        return None
+    estimation_config = config["estimation"]
+    return Estimation(
+        min_samples=estimation_config["min_samples"] if "min_samples" in estimation_config else 100,
+        max_samples=estimation_config["max_samples"] if "max_samples" in estimation_config else 10000,
+        target_error=estimation_config["target_error"] if "target_error" in estimation_config else 0.01,
+        demand_matrix=demand_matrix,
+        rnd=streams.rnd(),
+        streams=streams,
+    )
+
+
 class MetricsCalculator:
     def __init__(
             self,
@@ -13,38 +108,42 @@ class MetricsCalculator:
             routers: list[routing.Router],
             graph: CostGraph,
             measurement_session: instrumentation.Session,
+            estimation: Optional[Estimation] = None,
     ):
-        self.overall_demand = sum(
-            [
-                sum(
-                    [
-                        source_router.demand(target)
-                        for target in range(len(network.nodes))
-                    ]
-                )
-                for source_router in routers
-            ]
-        )
+        self.estimation = estimation
         self.measurement_session = measurement_session
         self.network = network
         self.routers = routers
         self.graph = graph
+        self._evaluation: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._distance_matrix: Optional[np.ndarray] = None
+        self._demand_matrix: Optional[np.ndarray] = None
+        self._components: Optional[list[int]] = None
+        self._pair_distances: dict[tuple[NodeId, NodeId], Cost] = {}
+        self._estimates: dict[str, tuple[float, float]] = {}
 
     def _calculate_metric(self, name) -> float:
         if name == "transmissions_per_node":
             return self.transmissions_per_node()
+        if self.estimation is not None:
+            if name in _ESTIMATED_METRICS:
+                return self._estimate(name)[0]
+            if name.endswith("_error") and name[:-len("_error")] in _ESTIMATED_METRICS:
+                return self._estimate(name[:-len("_error")])[1]
+        elif name.endswith("_error") and name[:-len("_error")] in _ESTIMATED_METRICS:
+            return 0
         if name == "routability":
             return self.routability()
         if name == "efficiency":
             return self.efficiency()
-        if name == "efficient_routability":
-            return self.routability() * self.efficiency()
         if name == "demanded_routability":
             return self.demanded_routability()
         if name == "demanded_efficiency":
             return self.demanded_efficiency()
+        if name == "efficient_routability":
+            return self._calculate_metric("routability") * self._calculate_metric("efficiency")
         if name == "demanded_efficient_routability":
-            return self.demanded_routability() * self.demanded_efficiency()
+            return self._calculate_metric("demanded_routability") * self._calculate_metric("demanded_efficiency")
         if name == "route_insertion_duration":
             return self.route_update_duration()
         if name == "distance_update_duration":
@@ -53,6 +152,95 @@ class MetricsCalculator:
             return self.propagated_route_length()
         if name == "route_failures":
             return self.route_failures()
+        if name == "link_failure_flood_cost":
+            return self.link_failure_flood_cost()
+        if name == "link_failure_advertisements_per_node":
+            return self.measurement_session.get(measurements.LINK_FAILURE_ADVERTISEMENT_COUNT) / len(
+                self.network.nodes)
+        if name == "duplicate_link_failure_advertisements":
+            return self.measurement_session.rate(
+                measurements.DUPLICATE_LINK_FAILURE_ADVERTISEMENT_COUNT,
+                measurements.LINK_FAILURE_ADVERTISEMENT_COUNT,
+            )
+        if name == "search_transmissions_per_successful_search":
+            return self.measurement_session.rate(
+                measurements.SEARCH_TRANSMISSION_COUNT,
+                measurements.SUCCESSFUL_SEARCH_COUNT,
+            )
+        if name == "search_cache_hit_rate":
+            return self.measurement_session.rate(
+                measurements.SEARCH_CACHE_HIT_COUNT,
+                measurements.SEARCH_CACHE_LOOKUP_COUNT,
+            )
+        if name == "distance_recomputes_per_node":
+            return self.measurement_session.get(measurements.DISTANCE_RECOMPUTE_COUNT) / len(self.network.nodes)
+        if name == "avoided_distance_recomputes_per_node":
+            return self.measurement_session.get(measurements.DISTANCE_RECOMPUTE_AVOIDED_COUNT) / len(
+                self.network.nodes)
+        if name == "summary_transmissions_per_node":
+            return self.measurement_session.get(measurements.SUMMARY_TRANSMISSION_COUNT) / len(self.network.nodes)
+        if name == "summary_bytes_per_node":
+            return self.measurement_session.get(measurements.SUMMARY_BYTE_COUNT) / len(self.network.nodes)
+        if name == "summary_false_positive_rate":
+            return self.measurement_session.rate(
+                measurements.SUMMARY_FALSE_POSITIVE_COUNT,
+                measurements.DIRECTED_SEARCH_COUNT,
+            )
+        if name == "bytes_transmitted":
+            return self.measurement_session.get(measurements.TRANSMITTED_BYTE_COUNT)
+        if name == "bytes_per_node":
+            return self.measurement_session.get(measurements.TRANSMITTED_BYTE_COUNT) / len(self.network.nodes)
+        if name == "bytes_per_transmission":
+            return self.measurement_session.rate(measurements.TRANSMITTED_BYTE_COUNT, measurements.TRANSMISSION_COUNT)
+        if name == "queue_length":
+            return self.measurement_session.rate(
+                measurements.QUEUED_TRANSMISSION_SUM,
+                measurements.QUEUE_SAMPLE_COUNT,
+            )
+        if name == "drop_rate":
+            return self.measurement_session.rate(
+                measurements.DROPPED_TRANSMISSION_COUNT,
+                measurements.OFFERED_TRANSMISSION_COUNT,
+            )
+        if name == "dropped_transmissions_per_node":
+            return self.measurement_session.get(measurements.DROPPED_TRANSMISSION_COUNT) / len(self.network.nodes)
+        if name == "transmissions_per_second":
+            return self.measurement_session.rate(
+                measurements.TRANSMISSION_COUNT,
+                measurements.STEP_WALL_SECONDS_SUM,
+            )
+        if name == "cpu_seconds_per_transmission":
+            return self.measurement_session.rate(
+                measurements.STEP_CPU_SECONDS_SUM,
+                measurements.TRANSMISSION_COUNT,
+            )
+        if name == "datagram_loss_rate":
+            return self.measurement_session.rate(
+                measurements.DATAGRAM_LOSS_COUNT,
+                measurements.DATAGRAM_SEND_COUNT,
+            )
+        if name == "route_store_bytes":
+            return self.route_store_bytes()
+        if name == "route_store_bytes_per_node":
+            return self.route_store_bytes() / len(self.network.nodes)
+        if name == "stored_targets_per_node":
+            return sum(router.stored_target_count() for router in self.routers) / len(self.network.nodes)
+        if name == "evicted_segments_per_insertion":
+            return self.measurement_session.rate(
+                measurements.EVICTED_SEGMENT_COUNT,
+                measurements.ROUTE_INSERTION_COUNT,
+            )
+        if name == "evicted_targets_per_insertion":
+            # evicting a target also evicts the targets only routed via it
+            return self.measurement_session.rate(
+                measurements.EVICTED_TARGET_COUNT,
+                measurements.ROUTE_INSERTION_COUNT,
+            )
+        if name == "expired_segments_per_insertion":
+            return self.measurement_session.rate(
+                measurements.EXPIRED_SEGMENT_COUNT,
+                measurements.ROUTE_INSERTION_COUNT,
+            )
         raise Exception(f"metric not supported: {name}")
 
     def _route_cost(self, source: NodeId, route: Route) -> Cost:
@@ -72,79 +260,145 @@ class MetricsCalculator:
             node = self.network.nodes[node].ports[port].target_node
         return node == target
 
+    def _estimate(self, name: str) -> tuple[float, float]:
+        if name not in self._estimates:
+            demanded = name.startswith("demanded_")
+            if name.endswith("routability"):
+                evaluate, default = self._sampled_routability, 0
+            else:
+                evaluate, default = self._sampled_efficiency, 1
+            self._estimates[name] = self.estimation.estimate(
+                draw=lambda: evaluate(*self.estimation.sample_pair(demanded)),
+                default=default,
+            )
+        return self._estimates[name]
+
+    def _connected(self, source: NodeId, target: NodeId) -> bool:
+        # the links work in both directions, so the components are labeled once per scrape
+        if self._components is None:
+            self._components = graphs.connected_components(self.graph)
+        return self._components[source] == self._components[target]
+
+    def _distance(self, source: NodeId, target: NodeId) -> Cost:
+        if (source, target) not in self._pair_distances:
+            self._pair_distances[(source, target)] = graphs.distance(self.graph, source, target)
+        return self._pair_distances[(source, target)]
+
+    def _sampled_routability(self, source: NodeId, target: NodeId) -> tuple[float, float]:
+        if not self._connected(source, target):
+            return 0, 0
+        if self.routers[source].has_route(target):
+            route = self.routers[source].route(target)
+            if self._route_correct(source, route, target):
+                return 1, 1
+        return 0, 1
+
+    def _sampled_efficiency(self, source: NodeId, target: NodeId) -> tuple[float, float]:
+        if self.routers[source].has_route(target):
+            route = self.routers[source].route(target)
+            if route is not None and self._route_correct(source, route, target):
+                return self._distance(source, target), self._route_cost(source, route)
+        return 0, 0
+
     def transmissions_per_node(self):
         return self.measurement_session.get(measurements.TRANSMISSION_COUNT) / len(self.network.nodes)
 
+    def _route_evaluation(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # one batch over the routes of all pairs, shared by every metric of the scrape
+        if self._evaluation is None:
+            node_count = len(self.network.nodes)
+            sources: list[NodeId] = []
+            targets: list[NodeId] = []
+            routes: list[Route] = []
+            for source, router in enumerate(self.routers):
+                for target in range(node_count):
+                    if router.has_route(target):
+                        route = router.route(target)
+                        if route is not None:
+                            sources.append(source)
+                            targets.append(target)
+                            routes.append(route)
+            batch = route_validation.RouteBatch(sources, targets, routes)
+            valid, cost = route_validation.evaluate(route_validation.Topology(self.network), batch)
+            routed_matrix = np.zeros((node_count, node_count), dtype=bool)
+            routed_matrix[batch.sources, batch.targets] = True
+            valid_matrix = np.zeros((node_count, node_count), dtype=bool)
+            valid_matrix[batch.sources, batch.targets] = valid
+            cost_matrix = np.zeros((node_count, node_count), dtype=np.float64)
+            cost_matrix[batch.sources, batch.targets] = cost
+            self._evaluation = routed_matrix, valid_matrix, cost_matrix
+        return self._evaluation
+
+    def _distances(self) -> np.ndarray:
+        if self._distance_matrix is None:
+            self._distance_matrix = route_validation.distances(self.graph)
+        return self._distance_matrix
+
+    def _demands(self) -> np.ndarray:
+        if self._demand_matrix is None:
+            demands = np.array(
+                [
+                    [
+                        source_router.demand(target)
+                        for target in range(len(self.network.nodes))
+                    ]
+                    for source_router in self.routers
+                ],
+                dtype=np.float64,
+            )
+            self._demand_matrix = demands / demands.sum()
+        return self._demand_matrix
+
     def route_failures(self):
-        total_failures = total_routable_pairs = 0
-        for source, _ in enumerate(self.network.nodes):
-            for target, _ in enumerate(self.network.nodes):
-                if self.routers[source].has_route(target):
-                    total_routable_pairs += 1
-                    route = self.routers[source].route(target)
-                    if not self._route_correct(source, route, target):
-                        total_failures += 1
+        routed, valid, _ = self._route_evaluation()
+        total_routable_pairs = int(routed.sum())
+        total_failures = total_routable_pairs - int(valid.sum())
         return total_failures / total_routable_pairs
 
     def routability(self):
-        total_supply = total_demand = 0
-        reachabilities = graphs.reachabilities(self.graph)
-        for source, _ in enumerate(self.network.nodes):
-            for target, _ in enumerate(self.network.nodes):
-                if reachabilities[source][target]:
-                    total_demand += 1
-                    if self.routers[source].has_route(target):
-                        route = self.routers[source].route(target)
-                        if self._route_correct(source, route, target):
-                            total_supply += 1
+        _, valid, _ = self._route_evaluation()
+        reachable = self._distances() != math.inf
+        total_demand = int(reachable.sum())
+        total_supply = int((reachable & valid).sum())
         return total_supply / total_demand
 
     def efficiency(self):
-        route_lengths = 0
-        node_distances = 0
-        distances = graphs.distances(self.graph)
-        for source in range(len(self.network.nodes)):
-            for target in range(len(self.network.nodes)):
-                if self.routers[source].has_route(target):
-                    route = self.routers[source].route(target)
-                    if route is not None:
-                        if self._route_correct(source, route, target):
-                            route_lengths += self._route_cost(source, route)
-                            node_distances += distances[source][target]
+        _, valid, cost = self._route_evaluation()
+        route_lengths = float(cost[valid].sum())
+        node_distances = float(self._distances()[valid].sum())
         if route_lengths == 0:
             return 1
         return node_distances / route_lengths
 
     def demanded_routability(self):
-        total_supply = total_demand = 0
-        reachabilities = graphs.reachabilities(self.graph)
-        for source, _ in enumerate(self.network.nodes):
-            for target, _ in enumerate(self.network.nodes):
-                if reachabilities[source][target]:
-                    demand = self.routers[source].demand(target) / self.overall_demand
-                    total_demand += demand
-                    if self.routers[source].has_route(target):
-                        route = self.routers[source].route(target)
-                        if self._route_correct(source, route, target):
-                            total_supply += demand
+        _, valid, _ = self._route_evaluation()
+        reachable = self._distances() != math.inf
+        demands = self._demands()
+        total_demand = float(demands[reachable].sum())
+        total_supply = float(demands[reachable & valid].sum())
         return total_supply / total_demand
 
     def demanded_efficiency(self):
-        route_lengths = 0
-        node_distances = 0
-        distances = graphs.distances(self.graph)
-        for source in range(len(self.network.nodes)):
-            for target in range(len(self.network.nodes)):
-                demand = self.routers[source].demand(target) / self.overall_demand
-                route = self.routers[source].route(target)
-                if route is not None:
-                    if self._route_correct(source, route, target):
-                        route_lengths += self._route_cost(source, route) * demand
-                        node_distances += distances[source][target] * demand
+        _, valid, cost = self._route_evaluation()
+        demands = self._demands()[valid]
+        route_lengths = float((cost[valid] * demands).sum())
+        node_distances = float((self._distances()[valid] * demands).sum())
         if route_lengths == 0:
             return 1
         return node_distances / route_lengths
 
+    def route_store_bytes(self) -> int:
+        return sum(
+            router.route_store_bytes()
+            for router in self.routers
+        )
+
+    def link_failure_flood_cost(self) -> float:
+        return self.measurement_session.rate(
+            measurements.LINK_FAILURE_ADVERTISEMENT_COUNT,
+            measurements.LINK_FAILURE_COUNT,
+        )
+
     def route_update_duration(self) -> float:
         return self.measurement_session.rate(measurements.ROUTE_UPDATE_SECONDS_SUM, measurements.ROUTE_INSERTION_COUNT)
 
@@ -172,10 +426,45 @@ def to_graph(network: net.Network) -> graphs.CostGraph:
     }
 
 
-def _create_metrics_calculator(network: net.Network, routers: list[routing.Router], measurement_session: instrumentation.Session):
+class ScrapeJob:
+    # The state a scrape needs, taken from a running candidate, which computes the metrics when called. It is pickled
+    # right away, so the candidate may continue while the metrics are computed in another process.
+    def __init__(
+            self,
+            network: net.Network,
+            routers: list[routing.Router],
+            measurement_session: instrumentation.Session,
+            estimation: Optional[Estimation],
+            metrics: list[MetricName],
+    ):
+        self.network = network
+        self.routers = routers
+        self.measurement_session = measurement_session
+        self.estimation = estimation
+        self.metrics = metrics
+
+    def __call__(self) -> dict[MetricName, float]:
+        return _create_metrics_calculator(
+            self.network,
+            self.routers,
+            self.measurement_session,
+            self.estimation,
+        ).scrape(self.metrics)
+
+
+_ESTIMATED_METRICS = {"routability", "efficiency", "demanded_routability", "demanded_efficiency"}
+
+
+def _create_metrics_calculator(
+        network: net.Network,
+        routers: list[routing.Router],
+        measurement_session: instrumentation.Session,
+        estimation: Optional[Estimation] = None,
+):
     return MetricsCalculator(
         measurement_session=measurement_session,
         network=network,
         routers=routers,
         graph=to_graph(network),
+        estimation=estimation,
     )
@@ -1,4 +1,6 @@
 import copy
+import time
+from collections import deque
 from typing import Optional
 
 import instrumentation
@@ -7,6 +9,8 @@ from . import measurements
 NodeId = int
 PortNumber = int
 Cost = float
+# a port as port number, target node, port number at the target node and cost
+ExportedPort = tuple[PortNumber, NodeId, PortNumber, Cost]
 
 
 class Adapter:
@@ -20,6 +24,10 @@ class Adapter:
     def send(self, port_num: PortNumber, message) -> None:
         raise Exception("not implemented")
 
+    def send_many(self, port_nums: list[PortNumber], message) -> None:
+        for port_num in port_nums:
+            self.send(port_num, message)
+
     def ports(self) -> list[PortNumber]:
         raise Exception("not implemented")
 
@@ -40,6 +48,8 @@ class Transmission:
 class Measurements:
     def __init__(self, tracker: instrumentation.Tracker):
         self.transmission_count = tracker.get_counter(measurements.TRANSMISSION_COUNT)
+        self.step_cpu_seconds = tracker.get_counter(measurements.STEP_CPU_SECONDS_SUM)
+        self.step_wall_seconds = tracker.get_counter(measurements.STEP_WALL_SECONDS_SUM)
 
 
 class Network:
@@ -64,6 +74,9 @@ class Network:
         def send(self, port_num: int, message):
             self.network._send(self.node_id, port_num, message)
 
+        def send_many(self, port_nums: list[PortNumber], message):
+            self.network._send_many(self.node_id, port_nums, message)
+
         def ports(self) -> list[int]:
             return list(self.network.nodes[self.node_id].ports.keys())
 
@@ -75,7 +88,8 @@ class Network:
 
     def __init__(self, node_count: int, tracker: instrumentation.Tracker):
         self.measurements = Measurements(tracker)
-        self._transmission_queue: list[Transmission] = []
+        self._transmission_queue: deque[Transmission] = deque()
+        self._processing_queue = False
         self.nodes = [
             Network.Node()
             for _ in range(node_count)
@@ -84,6 +98,10 @@ class Network:
             self.AdapterImpl(self, node)
             for node in range(node_count)
         ]
+        # every link once, by one of its ends, indexed so that links can be picked and removed in O(1)
+        self.links: list[tuple[NodeId, PortNumber]] = []
+        self._link_positions: dict[tuple[NodeId, PortNumber], int] = {}
+        self._step_started = (time.process_time(), time.perf_counter())
 
     def connect(self, node1: int, node2: int, forward_cost: Cost, backward_cost: Cost):
         n1 = self.nodes[node1]
@@ -94,14 +112,74 @@ class Network:
         n2.ports[pn2] = Network.Node.Port(node1, pn1, backward_cost)
         n1.next_port_num += 1
         n2.next_port_num += 1
+        self._link_positions[(node1, pn1)] = len(self.links)
+        self.links.append((node1, pn1))
+
+    def export_topology(self) -> tuple[list[list[ExportedPort]], list[PortNumber], list[tuple[NodeId, PortNumber]]]:
+        # the ports of every node, the next port numbers and the links as plain lists, see restore_topology
+        return (
+            [
+                [(port_num, port.target_node, port.target_port_num, port.cost) for port_num, port in node.ports.items()]
+                for node in self.nodes
+            ],
+            [node.next_port_num for node in self.nodes],
+            list(self.links),
+        )
+
+    def restore_topology(
+            self,
+            ports: list[list[ExportedPort]],
+            next_port_nums: list[PortNumber],
+            links: list[tuple[NodeId, PortNumber]],
+    ) -> None:
+        # Takes over the ports of another network without replaying its connects, which would renumber the ports of
+        # links that failed meanwhile. The order of the links is kept, so links fail as in the original network.
+        for node, node_ports, next_port_num in zip(self.nodes, ports, next_port_nums):
+            node.ports = {
+                port_num: Network.Node.Port(target_node, target_port_num, cost)
+                for port_num, target_node, target_port_num, cost in node_ports
+            }
+            node.next_port_num = next_port_num
+        self.links = list(links)
+        self._link_positions = {link: position for position, link in enumerate(self.links)}
 
     def disconnect(self, node_id: NodeId, port_num: PortNumber) -> None:
         other_node_id = self.nodes[node_id].ports[port_num].target_node
         reverse_port_num = self.nodes[node_id].ports[port_num].target_port_num
+        if (node_id, port_num) in self._link_positions:
+            self._remove_link((node_id, port_num))
+        else:
+            self._remove_link((other_node_id, reverse_port_num))
         del self.nodes[other_node_id].ports[reverse_port_num]
         del self.nodes[node_id].ports[port_num]
-        self.adapters[node_id].handler.on_disconnected(port_num)
-        self.adapters[other_node_id].handler.on_disconnected(reverse_port_num)
+        # nodes without a handler are only topology, e.g. in a replica of a partitioned network
+        if self.adapters[node_id].handler is not None:
+            self.adapters[node_id].handler.on_disconnected(port_num)
+        if self.adapters[other_node_id].handler is not None:
+            self.adapters[other_node_id].handler.on_disconnected(reverse_port_num)
+
+    def begin_step(self) -> None:
+        # Called once per simulation step, before the routers tick. The step is timed from here to end_step, so that
+        # link churn, scrapes and the steps of other candidates are not counted.
+        self._step_started = (time.process_time(), time.perf_counter())
+
+    def end_step(self) -> None:
+        # Called once per simulation step, after the routers ticked. Transmissions are delivered as they are sent, so
+        # only the process and wall-clock time of the step are recorded.
+        cpu_started, wall_started = self._step_started
+        self.measurements.step_cpu_seconds.increase(time.process_time() - cpu_started)
+        self.measurements.step_wall_seconds.increase(time.perf_counter() - wall_started)
+
+    def close(self) -> None:
+        # releases the resources of the transport, e.g. sockets, after the run
+        pass
+
+    def _remove_link(self, link: tuple[NodeId, PortNumber]):
+        position = self._link_positions.pop(link)
+        last_link = self.links.pop()
+        if last_link != link:
+            self.links[position] = last_link
+            self._link_positions[last_link] = position
 
     def _send(self, sender_node_id: int, sender_port_num: int, message):
         node = self.nodes[sender_node_id]
@@ -114,12 +192,35 @@ class Network:
         self._transmission_queue.append(transmission)
         self._process_queue()
 
+    def _send_many(self, sender_node_id: int, sender_port_nums: list[PortNumber], message):
+        # One deep copy detaches the message from the sender. The recipients get shallow copies of it, so they share
+        # the payload and must not modify it.
+        shared_message = copy.deepcopy(message)
+        node = self.nodes[sender_node_id]
+        for sender_port_num in sender_port_nums:
+            port = node.ports[sender_port_num]
+            self._transmission_queue.append(
+                Transmission(
+                    recipient_node_id=port.target_node,
+                    port_num=port.target_port_num,
+                    message=copy.copy(shared_message),
+                )
+            )
+        self._process_queue()
+
     def _process_queue(self):
-        while len(self._transmission_queue) != 0:
-            transmission = self._transmission_queue.pop(0)
-            adapter = self.adapters[transmission.recipient_node_id]
-            if adapter.handler is None:
-                raise Exception("no handler registered")
-            else:
-                self.measurements.transmission_count.increase(1)
-                adapter.handler.handle(transmission.port_num, transmission.message)
+        # transmissions sent while handling a transmission are only queued, so floods do not nest a call per hop
+        if self._processing_queue:
+            return
+        self._processing_queue = True
+        try:
+            while len(self._transmission_queue) != 0:
+                transmission = self._transmission_queue.popleft()
+                adapter = self.adapters[transmission.recipient_node_id]
+                if adapter.handler is None:
+                    raise Exception("no handler registered")
+                else:
+                    self.measurements.transmission_count.increase(1)
+                    adapter.handler.handle(transmission.port_num, transmission.message)
+        finally:
+            self._processing_queue = False
@@ -0,0 +1,170 @@
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Callable
+
+import instrumentation
+from routing_experiment import net, routing, frozen
+from routing_experiment.frozen import FrozenRouter
+from routing_experiment.net import NodeId, PortNumber, Cost
+
+# a message sent to a node of another partition: recipient, port of the recipient and message
+CrossTransmission = tuple[NodeId, PortNumber, object]
+# a change of the topology: ("disconnect", node, port) or ("connect", node1, node2, forward cost, backward cost)
+LinkOperation = tuple
+
+NetworkFactory = Callable[[instrumentation.Tracker, type[net.Network]], net.Network]
+
+
+class ReplicaNetwork(net.Network):
+    # network which records the changes of its links, so that they can be replayed on the replicas of the workers
+    def __init__(self, node_count: int, tracker: instrumentation.Tracker):
+        super().__init__(node_count, tracker)
+        self.operations: list[LinkOperation] = []
+
+    def connect(self, node1: int, node2: int, forward_cost: Cost, backward_cost: Cost):
+        super().connect(node1, node2, forward_cost, backward_cost)
+        self.operations.append(("connect", node1, node2, forward_cost, backward_cost))
+
+    def disconnect(self, node_id: NodeId, port_num: PortNumber) -> None:
+        super().disconnect(node_id, port_num)
+        self.operations.append(("disconnect", node_id, port_num))
+
+    def take_operations(self) -> list[LinkOperation]:
+        operations = self.operations
+        self.operations = []
+        return operations
+
+
+def apply_operations(network: net.Network, operations: list[LinkOperation]):
+    for operation in operations:
+        if operation[0] == "connect":
+            network.connect(*operation[1:])
+        elif operation[0] == "disconnect":
+            network.disconnect(*operation[1:])
+        else:
+            raise Exception(f"unknown link operation: {operation[0]}")
+
+
+class _OutboxHandler(net.Adapter.Handler):
+    # stands in for a node of another partition and collects the messages sent to it
+    def __init__(self, node_id: NodeId, outbox: list[CrossTransmission]):
+        self.node_id = node_id
+        self.outbox = outbox
+
+    def handle(self, port_num: PortNumber, message) -> None:
+        self.outbox.append((self.node_id, port_num, message))
+
+
+class _Worker:
+    # Runs the routers of one partition on a full replica of the topology. Messages to nodes of other partitions are
+    # collected and handed in at the start of the next step of their partition.
+    def __init__(
+            self,
+            network_factory: NetworkFactory,
+            router_factory: routing.RouterFactory,
+            owned_nodes: list[NodeId],
+    ):
+        self.counters: dict[str, instrumentation.Counter] = {}
+        tracker = instrumentation.Tracker(self.counters)
+        self.network = network_factory(tracker, net.Network)
+        self.outbox: list[CrossTransmission] = []
+        self.routers: dict[NodeId, routing.Router] = {}
+        for node_id in owned_nodes:
+            router = router_factory.create_router(self.network.adapters[node_id], node_id, tracker)
+            self.network.adapters[node_id].register_handler(router.handler())
+            self.routers[node_id] = router
+        for node_id, adapter in enumerate(self.network.adapters):
+            if node_id not in self.routers:
+                adapter.register_handler(_OutboxHandler(node_id, self.outbox))
+
+    def step(self, operations: list[LinkOperation], inbox: list[CrossTransmission]) -> list[CrossTransmission]:
+        apply_operations(self.network, operations)
+        self.network.begin_step()
+        for recipient, port_num, message in inbox:
+            # messages which were in flight on a link that failed meanwhile are lost
+            if port_num in self.network.nodes[recipient].ports:
+                self.network.adapters[recipient].handler.handle(port_num, message)
+        for router in self.routers.values():
+            router.tick()
+        self.network.end_step()
+        outbox = list(self.outbox)
+        self.outbox.clear()
+        return outbox
+
+    def freeze(self) -> tuple[dict[NodeId, FrozenRouter], dict[str, float]]:
+        return (
+            {node_id: frozen.freeze_router(router) for node_id, router in self.routers.items()},
+            {name: counter.value for name, counter in self.counters.items()},
+        )
+
+
+def _serve(
+        connection: Connection,
+        network_factory: NetworkFactory,
+        router_factory: routing.RouterFactory,
+        owned_nodes: list[NodeId],
+):
+    worker = _Worker(network_factory, router_factory, owned_nodes)
+    while True:
+        command = connection.recv()
+        if command[0] == "step":
+            connection.send(worker.step(command[1], command[2]))
+        elif command[0] == "freeze":
+            connection.send(worker.freeze())
+        elif command[0] == "stop":
+            connection.close()
+            return
+        else:
+            raise Exception(f"unknown worker command: {command[0]}")
+
+
+class PartitionedSimulation:
+    # Coordinates one worker process per partition. All workers step in parallel, the messages crossing partitions are
+    # exchanged between the steps.
+    def __init__(
+            self,
+            network_factory: NetworkFactory,
+            router_factory: routing.RouterFactory,
+            assignment: list[int],
+            partition_count: int,
+    ):
+        self.assignment = assignment
+        self.connections: list[Connection] = []
+        self.processes: list[multiprocessing.Process] = []
+        for partition in range(partition_count):
+            owned_nodes = [node_id for node_id, owner in enumerate(assignment) if owner == partition]
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve,
+                args=(worker_connection, network_factory, router_factory, owned_nodes),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.inboxes: list[list[CrossTransmission]] = [[] for _ in range(partition_count)]
+
+    def step(self, operations: list[LinkOperation]):
+        for connection, inbox in zip(self.connections, self.inboxes):
+            connection.send(("step", operations, inbox))
+        self.inboxes = [[] for _ in self.connections]
+        for connection in self.connections:
+            for transmission in connection.recv():
+                self.inboxes[self.assignment[transmission[0]]].append(transmission)
+
+    def freeze(self) -> tuple[dict[NodeId, FrozenRouter], dict[str, float]]:
+        routers: dict[NodeId, FrozenRouter] = {}
+        counter_values: dict[str, float] = {}
+        for connection in self.connections:
+            connection.send(("freeze",))
+        for connection in self.connections:
+            partition_routers, partition_counter_values = connection.recv()
+            routers.update(partition_routers)
+            for name, value in partition_counter_values.items():
+                counter_values[name] = counter_values.get(name, 0) + value
+        return routers, counter_values
+
+    def stop(self):
+        for connection, process in zip(self.connections, self.processes):
+            connection.send(("stop",))
+            process.join()
@@ -8,6 +8,9 @@ from routing_experiment.routing import Route
 
 
 class Propagator:
+    # directed propagators pick a route for the returned port only, other propagators for all neighbors
+    directed = False
+
     def pick(self, store: RouteStore, adapter: net.Adapter) -> Optional[tuple[PortNumber, NodeId, Route, Cost]]:
         raise Exception("not implemented")
 
@@ -18,7 +21,7 @@ class PortPicker:
 
 
 class RoutePicker:
-    def pick(self, store: RouteStore) -> tuple[NodeId, Route, Cost]:
+    def pick(self, store: RouteStore) -> Optional[tuple[NodeId, Route, Cost]]:
         raise Exception("not implemented")
 
 
@@ -31,7 +34,10 @@ class CompositePropagator(Propagator):
         port = self.port_picker.pick(adapter)
         if port is None:
             return None
-        target, route, cost = self.route_picker.pick(store)
+        picked = self.route_picker.pick(store)
+        if picked is None:
+            return None
+        target, route, cost = picked
         return port, target, route, cost
 
 
@@ -51,20 +57,30 @@ class RandomRoutePicker(RoutePicker):
         self.rnd = rnd
         self.cutoff_rate = cutoff_rate
 
-    def pick(self, store: RouteStore) -> tuple[NodeId, Route, Cost]:
+    def pick(self, store: RouteStore) -> Optional[tuple[NodeId, Route, Cost]]:
         return self._get_random_route(store)
 
-    def _get_random_route(self, store: RouteStore, source: NodeId = None) -> tuple[NodeId, Route, Cost]:
-        if source is None:
-            source = store.source
-        if len(store.nodes[source].edges) == 0:
-            return source, [], 0
-        if self.cutoff_rate > self.rnd.random():
-            return source, [], 0
-        successor = _pick_random(list(store.nodes[source].edges.keys()), self.rnd)
-        target, route_tail, tail_cost = self._get_random_route(store, successor)
-        edged_route = _pick_random(store.nodes[source].edges[successor].priced_routes, self.rnd)
-        return target, edged_route.path + route_tail, edged_route.cost + tail_cost
+    def _get_random_route(self, store: RouteStore) -> Optional[tuple[NodeId, Route, Cost]]:
+        # walk down the segment graph first, then pick the segments on the way back, from the last one to the first
+        walk = []
+        source = store.source
+        while len(store.nodes[source].edges) != 0 and self.cutoff_rate <= self.rnd.random():
+            successor = store.nodes[source].edges.random_key(self.rnd)
+            walk.append((source, successor))
+            source = successor
+        segments = []
+        cost = 0
+        for predecessor, successor in reversed(walk):
+            edged_route = _pick_random(store.nodes[predecessor].edges[successor].priced_routes, self.rnd)
+            if store.is_expired(edged_route):
+                # left to the expiry sweep, but not advertised as if it were fresh
+                return None
+            segments.append(edged_route.path)
+            cost = edged_route.cost + cost
+        route = []
+        for segment in reversed(segments):
+            route.extend(segment)
+        return source, route, cost
 
 
 class RandomRoutePropagator:
@@ -81,7 +97,7 @@ class ShortestRoutePicker(RoutePicker):
         self.rnd = rnd
 
     def pick(self, store: RouteStore) -> Optional[tuple[NodeId, Route, Cost]]:
-        target = _pick_random(list(store.nodes.keys()), self.rnd)
+        target = store.nodes.random_key(self.rnd)
         priced_route = store.shortest_route(target)
         if priced_route is None:
             return None
@@ -97,6 +113,74 @@ class ShortestRoutePropagator:
         )
 
 
+class DeltaPropagator(Propagator):
+    # Visits the ports in turn and advertises to each port a route which is new or has changed since it was last sent
+    # there. The store is scanned from a cursor per port, at most scan_limit targets per pick. When nothing has changed,
+    # a random known route is sent to the port every refresh_interval picks.
+    directed = True
+
+    def __init__(self, scan_limit: int, refresh_interval: int, rnd: random.Random):
+        self.scan_limit = scan_limit
+        self.refresh_interval = refresh_interval
+        self.rnd = rnd
+        self.pick_count = 0
+        self.sent: dict[PortNumber, dict[NodeId, Cost]] = {}
+        self.cursors: dict[PortNumber, int] = {}
+        self.last_sent_at: dict[PortNumber, int] = {}
+
+    def pick(self, store: RouteStore, adapter: net.Adapter) -> Optional[tuple[PortNumber, NodeId, Route, Cost]]:
+        ports = adapter.ports()
+        if len(ports) == 0:
+            return None
+        if len(self.sent) > len(ports):
+            self._forget_disconnected_ports(ports)
+        port = ports[self.pick_count % len(ports)]
+        self.pick_count += 1
+        if port not in self.sent:
+            self.sent[port] = {}
+            self.cursors[port] = 0
+            self.last_sent_at[port] = self.pick_count
+        target = self._find_changed_target(store, port)
+        if target is None:
+            if self.pick_count - self.last_sent_at[port] < self.refresh_interval:
+                return None
+            target = store.nodes.random_key(self.rnd)
+        priced_route = store.shortest_route(target)
+        if priced_route is None:
+            # expired on the way
+            return None
+        self.sent[port][target] = store.nodes[target].distance
+        self.last_sent_at[port] = self.pick_count
+        return port, target, priced_route.path, priced_route.cost
+
+    def _find_changed_target(self, store: RouteStore, port: PortNumber) -> Optional[NodeId]:
+        store.ensure_distances()
+        sent = self.sent[port]
+        targets = store.nodes.key_list
+        cursor = self.cursors[port]
+        for i in range(min(self.scan_limit, len(targets))):
+            target = targets[(cursor + i) % len(targets)]
+            if target not in sent or sent[target] != store.nodes[target].distance:
+                self.cursors[port] = (cursor + i + 1) % len(targets)
+                return target
+        self.cursors[port] = (cursor + self.scan_limit) % len(targets)
+        return None
+
+    def _forget_disconnected_ports(self, ports: list[PortNumber]):
+        for port in [port for port in self.sent.keys() if port not in ports]:
+            del self.sent[port]
+            del self.cursors[port]
+            del self.last_sent_at[port]
+
+    @classmethod
+    def create(cls, config, rnd: random.Random):
+        return DeltaPropagator(
+            scan_limit=config["scan_limit"] if "scan_limit" in config else 16,
+            refresh_interval=config["refresh_interval"] if "refresh_interval" in config else 10,
+            rnd=rnd,
+        )
+
+
 class AlternatingRoutePropagator(Propagator):
     def __init__(
             self,
@@ -134,6 +218,8 @@ def create_propagator(config, rnd: random.Random) -> Propagator:
         return ShortestRoutePropagator.create(config, rnd)
     if strategy == "alternate":
         return AlternatingRoutePropagator.create(config, rnd)
+    if strategy == "delta":
+        return DeltaPropagator.create(config, rnd)
     raise Exception(f"unknown propagation strategy: {strategy}")
 
 
@@ -1,31 +1,109 @@
-from routing_experiment import stacking, net, route_storage
+from collections import OrderedDict
+from typing import Hashable
+
+import instrumentation
+from routing_experiment import stacking, net, route_storage, measurements
 from routing_experiment.extendable_router import ExtendableRouter
+from routing_experiment.net import NodeId
+
+FailureId = tuple[NodeId, int]
 
 
 class LinkFailureAdvertisement:
-    pass
+    def __init__(self, failure_id: FailureId):
+        self.failure_id = failure_id
+
+
+class Measurements:
+    def __init__(self, tracker: instrumentation.Tracker):
+        self.link_failure_count = tracker.get_counter(measurements.LINK_FAILURE_COUNT)
+        self.link_failure_advertisement_count = tracker.get_counter(measurements.LINK_FAILURE_ADVERTISEMENT_COUNT)
+        self.duplicate_link_failure_advertisement_count = tracker.get_counter(
+            measurements.DUPLICATE_LINK_FAILURE_ADVERTISEMENT_COUNT)
+
+
+class SeenCache:
+    # Bounded set of recently seen keys. Entries expire ttl ticks after they were last seen, and the least recently
+    # seen entry is evicted when the capacity is exceeded.
+    def __init__(self, capacity: int, ttl: int):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.time = 0
+        self.entries: OrderedDict[Hashable, int] = OrderedDict()
+
+    def tick(self):
+        self.time += 1
+
+    def check_and_add(self, key: Hashable) -> bool:
+        while len(self.entries) != 0 and next(iter(self.entries.values())) + self.ttl <= self.time:
+            self.entries.popitem(last=False)
+        seen = key in self.entries
+        self.entries[key] = self.time
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return seen
+
+
+def create_seen_cache(config) -> SeenCache:
+    return SeenCache(
+        capacity=config["seen_cache_size"] if "seen_cache_size" in config else 1024,
+        ttl=config["seen_cache_ttl"] if "seen_cache_ttl" in config else 100,
+    )
 
 
 class LinkFailureAdvertiser(ExtendableRouter.PortDisconnectedTask):
-    def __init__(self, stack_engine: stacking.StackEngine):
+    def __init__(
+            self,
+            stack_engine: stacking.StackEngine,
+            address: NodeId,
+            seen_cache: SeenCache,
+            measurements: Measurements,
+    ):
+        self.measurements = measurements
+        self.seen_cache = seen_cache
+        self.address = address
         self.stack_engine = stack_engine
+        self.failure_count = 0
 
     def execute(self, port_num: net.PortNumber):
+        failure_id = (self.address, self.failure_count)
+        self.failure_count += 1
+        self.measurements.link_failure_count.increase(1)
+        self.seen_cache.check_and_add((failure_id, (port_num,)))
         advertisement = stacking.Datagram(
             payload=LinkFailureAdvertisement(
+                failure_id=failure_id,
             ),
             origin=[port_num],
         )
         self.stack_engine.send_datagram(advertisement)
 
 
-class LinkFailureAdvertisementHandler(ExtendableRouter.MessageHandler):
-    def __init__(self, stack_engine: stacking.StackEngine, store: route_storage.RouteStore):
+class LinkFailureAdvertisementHandler(ExtendableRouter.MessageHandler, ExtendableRouter.Task):
+    def __init__(
+            self,
+            stack_engine: stacking.StackEngine,
+            store: route_storage.RouteStore,
+            seen_cache: SeenCache,
+            measurements: Measurements,
+    ):
+        self.measurements = measurements
+        self.seen_cache = seen_cache
         self.store = store
         self.stack_engine = stack_engine
 
+    def execute(self):
+        self.seen_cache.tick()
+
     def handle(self, datagram: stacking.Datagram):
         advertisement: LinkFailureAdvertisement = datagram.payload
+        self.measurements.link_failure_advertisement_count.increase(1)
+        # Copies which arrive on other paths carry other routes to the failed link, which may match other stored
+        # routes, so only copies with the same route are duplicates.
+        if self.seen_cache.check_and_add((advertisement.failure_id, tuple(datagram.origin))):
+            self.measurements.duplicate_link_failure_advertisement_count.increase(1)
+            return
         route = datagram.origin
         if self.store.has_routes_starting_with(route):
             self.store.remove_routes_starting_with(route)
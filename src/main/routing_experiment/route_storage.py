@@ -1,7 +1,12 @@
 import bisect
 import copy
+import heapq
+import itertools
 import math
-from typing import Optional
+import random
+import sys
+from collections.abc import MutableMapping, Mapping
+from typing import Optional, TypeVar, Generic, Iterator
 
 import instrumentation
 from . import measurements
@@ -20,23 +25,98 @@ def is_prefix(short: Route, long: Route) -> bool:
     return short == long[:len(short)]
 
 
+# The following equal is_prefix(short, long[offset:]) and is_prefix(long[offset:], other) without copying the tail
+# of long, which keeps walks along long routes linear in the route length.
+def is_prefix_at(short: Route, long: Route, offset: int) -> bool:
+    return len(short) <= len(long) - offset and short == long[offset:offset + len(short)]
+
+
+def is_tail_prefix(long: Route, offset: int, other: Route) -> bool:
+    return len(long) - offset <= len(other) and long[offset:] == other[:len(long) - offset]
+
+
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+
+
+class _IndexedDict(MutableMapping, Generic[_K, _V]):
+    # Dict which also keeps its keys in a list, so that a random key is drawn without copying the keys. Every value
+    # carries the position of its key in the list in its slot attribute, so a key is removed in O(1) by moving the last
+    # key into its position.
+    def __init__(self):
+        self.entries: dict[_K, _V] = {}
+        self.key_list: list[_K] = []
+
+    def __repr__(self):
+        return repr(self.entries)
+
+    def __getitem__(self, key: _K) -> _V:
+        return self.entries[key]
+
+    def __setitem__(self, key: _K, value: _V):
+        if key in self.entries:
+            value.slot = self.entries[key].slot
+        else:
+            value.slot = len(self.key_list)
+            self.key_list.append(key)
+        self.entries[key] = value
+
+    def __delitem__(self, key: _K):
+        slot = self.entries.pop(key).slot
+        last_key = self.key_list.pop()
+        if slot != len(self.key_list):
+            self.key_list[slot] = last_key
+            self.entries[last_key].slot = slot
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __iter__(self) -> Iterator[_K]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def values(self):
+        return self.entries.values()
+
+    def items(self):
+        return self.entries.items()
+
+    def random_key(self, rnd: random.Random) -> _K:
+        return self.key_list[int(rnd.random() * len(self.key_list))]
+
+    def footprint(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.entries) + sys.getsizeof(self.key_list)
+
+
 class PricedRoute:
-    def __init__(self, path: Route, cost: Cost):
+    __slots__ = ("path", "cost", "refreshed")
+
+    def __init__(self, path: Route, cost: Cost, refreshed: int = 0):
         self.path = path
         self.cost = cost
+        # the store time at which the segment was last advertised
+        self.refreshed = refreshed
 
 
 class _Edge:
+    __slots__ = ("priced_routes", "slot")
+
     def __init__(self):
         self.priced_routes: list[PricedRoute] = []
+        self.slot = 0
 
     def __repr__(self):
         return str({"routes": [pr.path for pr in self.priced_routes]})
 
-    def insert_path(self, route: Route, cost: Cost):
+    def insert_path(self, route: Route, cost: Cost, refreshed: int = 0):
         bisect.insort_left(
             self.priced_routes,
-            PricedRoute(route, cost),
+            PricedRoute(route, cost, refreshed),
             key=lambda pr: pr.cost,
         )
 
@@ -48,12 +128,22 @@ class _Edge:
             return math.inf
         return self.priced_routes[0].cost
 
+    def footprint(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.priced_routes) + sum(
+            sys.getsizeof(priced_route) + sys.getsizeof(priced_route.path) + sys.getsizeof(priced_route.cost)
+            for priced_route in self.priced_routes
+        )
+
 
 class _Node:
+    __slots__ = ("distance", "predecessor", "edges", "slot", "last_used")
+
     def __init__(self, distance: Cost = math.inf, predecessor: Optional[NodeId] = None):
         self.distance: Cost = distance
         self.predecessor: Optional[NodeId] = predecessor
-        self.edges: dict[NodeId, _Edge] = {}
+        self.edges: _IndexedDict[NodeId, _Edge] = _IndexedDict()
+        self.slot = 0
+        self.last_used = 0
 
     def __repr__(self):
         return str({"edges": self.edges})
@@ -63,6 +153,53 @@ class _Node:
             self.edges[target] = _Edge()
         return self.edges[target]
 
+    def footprint(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.distance) + self.edges.footprint() + sum(
+            edge.footprint()
+            for edge in self.edges.values()
+        )
+
+
+def _join_segments(segments: list[PricedRoute]) -> PricedRoute:
+    # joins the segments collected from the target back to the source, from the source outwards
+    path = []
+    cost = 0
+    for segment in reversed(segments):
+        path.extend(segment.path)
+        cost = cost + segment.cost
+    return PricedRoute(path, cost)
+
+
+class EvictionPolicy:
+    # Orders the targets of a full store, the lowest ranked ones are evicted first.
+    needs_distances = False
+
+    def rank(self, target: NodeId, node: _Node):
+        raise Exception("not implemented")
+
+
+class CheapestTargets(EvictionPolicy):
+    # keeps the targets with the cheapest routes
+    needs_distances = True
+
+    def rank(self, target: NodeId, node: _Node) -> Cost:
+        return -node.distance
+
+
+class LeastRecentlyUsed(EvictionPolicy):
+    # keeps the targets which were advertised or asked for most recently
+    def rank(self, target: NodeId, node: _Node) -> int:
+        return node.last_used
+
+
+class LeastDemanded(EvictionPolicy):
+    # keeps the targets the node demands most
+    def __init__(self, demand_map: Mapping[NodeId, float]):
+        self.demand_map = demand_map
+
+    def rank(self, target: NodeId, node: _Node) -> float:
+        return self.demand_map[target]
+
 
 class RouteStore:
     def __init__(
@@ -72,73 +209,231 @@ class RouteStore:
             logger: logging.Logger,
             eliminate_cycles: bool,
             eliminate_cycles_eagerly: bool,
+            lazy_distances: bool = False,
+            max_routes_per_edge: Optional[int] = None,
+            max_targets: Optional[int] = None,
+            eviction_policy: Optional[EvictionPolicy] = None,
+            segment_ttl: Optional[int] = None,
     ):
+        # in lazy mode modifications only mark the distances as outdated, they are recomputed on the next read
+        self.lazy_distances = lazy_distances
+        # Bounds on the stored segments: every edge keeps its cheapest max_routes_per_edge segments, and when there are
+        # more than max_targets nodes besides the source, the lowest ranked ones are evicted after an insertion.
+        self.max_routes_per_edge = max_routes_per_edge
+        self.max_targets = max_targets
+        self.eviction_policy = eviction_policy if eviction_policy is not None else CheapestTargets()
+        # logical time of the last insertion or lookup of a target, for LRU eviction
+        self.clock = 0
+        # Segments expire segment_ttl steps after they were last advertised. The time is advanced by the expiry
+        # sweeper, expired segments are dropped when a route via them is read or when the sweeper passes them.
+        self.segment_ttl = segment_ttl
+        self.time = 0
+        self.sweep_position = 0
+        self.distances_outdated = False
         self.eliminate_cycles_eagerly = eliminate_cycles_eagerly
         self.eliminate_cycles = eliminate_cycles
         self.logger = logger
         self.measurements = _Measurements(tracker)
         self.source = source
-        self.nodes: dict[NodeId, _Node] = {
-            source: _Node(
-                distance=0,
-                predecessor=None,
-            )
-        }
+        self.nodes: _IndexedDict[NodeId, _Node] = _IndexedDict()
+        self.nodes[source] = _Node(
+            distance=0,
+            predecessor=None,
+        )
 
     def shortest_route(self, target: NodeId) -> Optional[PricedRoute]:
+        if self.segment_ttl is not None:
+            self._expire_route(target)
         if target not in self.nodes:
             return None
-        return copy.deepcopy(self._shortest_route_rec(target))
-
-    def _shortest_route_rec(self, target: NodeId) -> PricedRoute:
-        if target == self.source:
-            return PricedRoute([], 0)
-        pred = self.nodes[target].predecessor
-        pred_route = self.shortest_route(pred)
-        last_mile = self.nodes[pred].edges[target].priced_routes[0]
-        return PricedRoute(
-            path=pred_route.path + last_mile.path,
-            cost=pred_route.cost + last_mile.cost,
-        )
+        self.ensure_distances()
+        return _join_segments(self._tree_segments(target))
+
+    def _tree_segments(self, target: NodeId) -> list[PricedRoute]:
+        # the segments on the tree path from the target back to the source
+        segments = []
+        node_id = target
+        while node_id != self.source:
+            pred = self.nodes[node_id].predecessor
+            segments.append(self.nodes[pred].edges[node_id].priced_routes[0])
+            node_id = pred
+        return segments
+
+    def fresh_route(self, target: NodeId) -> Optional[PricedRoute]:
+        # read-only shortest_route from fresh_tree, which is built for every call, many lookups should freeze the tree
+        tree = self.fresh_tree()
+        if target != self.source and target not in tree:
+            return None
+        segments = []
+        node_id = target
+        while node_id != self.source:
+            node_id, segment = tree[node_id]
+            segments.append(segment)
+        return _join_segments(segments)
+
+    def fresh_tree(self) -> dict[NodeId, tuple[NodeId, PricedRoute]]:
+        # Read-only shortest-path tree over the segments which are not expired, the predecessor of every reachable
+        # target and the segment from it. Expired segments are skipped but not removed and the distances of the store
+        # are not recomputed, so reading does not change the simulation. While nothing on it is expired, this is the
+        # tree of the store, i.e. the routes the router uses.
+        if not self.distances_outdated:
+            tree = {
+                node_id: (node.predecessor, self.nodes[node.predecessor].edges[node_id].priced_routes[0])
+                for node_id, node in self.nodes.items()
+                if node_id != self.source
+            }
+            if not any(self.is_expired(segment) for _, segment in tree.values()):
+                return tree
+        return self._shortest_path_tree(skip_expired=True)[1]
+
+    def use_route(self, target: NodeId) -> Optional[PricedRoute]:
+        # shortest_route for a lookup on behalf of others, which counts as a use of the target
+        self._touch(target)
+        return self.shortest_route(target)
+
+    def _touch(self, target: NodeId):
+        if target in self.nodes:
+            self.clock += 1
+            self.nodes[target].last_used = self.clock
 
     def has_route(self, target: NodeId) -> bool:
+        # unreachable nodes are pruned on removal even in lazy mode, so this only needs the distances for expiry
+        if self.segment_ttl is not None:
+            self._expire_route(target)
         return target in self.nodes
 
-    def _store_route(self, source: NodeId, target: NodeId, route: Route, cost: Cost,
-                     modified_edges: list[tuple[NodeId, NodeId]]) -> None:
-        if self.eliminate_cycles:
-            if self.eliminate_cycles_eagerly:
-                if target == source:
-                    return
+    def advance_time(self):
+        self.time += 1
+
+    def is_expired(self, priced_route: PricedRoute) -> bool:
+        return self.segment_ttl is not None and priced_route.refreshed + self.segment_ttl <= self.time
+
+    def _expire_route(self, target: NodeId):
+        # drops the expired segments on the shortest route to target, until the shortest route has none
+        while target in self.nodes:
+            self.ensure_distances()
+            expired_edges = []
+            node_id = target
+            while node_id != self.source:
+                pred = self.nodes[node_id].predecessor
+                if self.is_expired(self.nodes[pred].edges[node_id].priced_routes[0]):
+                    expired_edges.append((pred, node_id))
+                node_id = pred
+            if len(expired_edges) == 0:
+                return
+            self._remove_expired_segments(expired_edges)
+
+    def sweep(self, node_count: int):
+        # checks the segments from the next node_count nodes in key order, continuing where the last sweep ended
+        expired_edges = []
+        for _ in range(min(node_count, len(self.nodes))):
+            self.sweep_position = (self.sweep_position + 1) % len(self.nodes.key_list)
+            node_id = self.nodes.key_list[self.sweep_position]
+            for successor, edge in self.nodes[node_id].edges.items():
+                if any(self.is_expired(priced_route) for priced_route in edge.priced_routes):
+                    expired_edges.append((node_id, successor))
+        if len(expired_edges) != 0:
+            self._remove_expired_segments(expired_edges)
+
+    def _remove_expired_segments(self, expired_edges: list[tuple[NodeId, NodeId]]):
+        for node_id, successor in expired_edges:
+            edges = self.nodes[node_id].edges
+            priced_routes = [
+                priced_route
+                for priced_route in edges[successor].priced_routes
+                if not self.is_expired(priced_route)
+            ]
+            self.measurements.expired_segment_count.increase(len(edges[successor].priced_routes) - len(priced_routes))
+            if len(priced_routes) == 0:
+                del edges[successor]
             else:
-                if target == self.source:
-                    return
-        if target == source:
-            return
-        if len(route) == 0:
-            if target != source:
-                raise Exception("route target contradiction")
-            # TODO back propagate new costs
+                edges[successor].update_paths(priced_routes)
+        if self.lazy_distances:
+            self._prune_unreachable_nodes()
+        with self.measurements.distance_update_seconds_sum:
+            self._update_distances(expired_edges)
+
+    def footprint(self) -> int:
+        # estimate of the bytes held by the stored segments and the shortest-path tree
+        return self.nodes.footprint() + sum(
+            node.footprint()
+            for node in self.nodes.values()
+        )
+
+    def export_segments(self) -> list[tuple[NodeId, list[tuple[NodeId, list[tuple[Route, Cost]]]]]]:
+        # the stored segments as plain lists, in the order of the keys, which the random picks depend on
+        segments = []
+        for node_id in self.nodes.key_list:
+            edges = self.nodes[node_id].edges
+            segments.append((node_id, [
+                (successor, [(priced_route.path, priced_route.cost) for priced_route in edges[successor].priced_routes])
+                for successor in edges.key_list
+            ]))
+        return segments
+
+    def restore_segments(self, segments: list[tuple[NodeId, list[tuple[NodeId, list[tuple[Route, Cost]]]]]]):
+        # replaces the stored segments by exported ones, the distances are derived again
+        self.nodes = _IndexedDict()
+        for node_id, edges in segments:
+            node = _Node()
+            for successor, priced_routes in edges:
+                edge = _Edge()
+                edge.update_paths([PricedRoute(list(path), cost, self.time) for path, cost in priced_routes])
+                node.edges[successor] = edge
+            self.nodes[node_id] = node
+        if self.source not in self.nodes:
+            raise Exception(f"segments of another store than the one of {self.source}")
+        # the snapshot may come from a store without the caps of this one
+        for node in self.nodes.values():
+            for edge in node.edges.values():
+                self._cap_segments(edge)
+        self._update_distances()
+        if self.max_targets is not None and len(self.nodes) - 1 > self.max_targets:
+            self._evict_targets()
 
-        # find known node on the route
+    def _find_known_segment(self, source: NodeId, route: Route, offset: int) -> Optional[tuple[NodeId, PricedRoute]]:
         for successor, edge in self.nodes[source].edges.items():
             for edge_route in edge.priced_routes:
-                if is_prefix(edge_route.path, route):
-                    self._store_route(
-                        source=successor,
-                        target=target,
-                        route=route[len(edge_route.path):],
-                        cost=cost - edge_route.cost,
-                        modified_edges=modified_edges,
-                    )
-                    return
+                if is_prefix_at(edge_route.path, route, offset):
+                    return successor, edge_route
+        return None
+
+    def _store_route(self, source: NodeId, target: NodeId, route: Route, cost: Cost,
+                     modified_edges: list[tuple[NodeId, NodeId]]) -> None:
+        offset = 0
+        while True:
+            if self.eliminate_cycles:
+                if self.eliminate_cycles_eagerly:
+                    if target == source:
+                        return
+                else:
+                    if target == self.source:
+                        return
+            if target == source:
+                return
+            if len(route) == offset:
+                if target != source:
+                    raise Exception("route target contradiction")
+                # TODO back propagate new costs
+
+            # find known node on the route
+            known_segment = self._find_known_segment(source, route, offset)
+            if known_segment is None:
+                break
+            successor, edge_route = known_segment
+            # advertising a route again refreshes the known segments on it
+            edge_route.refreshed = self.time
+            source = successor
+            offset += len(edge_route.path)
+            cost = cost - edge_route.cost
+        route = route[offset:]
 
         # insert path between source and target
         if target not in self.nodes[source].edges:
             if target not in self.nodes:
                 self.nodes[target] = _Node()
             self.nodes[source].edges[target] = _Edge()
-        self.nodes[source].edges[target].insert_path(route, cost)
+        self._insert_segment(self.nodes[source].edges[target], route, cost, self.time)
         modified_edges.append((source, target))
 
         # redirect prefixed routes via target
@@ -177,11 +472,26 @@ class RouteStore:
             remaining_cost = prefixed_edge_route.cost - cost
             if successor not in self.nodes[target].edges:
                 self.nodes[target].edges[successor] = _Edge()
-            self.nodes[target].edges[successor].insert_path(remaining_route, remaining_cost)
+            self._insert_segment(
+                self.nodes[target].edges[successor],
+                remaining_route,
+                remaining_cost,
+                prefixed_edge_route.refreshed,
+            )
         modified_edges.append((target, successor))
 
         return True
 
+    def _insert_segment(self, edge: _Edge, route: Route, cost: Cost, refreshed: int):
+        edge.insert_path(route, cost, refreshed)
+        self._cap_segments(edge)
+
+    def _cap_segments(self, edge: _Edge):
+        if self.max_routes_per_edge is not None and len(edge.priced_routes) > self.max_routes_per_edge:
+            # the segments are sorted by cost, the most expensive ones are dropped
+            self.measurements.evicted_segment_count.increase(len(edge.priced_routes) - self.max_routes_per_edge)
+            del edge.priced_routes[self.max_routes_per_edge:]
+
     def _find_prefixed_segments(self, route, source, successor):
         edge = self.nodes[source].edges[successor]
         prefixed_edge_routes = [
@@ -193,41 +503,130 @@ class RouteStore:
         return non_prefixed_edge_routes, prefixed_edge_routes
 
     def insert(self, target: NodeId, route: Route, cost: Cost):
-        route = copy.deepcopy(route)
-        self.measurements.received_route_length.increase(len(route))
-        self.measurements.route_insertion_count.increase(1)
+        self.insert_many([(target, route, cost)])
+
+    def insert_many(self, entries: list[tuple[NodeId, Route, Cost]]):
+        # stores all routes first and updates the distances once for all of them
         modified_edges: list[tuple[NodeId, NodeId]] = []
-        with self.measurements.route_update_seconds_sum:
-            self._store_route(self.source, target, route, cost, modified_edges)
+        for target, route, cost in entries:
+            route = copy.deepcopy(route)
+            self.measurements.received_route_length.increase(len(route))
+            self.measurements.route_insertion_count.increase(1)
+            with self.measurements.route_update_seconds_sum:
+                self._store_route(self.source, target, route, cost, modified_edges)
+            self._touch(target)
         with self.measurements.distance_update_seconds_sum:
             self._update_distances(modified_edges)
+        if self.max_targets is not None and len(self.nodes) - 1 > self.max_targets:
+            self._evict_targets()
+
+    def _evict_targets(self):
+        if self.eviction_policy.needs_distances and self.distances_outdated:
+            # lazy mode: rank by the outdated tree instead of recomputing it on every insertion into a full store
+            self._relax_outdated_distances()
+        node_count = len(self.nodes)
+        # The targets are evicted in the order of their rank, leaves before inner nodes of the same rank. The leading
+        # leaves are removed together, as no other target is routed via a leaf and the distances of the remaining
+        # targets stay valid. An inner node takes the targets that become unreachable along.
+        while len(self.nodes) - 1 > self.max_targets:
+            victims = heapq.nsmallest(
+                len(self.nodes) - 1 - self.max_targets,
+                (node_id for node_id in self.nodes.key_list if node_id != self.source),
+                key=lambda node_id: (
+                    self.eviction_policy.rank(node_id, self.nodes[node_id]),
+                    len(self.nodes[node_id].edges) != 0,
+                ),
+            )
+            leaves = list(itertools.takewhile(lambda node_id: len(self.nodes[node_id].edges) == 0, victims))
+            if len(leaves) != 0:
+                self._remove_nodes(leaves)
+                continue
+            self._remove_nodes(victims[:1])
+            self._prune_unreachable_nodes()
+            with self.measurements.distance_update_seconds_sum:
+                self._update_distances()
+        self.measurements.evicted_target_count.increase(node_count - len(self.nodes))
+
+    def _relax_outdated_distances(self):
+        # One pass over all segments, so that new targets get the cost of a route via the outdated tree. The distances
+        # stay marked as outdated and are recomputed on the next read.
+        for node in self.nodes.values():
+            for successor, edge in node.edges.items():
+                self.nodes[successor].distance = min(self.nodes[successor].distance, node.distance + edge.cost())
+
+    def _remove_nodes(self, node_ids: list[NodeId]):
+        removed = set(node_ids)
+        for node in self.nodes.values():
+            for successor in [successor for successor in node.edges.keys() if successor in removed]:
+                del node.edges[successor]
+        for node_id in node_ids:
+            del self.nodes[node_id]
+
+    def ensure_distances(self):
+        if self.distances_outdated:
+            self.distances_outdated = False
+            with self.measurements.distance_update_seconds_sum:
+                self._recompute_distances()
 
     def _update_distances(self, modified_edges: Optional[list[tuple[NodeId, NodeId]]] = None):
         if modified_edges is not None and len(modified_edges) == 0:
             return
-
-        # Dijkstra:
-        for i in self.nodes.keys():
-            self.nodes[i].predecessor = None
-            self.nodes[i].distance = math.inf
-        self.nodes[self.source].distance = 0
+        if self.lazy_distances:
+            if self.distances_outdated:
+                self.measurements.distance_recompute_avoided_count.increase(1)
+            self.distances_outdated = True
+            return
+        self._recompute_distances()
+
+    def _recompute_distances(self):
+        self.measurements.distance_recompute_count.increase(1)
+        distances, tree = self._shortest_path_tree(skip_expired=False)
+        for node_id, node in self.nodes.items():
+            node.distance = distances[node_id]
+            node.predecessor = tree[node_id][0] if node_id in tree else None
+        for node_id in [node_id for node_id, node in self.nodes.items() if node.distance == math.inf]:
+            del self.nodes[node_id]
+
+    def _shortest_path_tree(
+            self,
+            skip_expired: bool,
+    ) -> tuple[dict[NodeId, Cost], dict[NodeId, tuple[NodeId, PricedRoute]]]:
+        # Dijkstra over the cheapest segment of every edge, or the cheapest one which is not expired. Returns the
+        # distances and the predecessor of every reached target with the segment from it, without changing the store.
+        distances: dict[NodeId, Cost] = {node_id: math.inf for node_id in self.nodes.keys()}
+        distances[self.source] = 0
+        tree: dict[NodeId, tuple[NodeId, PricedRoute]] = {}
         queue: list[NodeId] = list(self.nodes.keys())
         explored: set[NodeId] = set()
         while len(queue) != 0:
-            u = min(queue, key=lambda nid: self.nodes[nid].distance)
+            u = min(queue, key=distances.__getitem__)
             queue.remove(u)
             explored.add(u)
-            for v in self.nodes[u].edges.keys():
+            for v, edge in self.nodes[u].edges.items():
                 if v not in explored:
-                    alt = self.nodes[u].distance + self.nodes[u].edges[v].cost()
-                    if alt < self.nodes[v].distance:
-                        self.nodes[v].predecessor = u
-                        self.nodes[v].distance = alt
-        self.nodes = {
-            node_id: node
-            for node_id, node in self.nodes.items()
-            if node.distance != math.inf
-        }
+                    # the segments are sorted by cost
+                    segment = next(
+                        (segment for segment in edge.priced_routes if not skip_expired or not self.is_expired(segment)),
+                        None,
+                    )
+                    if segment is None:
+                        continue
+                    alt = distances[u] + segment.cost
+                    if alt < distances[v]:
+                        distances[v] = alt
+                        tree[v] = (u, segment)
+        return distances, tree
+
+    def _prune_unreachable_nodes(self):
+        reachable = {self.source}
+        frontier = [self.source]
+        while len(frontier) != 0:
+            for successor in self.nodes[frontier.pop()].edges.keys():
+                if successor not in reachable:
+                    reachable.add(successor)
+                    frontier.append(successor)
+        for node_id in [node_id for node_id in self.nodes.keys() if node_id not in reachable]:
+            del self.nodes[node_id]
 
     def _route_exists(self, source: NodeId, route: Route) -> bool:
         for successor, edge in self.nodes[source].edges.items():
@@ -237,45 +636,47 @@ class RouteStore:
         return False
 
     def remove_routes_starting_with(self, route: Route):
-        self._remove_routes_starting_with_rec(
-            source=self.source,
-            route=route,
-        )
+        source = self.source
+        offset = 0
+        while True:
+            for successor, edge in self.nodes[source].edges.items():
+                edge.priced_routes = [
+                    priced_route
+                    for priced_route in edge.priced_routes
+                    if not is_tail_prefix(route, offset, priced_route.path)
+                ]
+            edges = self.nodes[source].edges
+            for successor in [successor for successor, edge in edges.items() if not any(edge.priced_routes)]:
+                del edges[successor]
+
+            # find known node on the route
+            known_segment = self._find_known_segment(source, route, offset)
+            if known_segment is None:
+                break
+            successor, edge_route = known_segment
+            source = successor
+            offset += len(edge_route.path)
+        if self.lazy_distances:
+            self._prune_unreachable_nodes()
         self._update_distances()
 
-    def _remove_routes_starting_with_rec(self, source: NodeId, route: Route):
-        for successor, edge in self.nodes[source].edges.items():
-            edge.priced_routes = [
-                priced_route
-                for priced_route in edge.priced_routes
-                if not is_prefix(route, priced_route.path)
-            ]
-        self.nodes[source].edges = {
-            successor: edge
-            for successor, edge in self.nodes[source].edges.items()
-            if any(edge.priced_routes)
-        }
-
-        # find known node on the route
-        for successor, edge in self.nodes[source].edges.items():
-            for edge_route in edge.priced_routes:
-                if is_prefix(edge_route.path, route):
-                    self._remove_routes_starting_with_rec(
-                        source=successor,
-                        route=route[len(edge_route.path):],
-                    )
-                    return
-
     def has_routes_starting_with(self, route: Route) -> bool:
-        return self._has_routes_starting_with_rec(self.source, route)
-
-    def _has_routes_starting_with_rec(self, source: NodeId, route: Route):
-        for successor, edge in self.nodes[source].edges.items():
-            for priced_route in edge.priced_routes:
-                if is_prefix(route, priced_route.path):
-                    return True
-                if is_prefix(priced_route.path, route):
-                    return self._has_routes_starting_with_rec(successor, route[len(priced_route.path):])
+        source = self.source
+        offset = 0
+        while True:
+            next_step = None
+            for successor, edge in self.nodes[source].edges.items():
+                for priced_route in edge.priced_routes:
+                    if is_tail_prefix(route, offset, priced_route.path):
+                        return True
+                    if is_prefix_at(priced_route.path, route, offset):
+                        next_step = successor, offset + len(priced_route.path)
+                        break
+                if next_step is not None:
+                    break
+            if next_step is None:
+                return False
+            source, offset = next_step
 
 
 class _Measurements:
@@ -284,6 +685,11 @@ class _Measurements:
         self.route_update_seconds_sum = tracker.get_timer(measurements.ROUTE_UPDATE_SECONDS_SUM)
         self.distance_update_seconds_sum = tracker.get_timer(measurements.DISTANCE_UPDATE_SECONDS_SUM)
         self.received_route_length = tracker.get_counter(measurements.RECEIVED_ROUTE_LENGTH)
+        self.distance_recompute_count = tracker.get_counter(measurements.DISTANCE_RECOMPUTE_COUNT)
+        self.distance_recompute_avoided_count = tracker.get_counter(measurements.DISTANCE_RECOMPUTE_AVOIDED_COUNT)
+        self.evicted_segment_count = tracker.get_counter(measurements.EVICTED_SEGMENT_COUNT)
+        self.evicted_target_count = tracker.get_counter(measurements.EVICTED_TARGET_COUNT)
+        self.expired_segment_count = tracker.get_counter(measurements.EXPIRED_SEGMENT_COUNT)
 
 
 class Factory:
@@ -291,6 +697,47 @@ class Factory:
         self.eliminate_cycles_eagerly = False if "eliminate_cycles_eagerly" not in config else config[
             "eliminate_cycles_eagerly"]
         self.eliminate_cycles = False if "eliminate_cycles" not in config else config["eliminate_cycles"]
+        self.lazy_distances = False if "lazy_distances" not in config else config["lazy_distances"]
+        self.max_routes_per_edge = config["max_routes_per_edge"] if "max_routes_per_edge" in config else None
+        if self.max_routes_per_edge is not None and self.max_routes_per_edge < 1:
+            raise Exception("max_routes_per_edge must be at least 1")
+        self.max_targets = config["max_targets"] if "max_targets" in config else None
+        if self.max_targets is not None and self.max_targets < 0:
+            raise Exception("max_targets must not be negative")
+        # Which targets a full store evicts first. Evicting a target which other targets are routed via loses those
+        # targets as well, they count as evicted.
+        self.eviction = config["eviction"] if "eviction" in config else "cheapest"
+        if self.eviction not in ["cheapest", "lru", "least_demanded"]:
+            raise Exception(f"unknown eviction policy: {self.eviction}")
+        self.segment_ttl = config["segment_ttl"] if "segment_ttl" in config else None
+        if self.segment_ttl is not None and self.segment_ttl < 1:
+            raise Exception("segment_ttl must be at least 1")
+
+    def create_store(
+            self,
+            logger: logging.Logger,
+            source: NodeId,
+            tracker: instrumentation.Tracker,
+            demand_map: Optional[Mapping[NodeId, float]] = None,
+    ):
+        return RouteStore(
+            source,
+            tracker,
+            logger,
+            self.eliminate_cycles,
+            self.eliminate_cycles_eagerly,
+            self.lazy_distances,
+            max_routes_per_edge=self.max_routes_per_edge,
+            max_targets=self.max_targets,
+            eviction_policy=self._create_eviction_policy(demand_map),
+            segment_ttl=self.segment_ttl,
+        )
 
-    def create_store(self, logger: logging.Logger, source: NodeId, tracker: instrumentation.Tracker):
-        return RouteStore(source, tracker, logger, self.eliminate_cycles, self.eliminate_cycles_eagerly)
+    def _create_eviction_policy(self, demand_map: Optional[Mapping[NodeId, float]]) -> EvictionPolicy:
+        if self.eviction == "lru":
+            return LeastRecentlyUsed()
+        if self.eviction == "least_demanded":
+            if demand_map is None:
+                raise Exception("least_demanded eviction needs the demand of the node")
+            return LeastDemanded(demand_map)
+        return CheapestTargets()
@@ -0,0 +1,75 @@
+import itertools
+import math
+
+import numpy as np
+
+from routing_experiment import net
+from routing_experiment.graphs import CostGraph
+from routing_experiment.net import NodeId
+from routing_experiment.routing import Route
+
+
+class Topology:
+    # Ports of all nodes as flat arrays sorted by the key node * port_stride + port_num, so that a batch of
+    # (node, port) lookups becomes a single searchsorted.
+    def __init__(self, network: net.Network):
+        self.node_count = len(network.nodes)
+        self.port_stride = max([node.next_port_num for node in network.nodes], default=0) + 1
+        ports = [
+            (node_id * self.port_stride + port_num, port.target_node, port.cost)
+            for node_id, node in enumerate(network.nodes)
+            for port_num, port in node.ports.items()
+        ]
+        ports.sort()
+        self.keys = np.array([key for key, _, _ in ports], dtype=np.int64)
+        self.targets = np.array([target for _, target, _ in ports], dtype=np.int64)
+        self.costs = np.array([cost for _, _, cost in ports], dtype=np.float64)
+
+
+def distances(graph: CostGraph) -> np.ndarray:
+    # Floyd-Warshall with one vectorized relaxation per intermediate node
+    n = len(graph)
+    dist = np.full((n, n), math.inf)
+    for i in range(n):
+        for j, cost in graph[i].items():
+            dist[i, j] = cost
+    np.fill_diagonal(dist, 0)
+    for k in range(n):
+        np.minimum(dist, dist[:, k, np.newaxis] + dist[np.newaxis, k, :], out=dist)
+    return dist
+
+
+class RouteBatch:
+    def __init__(self, sources: list[NodeId], targets: list[NodeId], routes: list[Route]):
+        self.sources = np.array(sources, dtype=np.int64)
+        self.targets = np.array(targets, dtype=np.int64)
+        self.lengths = np.array([len(route) for route in routes], dtype=np.int64)
+        self.offsets = np.zeros(len(routes) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.offsets[1:])
+        self.hops = np.fromiter(itertools.chain.from_iterable(routes), dtype=np.int64, count=self.offsets[-1])
+
+
+def evaluate(topology: Topology, batch: RouteBatch) -> tuple[np.ndarray, np.ndarray]:
+    # Walks all routes of the batch in lockstep, one vectorized pass per hop. Returns per route whether it leads
+    # from its source to its target over existing ports, and its cost.
+    valid = np.ones(len(batch.sources), dtype=bool)
+    cost = np.zeros(len(batch.sources), dtype=np.float64)
+    node = batch.sources.copy()
+    max_length = batch.lengths.max(initial=0)
+    for hop in range(max_length):
+        active = np.flatnonzero(valid & (batch.lengths > hop))
+        port_num = batch.hops[batch.offsets[active] + hop]
+        key = node[active] * topology.port_stride + port_num
+        index = np.minimum(np.searchsorted(topology.keys, key), len(topology.keys) - 1)
+        found = (port_num >= 0) & (port_num < topology.port_stride)
+        if len(topology.keys) != 0:
+            found &= topology.keys[index] == key
+        else:
+            found[:] = False
+        valid[active[~found]] = False
+        active = active[found]
+        index = index[found]
+        cost[active] += topology.costs[index]
+        node[active] = topology.targets[index]
+    valid &= node == batch.targets
+    return valid, cost
@@ -24,6 +24,12 @@ class Router:
     def demand(self, target) -> float:
         raise Exception("not implemented")
 
+    def route_store_bytes(self) -> int:
+        raise Exception("not implemented")
+
+    def stored_target_count(self) -> int:
+        raise Exception("not implemented")
+
 
 class RouterFactory:
     def create_router(
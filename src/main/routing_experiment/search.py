@@ -1,16 +1,99 @@
-import bisect
+import math
 import random
+from typing import Optional
 
-from routing_experiment import route_storage, stacking
+import instrumentation
+from routing_experiment import route_storage, stacking, measurements, demand
 from routing_experiment.advertising import RouteAdvertisement
 from routing_experiment.extendable_router import ExtendableRouter
-from routing_experiment.net import NodeId, Cost
+from routing_experiment.net import NodeId, Cost, PortNumber
+from routing_experiment.recovery import SeenCache
+from routing_experiment.route_storage import PricedRoute
 from routing_experiment.routing import Route
+from routing_experiment.summaries import NeighborSummaries
+
+# the node which started a search and the number of searches it had started before
+SearchId = tuple[NodeId, int]
 
 
 class RouteSearchMessage:
-    def __init__(self, target: NodeId):
+    def __init__(
+            self,
+            target: NodeId,
+            hops_left: Optional[int] = None,
+            directed: bool = False,
+            search_id: Optional[SearchId] = None,
+    ):
         self.target = target
+        # number of hops the search may still travel, None for searches that are not hop-limited
+        self.hops_left = hops_left
+        # whether the search was only sent to neighbors whose summary may contain the target
+        self.directed = directed
+        # identifies the copies of a hop-limited search, so that every node handles only the first one
+        self.search_id = search_id
+
+
+class Measurements:
+    def __init__(self, tracker: instrumentation.Tracker):
+        self.search_transmission_count = tracker.get_counter(measurements.SEARCH_TRANSMISSION_COUNT)
+        self.successful_search_count = tracker.get_counter(measurements.SUCCESSFUL_SEARCH_COUNT)
+        self.search_cache_lookup_count = tracker.get_counter(measurements.SEARCH_CACHE_LOOKUP_COUNT)
+        self.search_cache_hit_count = tracker.get_counter(measurements.SEARCH_CACHE_HIT_COUNT)
+        self.directed_search_count = tracker.get_counter(measurements.DIRECTED_SEARCH_COUNT)
+        self.summary_false_positive_count = tracker.get_counter(measurements.SUMMARY_FALSE_POSITIVE_COUNT)
+
+
+class SearchCache:
+    # Remembers answers (positive entries carry the route, negative ones None) for ttl ticks, and the targets a
+    # search has been sent for during the last request_timeout ticks together with its hop budget.
+    def __init__(self, ttl: int, request_timeout: int):
+        self.ttl = ttl
+        self.request_timeout = request_timeout
+        self.time = 0
+        self.answers: dict[NodeId, tuple[int, Optional[PricedRoute]]] = {}
+        self.in_flight: dict[NodeId, tuple[int, float]] = {}
+
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def tick(self):
+        self.time += 1
+
+    def answer(self, target: NodeId) -> tuple[bool, Optional[PricedRoute]]:
+        if target in self.answers:
+            expires_at, priced_route = self.answers[target]
+            if expires_at > self.time:
+                return True, priced_route
+            del self.answers[target]
+        return False, None
+
+    def put_answer(self, target: NodeId, priced_route: Optional[PricedRoute]):
+        self.answers[target] = (self.time + self.ttl, priced_route)
+
+    def is_in_flight(self, target: NodeId, hops_left: Optional[int] = None) -> bool:
+        # a search only covers searches which do not reach further than itself
+        if target in self.in_flight:
+            sent_at, sent_hops_left = self.in_flight[target]
+            if sent_at + self.request_timeout > self.time:
+                return sent_hops_left >= _hop_budget(hops_left)
+            del self.in_flight[target]
+        return False
+
+    def put_in_flight(self, target: NodeId, hops_left: Optional[int] = None):
+        self.in_flight[target] = (self.time, _hop_budget(hops_left))
+
+
+def _hop_budget(hops_left: Optional[int]) -> float:
+    return math.inf if hops_left is None else hops_left
+
+
+class ExpandingRing:
+    # Searches start with a hop budget of initial_radius. A search that is unanswered after timeout ticks is
+    # repeated with twice the radius, until max_radius has been tried.
+    def __init__(self, initial_radius: int, max_radius: int, timeout: int):
+        self.initial_radius = initial_radius
+        self.max_radius = max_radius
+        self.timeout = timeout
 
 
 class Searcher(ExtendableRouter.MessageHandler, ExtendableRouter.Task):
@@ -19,28 +102,156 @@ class Searcher(ExtendableRouter.MessageHandler, ExtendableRouter.Task):
             store: route_storage.RouteStore,
             stacking_engine: stacking.StackEngine,
             rnd: random.Random,
-            demand_map: dict[NodeId, float],
+            demand_map: demand.DemandRow,
+            cache: SearchCache,
+            measurements: Measurements,
+            address: NodeId,
+            seen_cache: SeenCache,
+            ring: Optional[ExpandingRing] = None,
+            summaries: Optional[NeighborSummaries] = None,
     ):
-        self.demand_pairs, self.total_demand = self._prepare_demand_pairs(demand_map)
+        self.address = address
+        # the hop-limited searches this node has handled, independent of the answer cache
+        self.seen_cache = seen_cache
+        self.search_count = 0
+        self.summaries = summaries
+        self.ring = ring
+        self.demand_map = demand_map
         self.rnd = rnd
         self.stacking_engine = stacking_engine
         self.store = store
+        self.cache = cache
+        self.measurements = measurements
+        # searches started by this node which have not been answered yet, by the time they were sent and their radius
+        self.pending: dict[NodeId, tuple[int, Optional[int]]] = {}
+        # return routes of the searches of other nodes which wait for a search in flight from this node
+        self.waiters: dict[NodeId, list[Route]] = {}
 
     def execute(self):
+        self.cache.tick()
+        self.seen_cache.tick()
+        self._resolve_pending()
+        self._answer_waiters()
         target = self._pick_demanded_node()
-        self._send_request(target)
+        # a search in flight is not restarted, it would reset the radius of its ring
+        if target in self.pending:
+            return
+        if self.cache.enabled():
+            if self.store.has_route(target):
+                return
+            self.measurements.search_cache_lookup_count.increase(1)
+            if self.cache.answer(target)[0]:
+                self.measurements.search_cache_hit_count.increase(1)
+                return
+        self._start_search(target, None if self.ring is None else self.ring.initial_radius)
+
+    def _start_search(self, target: NodeId, radius: Optional[int]):
+        if self.cache.enabled():
+            self.cache.put_in_flight(target, radius)
+        self.pending[target] = (self.cache.time, radius)
+        search_id = None
+        if radius is not None or self.summaries is not None:
+            # every ring step is a search of its own, its copies are not mistaken for those of the previous one
+            search_id = (self.address, self.search_count)
+            self.search_count += 1
+            self.seen_cache.check_and_add((search_id, target))
+        self._send_request(target, hops_left=radius, search_id=search_id)
+
+    def _resolve_pending(self):
+        for target, (sent_at, radius) in list(self.pending.items()):
+            if self.store.has_route(target):
+                self.measurements.successful_search_count.increase(1)
+                del self.pending[target]
+            elif radius is not None:
+                if sent_at + self.ring.timeout <= self.cache.time:
+                    if radius < self.ring.max_radius:
+                        self._start_search(target, min(2 * radius, self.ring.max_radius))
+                    else:
+                        self._give_up(target)
+            elif sent_at + self.cache.request_timeout <= self.cache.time:
+                self._give_up(target)
+
+    def _answer_waiters(self):
+        for target, return_routes in list(self.waiters.items()):
+            if self.store.has_route(target):
+                priced_route = self.store.use_route(target)
+                self.cache.put_answer(target, priced_route)
+                ports = self.stacking_engine.adapter.ports()
+                for return_route in return_routes:
+                    # the link to a waiter may have failed since its search came in
+                    if return_route[0] in ports:
+                        self._send_answer(return_route, target, priced_route.path, priced_route.cost)
+                del self.waiters[target]
+            elif not self.cache.is_in_flight(target, 0):
+                # the search timed out, its requesters are not answered either
+                del self.waiters[target]
+
+    def _give_up(self, target: NodeId):
+        if self.cache.enabled():
+            self.cache.put_answer(target, None)
+        del self.pending[target]
 
     def handle(self, datagram: stacking.Datagram):
         search: RouteSearchMessage = datagram.payload
-        if self.store.has_route(search.target):
-            priced_route = self.store.shortest_route(search.target)
-            self._send_answer(
-                return_route=datagram.origin,
-                target=search.target,
-                route=priced_route.path,
-                cost=priced_route.cost,
+        self.measurements.search_transmission_count.increase(1)
+        if search.search_id is not None and self.seen_cache.check_and_add((search.search_id, search.target)):
+            # a copy of the search which reached this node on another path
+            return
+        if search.directed:
+            # stale summaries count as false positives as well
+            self.measurements.directed_search_count.increase(1)
+            if not self.store.has_route(search.target):
+                self.measurements.summary_false_positive_count.increase(1)
+        if self.cache.enabled():
+            self.measurements.search_cache_lookup_count.increase(1)
+            # negative answers only keep this node from searching again, searches of others are still forwarded
+            cached, priced_route = self.cache.answer(search.target)
+            if cached and priced_route is not None:
+                self.measurements.search_cache_hit_count.increase(1)
+                self._answer(datagram, priced_route)
+                return
+            if self.store.has_route(search.target):
+                priced_route = self.store.use_route(search.target)
+                self.cache.put_answer(search.target, priced_route)
+                self._answer(datagram, priced_route)
+                return
+            if search.hops_left is not None and search.hops_left <= 1:
+                return
+            self.waiters.setdefault(search.target, []).append(datagram.origin)
+            if self.cache.is_in_flight(search.target, search.hops_left):
+                # an equal or wider search passed through recently, the requester is answered when it returns
+                self.measurements.search_cache_hit_count.increase(1)
+                return
+            self.cache.put_in_flight(search.target, search.hops_left)
+            # the search is forwarded on behalf of this node, so the answer comes back here for all waiters
+            origin = []
+        else:
+            if self.store.has_route(search.target):
+                self._answer(datagram, self.store.use_route(search.target))
+                if search.directed:
+                    # the summaries led the search here, it has arrived
+                    return
+            origin = datagram.origin
+        if search.hops_left is None:
+            self._send_request(search.target, origin=origin, excluded_port=datagram.origin[0])
+        elif search.hops_left > 1:
+            self._send_request(
+                search.target,
+                origin=origin,
+                hops_left=search.hops_left - 1,
+                excluded_port=datagram.origin[0],
+                directed_only=search.directed,
+                search_id=search.search_id,
             )
-        self._send_request(search.target, origin=datagram.origin)
+
+    def _answer(self, datagram: stacking.Datagram, priced_route: PricedRoute):
+        search: RouteSearchMessage = datagram.payload
+        self._send_answer(
+            return_route=datagram.origin,
+            target=search.target,
+            route=priced_route.path,
+            cost=priced_route.cost,
+        )
 
     def _send_answer(self, return_route: Route, target: NodeId, route: Route, cost: Cost):
         answer = stacking.Datagram(
@@ -51,24 +262,68 @@ class Searcher(ExtendableRouter.MessageHandler, ExtendableRouter.Task):
         self.stacking_engine.send_datagram(answer)
 
     def _pick_demanded_node(self) -> NodeId:
-        pos = self.rnd.random() * self.total_demand
-        index = bisect.bisect_right(self.demand_pairs, (pos, 0))
-        return self.demand_pairs[index][1]
+        return self.demand_map.sample(self.rnd)
 
-    def _send_request(self, target: NodeId, origin: Route = None):
+    def _send_request(
+            self,
+            target: NodeId,
+            origin: Route = None,
+            hops_left: Optional[int] = None,
+            excluded_port: Optional[PortNumber] = None,
+            directed_only: bool = False,
+            search_id: Optional[SearchId] = None,
+    ):
+        # excluded_port is the port the search came in on, it is not sent back there. Directed searches are only
+        # forwarded to matching neighbors, a directed search that reaches a node without any ends there, as falling
+        # back to a broadcast with the hop budget of a directed search would flood the network.
         if origin is None:
             origin = []
+        if self.summaries is not None:
+            ports = self.summaries.matching_ports(
+                target,
+                self.stacking_engine.adapter.ports(),
+                excluded_port=excluded_port,
+            )
+            if len(ports) != 0:
+                self.stacking_engine.send_on_ports(
+                    self.rnd.sample(ports, min(self.summaries.fanout, len(ports))),
+                    stacking.Datagram(
+                        payload=RouteSearchMessage(
+                            target,
+                            hops_left if hops_left is not None else self.summaries.max_hops,
+                            directed=True,
+                            search_id=search_id,
+                        ),
+                        origin=origin,
+                    ),
+                )
+                return
+            if directed_only:
+                return
         request = stacking.Datagram(
-            payload=RouteSearchMessage(target),
+            payload=RouteSearchMessage(target, hops_left, search_id=search_id),
             origin=origin,
         )
-        self.stacking_engine.send_datagram(request)
-
-    @staticmethod
-    def _prepare_demand_pairs(demand_map: dict[NodeId, float]) -> tuple[list[tuple[float, NodeId]], float]:
-        pairs = []
-        accumulated_demand: float = 0
-        for node_id, demand in demand_map.items():
-            accumulated_demand += demand
-            pairs.append((accumulated_demand, node_id))
-        return pairs, accumulated_demand
+        if hops_left is None:
+            self.stacking_engine.send_datagram(request)
+        else:
+            # the hop budget and the seen caches bound the flood, so hop-limited searches go out on every other port
+            self.stacking_engine.send_full_broadcast(request, excluded_port=excluded_port)
+
+
+def create_search_cache(config) -> SearchCache:
+    return SearchCache(
+        ttl=config["cache_ttl"] if "cache_ttl" in config else 0,
+        request_timeout=config["request_timeout"] if "request_timeout" in config else 10,
+    )
+
+
+def create_expanding_ring(config) -> Optional[ExpandingRing]:
+    if "expanding_ring" not in config:
+        return None
+    ring_config = config["expanding_ring"]
+    return ExpandingRing(
+        initial_radius=ring_config["initial_radius"] if "initial_radius" in ring_config else 1,
+        max_radius=ring_config["max_radius"] if "max_radius" in ring_config else 8,
+        timeout=ring_config["timeout"] if "timeout" in ring_config else 1,
+    )
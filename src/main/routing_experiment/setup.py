@@ -1,13 +1,17 @@
+import functools
 import logging
+import math
 import random
-from typing import Callable
+from typing import Callable, Optional, Iterator
 
 import experimentation
 import instrumentation
-from . import net, routing, graphs, route_storage, stacking, propagation
-from .advertising import RouteAdvertisement, AdvertisementHandler, RouteAdvertiser, SelfAdvertiser
+from . import net, routing, graphs, route_storage, stacking, propagation, recovery, search, demand, summaries, \
+    partitioned, transport, congestion, snapshots, frozen, expiry
+from .advertising import RouteAdvertisement, RouteAdvertisementBatch, AdvertisementHandler, SelfAdvertiser, \
+    create_route_advertiser
 from .extendable_router import ExtendableRouter
-from .metering import _create_metrics_calculator
+from .metering import Estimation, create_estimation, ScrapeJob
 from .net import NodeId
 from .recovery import LinkFailureAdvertisement, LinkFailureAdvertisementHandler, LinkFailureAdvertiser
 from .search import Searcher, RouteSearchMessage
@@ -24,7 +28,9 @@ class RoutingCandidate(experimentation.Candidate):
             rnd: random.Random,
             link_fail_rate: float,
             cost_generator: CostGenerator,
+            estimation: Optional[Estimation] = None,
     ):
+        self.estimation = estimation
         self.cost_generator = cost_generator
         self.link_fail_rate = link_fail_rate
         self.rnd = rnd
@@ -33,25 +39,47 @@ class RoutingCandidate(experimentation.Candidate):
         self.routers = routers
 
     def run_step(self):
+        self.network.begin_step()
         self._tick_routers()
+        self.network.end_step()
         self._ruin_and_recreate_links()
 
     def _tick_routers(self):
         for router in self.routers:
             router.tick()
 
+    def close(self):
+        self.network.close()
+
     def scrape_metrics(self, metrics: list[str]) -> dict[str, float]:
-        measurement_session = self.measurement_reader.session()
-        metrics_calculator = _create_metrics_calculator(self.network, self.routers, measurement_session)
-        return metrics_calculator.scrape(metrics)
+        # inline scrapes read the frozen routers as well, so the routes are looked up once per router and scrape
+        return self.prepare_scrape(metrics)()
+
+    def prepare_scrape(self, metrics: list[str]) -> ScrapeJob:
+        routers = self._freeze_routers()
+        return ScrapeJob(
+            network=frozen.freeze_network(self.network),
+            routers=routers,
+            measurement_session=self.measurement_reader.session(),
+            estimation=self.estimation.fork() if self.estimation is not None else None,
+            metrics=metrics,
+        )
+
+    def _freeze_routers(self) -> list[routing.Router]:
+        return [frozen.freeze_router(router, router.demand_map) for router in self.routers]
 
     def _ruin_and_recreate_links(self):
-        failing_links = [
-            (node_id, port_num)
-            for node_id, node in enumerate(self.network.nodes)
-            for port_num, port in node.ports.items()
-            if node_id > port.target_node and self.link_fail_rate > self.rnd.random()
-        ]
+        if self.link_fail_rate <= 0:
+            return
+        failing_links = []
+        for index in _sample_independent_indices(len(self.network.links), self.link_fail_rate, self.rnd):
+            node_id, port_num = self.network.links[index]
+            port = self.network.nodes[node_id].ports[port_num]
+            # self-loops never fail
+            if node_id > port.target_node:
+                failing_links.append((node_id, port_num))
+            elif node_id < port.target_node:
+                failing_links.append((port.target_node, port.target_port_num))
         for (node_id, port_num) in failing_links:
             self.network.disconnect(node_id, port_num)
             self._establish_random_link()
@@ -63,6 +91,71 @@ class RoutingCandidate(experimentation.Candidate):
         self.network.connect(node1, node2, cost, backward_cost)
 
 
+class PartitionedCandidate(RoutingCandidate):
+    # Runs the routers in one worker process per partition of the network. The candidate keeps a replica of the
+    # topology to fail links and to evaluate the routes, which are fetched from the workers when metrics are scraped.
+    def __init__(
+            self,
+            simulation: partitioned.PartitionedSimulation,
+            network: partitioned.ReplicaNetwork,
+            demand_matrix: demand.DemandMatrix,
+            rnd: random.Random,
+            link_fail_rate: float,
+            cost_generator: CostGenerator,
+            estimation: Optional[Estimation] = None,
+    ):
+        self.counters: dict[str, instrumentation.Counter] = {}
+        super().__init__(
+            routers=[],
+            measurement_reader=instrumentation.MeasurementReader(self.counters),
+            network=network,
+            rnd=rnd,
+            link_fail_rate=link_fail_rate,
+            cost_generator=cost_generator,
+            estimation=estimation,
+        )
+        self.demand_matrix = demand_matrix
+        self.simulation = simulation
+
+    def _tick_routers(self):
+        self.simulation.step(self.network.take_operations())
+
+    def close(self):
+        self.simulation.stop()
+        super().close()
+
+    def _freeze_routers(self) -> list[routing.Router]:
+        # the routers of the workers are frozen already, the counters of the workers are taken along
+        frozen_routers, counter_values = self.simulation.freeze()
+        for name, value in counter_values.items():
+            if name not in self.counters:
+                self.counters[name] = instrumentation.Counter()
+            self.counters[name].value = value
+        routers = []
+        for node_id in range(len(self.network.nodes)):
+            frozen_router = frozen_routers[node_id]
+            frozen_router.demand_map = self.demand_matrix.row(node_id)
+            routers.append(frozen_router)
+        return routers
+
+
+def _sample_independent_indices(count: int, rate: float, rnd: random.Random) -> Iterator[int]:
+    # Yields each index in range(count) independently with probability rate. Gaps between hits are drawn from the
+    # geometric distribution, so the cost is proportional to the number of hits rather than to count.
+    if rate <= 0:
+        return
+    if rate >= 1:
+        yield from range(count)
+        return
+    log_miss_rate = math.log(1 - rate)
+    index = -1
+    while True:
+        index += 1 + int(math.log(1 - rnd.random()) / log_miss_rate)
+        if index >= count:
+            return
+        yield index
+
+
 def cost_generator_same(rnd: random.Random, i: int, j: int) -> tuple[float, float]:
     return 1, 1
 
@@ -71,9 +164,32 @@ def cost_generator_uniform(rnd: random.Random, i: int, j: int) -> tuple[float, f
     return rnd.random(), rnd.random()
 
 
-def generate_network(config, rnd: random.Random, tracker: instrumentation.Tracker, cost_generator: CostGenerator):
+def generate_network(
+        config,
+        rnd: random.Random,
+        tracker: instrumentation.Tracker,
+        cost_generator: CostGenerator,
+        congestion_rnd: Optional[random.Random] = None,
+):
+    # candidates pass a stream of its own for the drops of the congestion model, otherwise it is drawn from rnd
     graph = _generate_graph(config, rnd, cost_generator)
-    return _graph_to_network(graph, tracker)
+    if congestion_rnd is None:
+        congestion_rnd = random.Random(rnd.getrandbits(64))
+    return _graph_to_network(graph, tracker, _create_network_type(config, congestion_rnd))
+
+
+def _create_network_type(
+        config,
+        congestion_rnd: random.Random,
+) -> Callable[[int, instrumentation.Tracker], net.Network]:
+    if "congestion" in config:
+        if "transport" in config or "wire_format" in config:
+            raise Exception("the congestion model queues messages in memory and cannot use a transport")
+        return congestion.create_network_type(config["congestion"], congestion_rnd)
+    return transport.create_network_type(
+        config["transport"] if "transport" in config else {},
+        config["wire_format"] if "wire_format" in config else False,
+    )
 
 
 def _generate_graph(config, rnd, cost_generator: CostGenerator):
@@ -109,8 +225,12 @@ def _create_cost_generator(config) -> CostGenerator:
         raise Exception(f"unknown cost distribution: {cost_distribution}")
 
 
-def _graph_to_network(graph: graphs.CostGraph, tracker: instrumentation.Tracker) -> net.Network:
-    network = net.Network(len(graph), tracker)
+def _graph_to_network(
+        graph: graphs.CostGraph,
+        tracker: instrumentation.Tracker,
+        network_type: Callable[[int, instrumentation.Tracker], net.Network] = net.Network,
+) -> net.Network:
+    network = network_type(len(graph), tracker)
     for vertex_id, vertex in graph.items():
         for successor_id, forward_cost in vertex.items():
             if successor_id > vertex_id:
@@ -119,43 +239,101 @@ def _graph_to_network(graph: graphs.CostGraph, tracker: instrumentation.Tracker)
     return network
 
 
-def _create_router_factory(strategy_config, node_count: int) -> routing.RouterFactory:
-    constructor: Callable[[dict[str], random.Random, int], routing.RouterFactory]
+def _create_router_factory(
+        strategy_config,
+        streams: experimentation.RandomStreams,
+        demand_matrix: demand.DemandMatrix,
+) -> routing.RouterFactory:
+    constructor: Callable[[dict[str], experimentation.RandomStreams, demand.DemandMatrix], routing.RouterFactory]
     constructor = ExtendableRouterFactory
-    return constructor(strategy_config, random.Random(), node_count)
+    return constructor(strategy_config, streams, demand_matrix)
 
 
-def create_candidate(config, rnd: random.Random) -> experimentation.Candidate:
+def create_candidate(config, streams: experimentation.RandomStreams) -> experimentation.Candidate:
     tracker, measurement_reader = instrumentation.setup()
-    router_factory = _create_router_factory(config["routing"], config["network"]["node_count"])
+    demand_matrix = demand.create_demand_matrix(
+        config["demand"] if "demand" in config else {},
+        config["network"]["node_count"],
+        streams.rnd("demand"),
+    )
+    router_factory = _create_router_factory(config["routing"], streams.derive("routers"), demand_matrix)
     cost_generator = _create_cost_generator(config)
-    network = generate_network(config["network"], rnd, tracker, cost_generator)
+    estimation = (
+        create_estimation(config["metering"], demand_matrix, streams.derive("metering"))
+        if "metering" in config
+        else None
+    )
+    # the topology is generated from its own stream, so that link failures do not shift it
+    network_rnd = streams.rnd("network")
+    partition_count = config["partitions"] if "partitions" in config else 1
+    if partition_count > 1:
+        if any(key in config["network"] for key in ["transport", "wire_format", "congestion"]):
+            raise Exception("partitioned candidates exchange messages in memory and cannot use a transport")
+        if "warm_start" in config:
+            raise Exception("partitioned candidates cannot start from a snapshot")
+        graph = _generate_graph(config["network"], network_rnd, cost_generator)
+        network_factory = functools.partial(_graph_to_network, graph)
+        network = network_factory(tracker, partitioned.ReplicaNetwork)
+        network.take_operations()
+        return PartitionedCandidate(
+            simulation=partitioned.PartitionedSimulation(
+                network_factory=network_factory,
+                router_factory=router_factory,
+                assignment=graphs.partition_ldg(graph, partition_count),
+                partition_count=partition_count,
+            ),
+            network=network,
+            demand_matrix=demand_matrix,
+            rnd=streams.rnd("links"),
+            link_fail_rate=config["link_fail_rate"],
+            cost_generator=cost_generator,
+            estimation=estimation,
+        )
+    snapshot = None
+    if "warm_start" in config:
+        snapshot = snapshots.load_snapshot(config["warm_start"])
+        if snapshot.node_count() != config["network"]["node_count"]:
+            raise Exception(
+                f"snapshot of {snapshot.node_count()} nodes does not match {config['network']['node_count']} nodes"
+            )
+        network = snapshots.restore_network(
+            snapshot,
+            tracker,
+            _create_network_type(config["network"], streams.rnd("congestion")),
+        )
+    else:
+        network = generate_network(
+            config["network"],
+            network_rnd,
+            tracker,
+            cost_generator,
+            congestion_rnd=streams.rnd("congestion"),
+        )
     routers = [
         router_factory.create_router(adapter, node_id, tracker)
         for node_id, adapter in enumerate(network.adapters)
     ]
+    if snapshot is not None:
+        snapshots.restore_stores(snapshot, routers)
     for router, adapter in zip(routers, network.adapters):
         adapter.register_handler(router.handler())
     return RoutingCandidate(
         routers=routers,
         measurement_reader=measurement_reader,
         network=network,
-        rnd=rnd,
+        rnd=streams.rnd("links"),
         link_fail_rate=config["link_fail_rate"],
         cost_generator=cost_generator,
+        estimation=estimation,
     )
 
 
-def _init_telemetry(node_id) -> tuple[logging.Logger, instrumentation.Tracker]:
-    tracker = instrumentation.Tracker(
-        counters={},
-    )
-    logger = logging.Logger(f"node {node_id}")
-    return logger, tracker
+def _init_logger(node_id) -> logging.Logger:
+    return logging.Logger(f"node {node_id}")
 
 
 class ExtendableRouterFactory(routing.RouterFactory):
-    def __init__(self, config: dict, rnd: random.Random, node_count: int):
+    def __init__(self, config: dict, streams: experimentation.RandomStreams, demand_matrix: demand.DemandMatrix):
         self.advertise_link_failures = config["advertise_link_failures"]
         self.searching_enabled = config["searching"]
         self.auto_forward_propagations = config["auto_forward_propagations"]
@@ -167,11 +345,15 @@ class ExtendableRouterFactory(routing.RouterFactory):
         self.route_propagation: bool = config["route_propagation"]
         self.self_propagation: bool = config["self_propagation"]
         self.broadcast_forwarding_rate: float = config["broadcast_forwarding_rate"]
-        self.node_count = node_count
+        self.demand_matrix = demand_matrix
         self.config = config
-        self.store_factory = route_storage.Factory(config["store"] if "store" in config else {})
-        self.rnd = rnd
-        self.store_factory = route_storage.Factory(config=config["store"] if "store" in config else {})
+        # every node draws from its own streams, so routers do not depend on each other's draws
+        self.streams = streams
+        self.store_config = config["store"] if "store" in config else {}
+        self.store_factory = route_storage.Factory(config=self.store_config)
+        self.recovery_config = config["recovery"] if "recovery" in config else {}
+        self.search_config = config["search"] if "search" in config else {}
+        self.advertisement_config = config["advertisement"] if "advertisement" in config else {}
 
     def create_router(
             self,
@@ -179,28 +361,39 @@ class ExtendableRouterFactory(routing.RouterFactory):
             node_id: NodeId,
             tracker: instrumentation.Tracker,
     ) -> routing.Router:
+        node_streams = self.streams.derive("node", node_id)
         stack_engine = stacking.StackEngine(
             adapter=adapter,
-            rnd=self.rnd,
+            rnd=node_streams.rnd("stacking"),
             broadcasting_forwarding_rate=self.broadcast_forwarding_rate,
             random_walk_broadcasting=self.random_walk_broadcasting
         )
-        demand_map = self.generate_demand_map()
-        propagator = propagation.create_propagator(self.config["propagation"], self.rnd)
-        logger, tracker = _init_telemetry(node_id)
-        store = self.store_factory.create_store(logger, node_id, tracker)
+        demand_map = self.demand_matrix.row(node_id)
+        propagator = propagation.create_propagator(self.config["propagation"], node_streams.rnd("propagation"))
+        logger = _init_logger(node_id)
+        store = self.store_factory.create_store(logger, node_id, tracker, demand_map)
+        search_measurements = search.Measurements(tracker)
+        recovery_measurements = recovery.Measurements(tracker)
+        summary_measurements = summaries.Measurements(tracker)
         scheduled_tasks = []
         port_disconnected_tasks = []
+        # first, so that the other tasks of a tick see the same store time
+        expiry_sweeper = expiry.create_expiry_sweeper(self.store_config, store)
+        if expiry_sweeper is not None:
+            scheduled_tasks.append(expiry_sweeper)
+        advertisement_handler = AdvertisementHandler(
+            auto_forward_propagations=self.auto_forward_propagations,
+            store=store,
+            stack_engine=stack_engine,
+        )
         message_handlers = {
-            RouteAdvertisement: AdvertisementHandler(
-                auto_forward_propagations=self.auto_forward_propagations,
-                store=store,
-                stack_engine=stack_engine,
-            ),
+            RouteAdvertisement: advertisement_handler,
+            RouteAdvertisementBatch: advertisement_handler,
         }
         if self.route_propagation:
             scheduled_tasks.append(
-                RouteAdvertiser(
+                create_route_advertiser(
+                    config=self.advertisement_config,
                     propagator=propagator,
                     store=store,
                     stack_engine=stack_engine,
@@ -214,12 +407,55 @@ class ExtendableRouterFactory(routing.RouterFactory):
                 ),
             )
         if self.searching_enabled:
-            searcher = Searcher(store, stack_engine, self.rnd, demand_map)
+            neighbor_summaries = None
+            if "summaries" in self.search_config:
+                summary_config = self.search_config["summaries"]
+                neighbor_summaries = summaries.create_neighbor_summaries(summary_config)
+                message_handlers[summaries.SummaryAdvertisement] = summaries.SummaryHandler(
+                    summaries=neighbor_summaries,
+                    measurements=summary_measurements,
+                )
+                port_disconnected_tasks.append(summaries.SummaryRemover(neighbor_summaries))
+                scheduled_tasks.append(
+                    summaries.SummaryAdvertiser(
+                        stack_engine=stack_engine,
+                        store=store,
+                        summaries=neighbor_summaries,
+                        interval=summary_config["interval"] if "interval" in summary_config else 10,
+                    ),
+                )
+            searcher = Searcher(
+                store=store,
+                stacking_engine=stack_engine,
+                rnd=node_streams.rnd("search"),
+                demand_map=demand_map,
+                cache=search.create_search_cache(self.search_config),
+                measurements=search_measurements,
+                address=node_id,
+                seen_cache=recovery.create_seen_cache(self.search_config),
+                ring=search.create_expanding_ring(self.search_config),
+                summaries=neighbor_summaries,
+            )
             message_handlers[RouteSearchMessage] = searcher
             scheduled_tasks.append(searcher)
         if self.advertise_link_failures:
-            message_handlers[LinkFailureAdvertisement] = LinkFailureAdvertisementHandler(stack_engine, store)
-            port_disconnected_tasks.append(LinkFailureAdvertiser(stack_engine))
+            seen_cache = recovery.create_seen_cache(self.recovery_config)
+            link_failure_advertisement_handler = LinkFailureAdvertisementHandler(
+                stack_engine=stack_engine,
+                store=store,
+                seen_cache=seen_cache,
+                measurements=recovery_measurements,
+            )
+            message_handlers[LinkFailureAdvertisement] = link_failure_advertisement_handler
+            scheduled_tasks.append(link_failure_advertisement_handler)
+            port_disconnected_tasks.append(
+                LinkFailureAdvertiser(
+                    stack_engine=stack_engine,
+                    address=node_id,
+                    seen_cache=seen_cache,
+                    measurements=recovery_measurements,
+                ),
+            )
         router = ExtendableRouter(
             stack_engine=stack_engine,
             scheduled_tasks=scheduled_tasks,
@@ -231,9 +467,3 @@ class ExtendableRouterFactory(routing.RouterFactory):
         )
         stack_engine.endpoint = router
         return router
-
-    def generate_demand_map(self) -> dict[NodeId, float]:
-        return {
-            node_id: self.rnd.random()
-            for node_id in range(self.node_count)
-        }
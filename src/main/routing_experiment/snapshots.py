@@ -0,0 +1,80 @@
+import gzip
+import pickle
+from typing import Callable
+
+import instrumentation
+from routing_experiment import net, routing
+from routing_experiment.extendable_router import ExtendableRouter
+from routing_experiment.net import NodeId, PortNumber, Cost, ExportedPort
+from routing_experiment.routing import Route
+
+_FORMAT_VERSION = 1
+
+Segments = list[tuple[NodeId, list[tuple[NodeId, list[tuple[Route, Cost]]]]]]
+
+
+class Snapshot:
+    # The routing state of a candidate: its topology and the segments of every route store. Other state of the
+    # routers, e.g. caches and propagation cursors, is not kept and starts empty.
+    def __init__(
+            self,
+            ports: list[list[ExportedPort]],
+            next_port_nums: list[PortNumber],
+            links: list[tuple[NodeId, PortNumber]],
+            segments: list[Segments],
+    ):
+        self.ports = ports
+        self.next_port_nums = next_port_nums
+        self.links = links
+        self.segments = segments
+
+    def node_count(self) -> int:
+        return len(self.ports)
+
+
+def take_snapshot(network: net.Network, routers: list[routing.Router]) -> Snapshot:
+    for router in routers:
+        if not isinstance(router, ExtendableRouter):
+            raise Exception(f"cannot take a snapshot of a {type(router).__name__}")
+    ports, next_port_nums, links = network.export_topology()
+    return Snapshot(
+        ports=ports,
+        next_port_nums=next_port_nums,
+        links=links,
+        segments=[router.store.export_segments() for router in routers],
+    )
+
+
+def save_snapshot(snapshot: Snapshot, path: str):
+    # plain tuples and lists instead of the objects, compressed, so that snapshots of large networks stay small
+    with gzip.open(path, "wb") as file:
+        pickle.dump(
+            (_FORMAT_VERSION, snapshot.ports, snapshot.next_port_nums, snapshot.links, snapshot.segments),
+            file,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def load_snapshot(path: str) -> Snapshot:
+    with gzip.open(path, "rb") as file:
+        version, ports, next_port_nums, links, segments = pickle.load(file)
+    if version != _FORMAT_VERSION:
+        raise Exception(f"unsupported snapshot format version: {version}")
+    return Snapshot(ports, next_port_nums, links, segments)
+
+
+def restore_network(
+        snapshot: Snapshot,
+        tracker: instrumentation.Tracker,
+        network_type: Callable[[int, instrumentation.Tracker], net.Network],
+) -> net.Network:
+    network = network_type(snapshot.node_count(), tracker)
+    network.restore_topology(snapshot.ports, snapshot.next_port_nums, snapshot.links)
+    return network
+
+
+def restore_stores(snapshot: Snapshot, routers: list[routing.Router]):
+    for router, segments in zip(routers, snapshot.segments):
+        if not isinstance(router, ExtendableRouter):
+            raise Exception(f"cannot restore the routes of a {type(router).__name__}")
+        router.store.restore_segments(segments)
@@ -76,12 +76,35 @@ class StackEngine(net.Adapter.Handler):
                     self.adapter.send(port_num, datagram)
             else:
                 ports = self.adapter.ports()
-                if any(ports):
+                if len(ports) != 0:
                     prob = self.broadcasting_forwarding_rate / len(ports)
-                    for port in ports:
-                        if prob > self.rnd.random():
-                            self.adapter.send(port, datagram)
+                    count = _binomial(len(ports), prob, self.rnd)
+                    if count != 0:
+                        self.adapter.send_many(self.rnd.sample(ports, count), datagram)
 
-    def send_full_broadcast(self, datagram: Datagram):
-        for port in self.adapter.ports():
-            self.adapter.send(port, datagram)
+    def send_on_port(self, port_num: PortNumber, datagram: Datagram):
+        # a broadcast which is only sent to the neighbor behind port_num
+        self.adapter.send(port_num, datagram)
+
+    def send_on_ports(self, port_nums: list[PortNumber], datagram: Datagram):
+        self.adapter.send_many(port_nums, datagram)
+
+    def send_full_broadcast(self, datagram: Datagram, excluded_port: Optional[PortNumber] = None):
+        ports = [port_num for port_num in self.adapter.ports() if port_num != excluded_port]
+        if len(ports) != 0:
+            self.adapter.send_many(ports, datagram)
+
+
+def _binomial(n: int, p: float, rnd: random.Random) -> int:
+    # inverts the cumulative distribution function of Binomial(n, p) with a single random number
+    if p >= 1:
+        return n
+    u = rnd.random()
+    k = 0
+    probability = (1 - p) ** n
+    cumulative = probability
+    while cumulative <= u and k < n:
+        k += 1
+        probability *= (n - k + 1) / k * p / (1 - p)
+        cumulative += probability
+    return k
@@ -0,0 +1,142 @@
+import math
+from typing import Optional
+
+import instrumentation
+from routing_experiment import stacking, route_storage, measurements
+from routing_experiment.extendable_router import ExtendableRouter
+from routing_experiment.net import NodeId, PortNumber
+
+_MASK = (1 << 64) - 1
+
+
+class BloomFilter:
+    # Set of node ids without false negatives. The bits are kept in one int, which is compact and cheap to copy.
+    def __init__(self, size: int, hash_count: int):
+        self.size = size
+        self.hash_count = hash_count
+        self.bits = 0
+
+    def _positions(self, key: NodeId) -> list[int]:
+        # double hashing with two multiplicative hashes of the key
+        first = (key * 0x9E3779B97F4A7C15) & _MASK
+        second = ((key ^ 0x5BD1E995) * 0xC2B2AE3D27D4EB4F) & _MASK | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: NodeId):
+        for position in self._positions(key):
+            self.bits |= 1 << position
+
+    def might_contain(self, key: NodeId) -> bool:
+        return all(self.bits >> position & 1 for position in self._positions(key))
+
+    def byte_size(self) -> int:
+        return (self.size + 7) // 8
+
+
+def optimal_filter_shape(capacity: int, false_positive_rate: float) -> tuple[int, int]:
+    # number of bits and of hash functions which keep the false-positive rate at capacity entries
+    size = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+    hash_count = max(1, round(size / capacity * math.log(2)))
+    return size, hash_count
+
+
+class SummaryAdvertisement:
+    def __init__(self, summary: BloomFilter):
+        self.summary = summary
+
+
+class Measurements:
+    def __init__(self, tracker: instrumentation.Tracker):
+        self.summary_transmission_count = tracker.get_counter(measurements.SUMMARY_TRANSMISSION_COUNT)
+        self.summary_byte_count = tracker.get_counter(measurements.SUMMARY_BYTE_COUNT)
+
+
+class NeighborSummaries:
+    def __init__(self, size: int, hash_count: int, fanout: int, max_hops: int = 8):
+        self.size = size
+        self.hash_count = hash_count
+        # number of matching neighbors a search is forwarded to
+        self.fanout = fanout
+        # hop budget of directed searches which have none of their own, false positives would forward them forever
+        self.max_hops = max_hops
+        self.summaries: dict[PortNumber, BloomFilter] = {}
+
+    def summarize(self, store: route_storage.RouteStore) -> BloomFilter:
+        summary = BloomFilter(self.size, self.hash_count)
+        for target in store.nodes.keys():
+            summary.add(target)
+        return summary
+
+    def matching_ports(
+            self,
+            target: NodeId,
+            ports: list[PortNumber],
+            excluded_port: Optional[PortNumber],
+    ) -> list[PortNumber]:
+        return [
+            port
+            for port in ports
+            if port != excluded_port and port in self.summaries and self.summaries[port].might_contain(target)
+        ]
+
+
+class SummaryAdvertiser(ExtendableRouter.Task):
+    def __init__(
+            self,
+            stack_engine: stacking.StackEngine,
+            store: route_storage.RouteStore,
+            summaries: NeighborSummaries,
+            interval: int,
+    ):
+        self.stack_engine = stack_engine
+        self.store = store
+        self.summaries = summaries
+        self.interval = interval
+        self.tick_count = 0
+
+    def execute(self):
+        if self.tick_count % self.interval == 0:
+            self.stack_engine.send_full_broadcast(
+                stacking.Datagram(
+                    payload=SummaryAdvertisement(self.summaries.summarize(self.store)),
+                    origin=[],
+                )
+            )
+        self.tick_count += 1
+
+
+class SummaryRemover(ExtendableRouter.PortDisconnectedTask):
+    # the neighbor behind a disconnected port is gone, so is its summary
+    def __init__(self, summaries: NeighborSummaries):
+        self.summaries = summaries
+
+    def execute(self, port_num: PortNumber):
+        self.summaries.summaries.pop(port_num, None)
+
+
+class SummaryHandler(ExtendableRouter.MessageHandler):
+    # keeps the latest summary of every neighbor, summaries are not forwarded
+    def __init__(self, summaries: NeighborSummaries, measurements: Measurements):
+        self.summaries = summaries
+        self.measurements = measurements
+
+    def handle(self, datagram: stacking.Datagram):
+        advertisement: SummaryAdvertisement = datagram.payload
+        self.measurements.summary_transmission_count.increase(1)
+        self.measurements.summary_byte_count.increase(advertisement.summary.byte_size())
+        self.summaries.summaries[datagram.origin[0]] = advertisement.summary
+
+
+def create_neighbor_summaries(config) -> NeighborSummaries:
+    size, hash_count = optimal_filter_shape(
+        capacity=config["capacity"] if "capacity" in config else 128,
+        false_positive_rate=config["false_positive_rate"] if "false_positive_rate" in config else 0.01,
+    )
+    if "size" in config:
+        size = config["size"]
+    return NeighborSummaries(
+        size,
+        hash_count,
+        config["fanout"] if "fanout" in config else 1,
+        config["max_hops"] if "max_hops" in config else 8,
+    )
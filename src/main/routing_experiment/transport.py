@@ -0,0 +1,168 @@
+import asyncio
+import os
+import pickle
+import shutil
+import socket
+import tempfile
+import weakref
+from typing import Optional
+
+import instrumentation
+from routing_experiment import net, measurements, wire
+from routing_experiment.net import NodeId, PortNumber
+
+_PORT_HEADER_BYTES = 4
+
+
+class Measurements:
+    def __init__(self, tracker: instrumentation.Tracker):
+        self.datagram_send_count = tracker.get_counter(measurements.DATAGRAM_SEND_COUNT)
+        self.datagram_loss_count = tracker.get_counter(measurements.DATAGRAM_LOSS_COUNT)
+        self.transmitted_byte_count = tracker.get_counter(measurements.TRANSMITTED_BYTE_COUNT)
+
+
+class _Endpoint(asyncio.DatagramProtocol):
+    def __init__(self, network: 'SocketNetwork', node_id: NodeId):
+        self.network = network
+        self.node_id = node_id
+
+    def datagram_received(self, data: bytes, address) -> None:
+        self.network._receive(self.node_id, data)
+
+    def error_received(self, exc: Exception) -> None:
+        # e.g. a datagram larger than the socket allows, it never arrives
+        self.network._lose(1)
+
+
+class SocketNetwork(net.Network):
+    # Runs every node behind its own localhost socket on an asyncio event loop. Messages are pickled, or encoded in the
+    # wire format, and sent as one datagram each, so the transmissions pay for serialization and the operating system's
+    # buffering. Datagrams sent while the routers tick are delivered in end_step, which runs the loop until nothing is
+    # in flight any more.
+    # Datagrams the kernel dropped are counted as lost once no datagram arrived for drain_timeout seconds.
+    def __init__(
+            self,
+            node_count: int,
+            tracker: instrumentation.Tracker,
+            family: str = "udp",
+            drain_timeout=1.0,
+            wire_format=False,
+    ):
+        super().__init__(node_count, tracker)
+        self.wire_format = wire_format
+        self.transport_measurements = Measurements(tracker)
+        self.drain_timeout = drain_timeout
+        self.loop = asyncio.new_event_loop()
+        self._remove_directory = None
+        self.transports: list[asyncio.DatagramTransport] = []
+        self.addresses = []
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._error: Optional[Exception] = None
+        for node_id in range(node_count):
+            if family == "udp":
+                endpoint = self.loop.create_datagram_endpoint(
+                    lambda node_id=node_id: _Endpoint(self, node_id),
+                    local_addr=("127.0.0.1", 0),
+                )
+            elif family == "unix":
+                if self._remove_directory is None:
+                    directory = tempfile.mkdtemp(prefix="routing-experiment-")
+                    # the socket files are removed on close, or at exit if the network is not closed
+                    self._remove_directory = weakref.finalize(self, shutil.rmtree, directory, True)
+                endpoint = self.loop.create_datagram_endpoint(
+                    lambda node_id=node_id: _Endpoint(self, node_id),
+                    local_addr=os.path.join(directory, f"{node_id}.sock"),
+                    family=socket.AF_UNIX,
+                )
+            else:
+                raise Exception(f"unknown socket family: {family}")
+            transport, _ = self.loop.run_until_complete(endpoint)
+            self.transports.append(transport)
+            self.addresses.append(transport.get_extra_info("sockname"))
+
+    def _send(self, sender_node_id: int, sender_port_num: int, message):
+        self._send_many(sender_node_id, [sender_port_num], message)
+
+    def _send_many(self, sender_node_id: int, sender_port_nums: list[PortNumber], message):
+        # the message is serialized once, only the port header differs between the recipients
+        data = wire.encode(message) if self.wire_format else pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        node = self.nodes[sender_node_id]
+        transport = self.transports[sender_node_id]
+        for sender_port_num in sender_port_nums:
+            port = node.ports[sender_port_num]
+            self.in_flight += 1
+            self.transport_measurements.datagram_send_count.increase(1)
+            self.transport_measurements.transmitted_byte_count.increase(_PORT_HEADER_BYTES + len(data))
+            transport.sendto(
+                port.target_port_num.to_bytes(_PORT_HEADER_BYTES, "big") + data,
+                self.addresses[port.target_node],
+            )
+
+    def _receive(self, node_id: NodeId, data: bytes):
+        if self.in_flight > 0:
+            self.in_flight -= 1
+        else:
+            # arrived after it had been given up as lost
+            self.transport_measurements.datagram_loss_count.increase(-1)
+        port_num = int.from_bytes(data[:_PORT_HEADER_BYTES], "big")
+        # datagrams on links that failed after they were sent are lost
+        if port_num in self.nodes[node_id].ports:
+            try:
+                adapter = self.adapters[node_id]
+                if adapter.handler is None:
+                    raise Exception("no handler registered")
+                self.measurements.transmission_count.increase(1)
+                payload = data[_PORT_HEADER_BYTES:]
+                adapter.handler.handle(port_num, wire.decode(payload) if self.wire_format else pickle.loads(payload))
+            except Exception as e:
+                # the loop would only log exceptions of callbacks, they are raised again by end_step
+                if self._error is None:
+                    self._error = e
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def _lose(self, count: int):
+        self.in_flight -= count
+        self.transport_measurements.datagram_loss_count.increase(count)
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def _drain(self):
+        while self.in_flight > 0:
+            self._idle.clear()
+            remaining = self.in_flight
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                if self.in_flight == remaining:
+                    self._lose(self.in_flight)
+
+    def end_step(self) -> None:
+        self.loop.run_until_complete(self._drain())
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+        super().end_step()
+
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        if self._remove_directory is not None:
+            self._remove_directory()
+
+
+def create_network_type(config, wire_format: bool):
+    # the type used to create a network of the given transport, memory delivers in-process
+    family = config["type"] if "type" in config else "memory"
+    if family == "memory":
+        return wire.WireNetwork if wire_format else net.Network
+    drain_timeout = config["drain_timeout"] if "drain_timeout" in config else 1.0
+
+    def create(node_count: int, tracker: instrumentation.Tracker) -> SocketNetwork:
+        return SocketNetwork(node_count, tracker, family, drain_timeout, wire_format)
+
+    return create
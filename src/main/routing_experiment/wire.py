@@ -0,0 +1,199 @@
+import struct
+
+import instrumentation
+from routing_experiment import net, stacking, measurements
+from routing_experiment.advertising import RouteAdvertisement, RouteAdvertisementBatch
+from routing_experiment.net import Transmission, PortNumber
+from routing_experiment.recovery import LinkFailureAdvertisement
+from routing_experiment.search import RouteSearchMessage
+from routing_experiment.summaries import SummaryAdvertisement, BloomFilter
+
+# Binary encoding of datagrams. Node ids, port numbers and lengths are unsigned varints, costs are packed doubles. A
+# datagram starts with a byte of flags for its optional routes, followed by the routes and the tagged payload.
+_ORIGIN_FLAG = 1
+_DESTINATION_FLAG = 2
+_HOPS_LEFT_FLAG = 1
+_DIRECTED_FLAG = 2
+_SEARCH_ID_FLAG = 4
+
+_ROUTE_ADVERTISEMENT_TAG = 1
+_ROUTE_ADVERTISEMENT_BATCH_TAG = 2
+_LINK_FAILURE_ADVERTISEMENT_TAG = 3
+_ROUTE_SEARCH_TAG = 4
+_SUMMARY_ADVERTISEMENT_TAG = 5
+
+_COST = struct.Struct("!d")
+
+
+def _write_varint(buffer: bytearray, value: int):
+    if value < 0:
+        raise Exception(f"cannot encode negative number: {value}")
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _write_route(buffer: bytearray, route: list[PortNumber]):
+    _write_varint(buffer, len(route))
+    for port_num in route:
+        _write_varint(buffer, port_num)
+
+
+def _write_cost(buffer: bytearray, cost: float):
+    buffer += _COST.pack(cost)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def byte(self) -> int:
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def varint(self) -> int:
+        value = 0
+        shift = 0
+        while True:
+            byte = self.data[self.offset]
+            self.offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def route(self) -> list[PortNumber]:
+        return [self.varint() for _ in range(self.varint())]
+
+    def cost(self) -> float:
+        (cost,) = _COST.unpack_from(self.data, self.offset)
+        self.offset += _COST.size
+        return cost
+
+    def raw(self, length: int) -> bytes:
+        value = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return value
+
+
+def _write_payload(buffer: bytearray, payload):
+    if isinstance(payload, RouteAdvertisement):
+        buffer.append(_ROUTE_ADVERTISEMENT_TAG)
+        _write_varint(buffer, payload.target)
+        _write_cost(buffer, payload.cost)
+    elif isinstance(payload, RouteAdvertisementBatch):
+        buffer.append(_ROUTE_ADVERTISEMENT_BATCH_TAG)
+        _write_varint(buffer, len(payload.entries))
+        for target, route, cost in payload.entries:
+            _write_varint(buffer, target)
+            _write_route(buffer, route)
+            _write_cost(buffer, cost)
+    elif isinstance(payload, LinkFailureAdvertisement):
+        buffer.append(_LINK_FAILURE_ADVERTISEMENT_TAG)
+        _write_varint(buffer, payload.failure_id[0])
+        _write_varint(buffer, payload.failure_id[1])
+    elif isinstance(payload, RouteSearchMessage):
+        buffer.append(_ROUTE_SEARCH_TAG)
+        _write_varint(buffer, payload.target)
+        buffer.append(
+            (_HOPS_LEFT_FLAG if payload.hops_left is not None else 0)
+            | (_DIRECTED_FLAG if payload.directed else 0)
+            | (_SEARCH_ID_FLAG if payload.search_id is not None else 0)
+        )
+        if payload.hops_left is not None:
+            _write_varint(buffer, payload.hops_left)
+        if payload.search_id is not None:
+            _write_varint(buffer, payload.search_id[0])
+            _write_varint(buffer, payload.search_id[1])
+    elif isinstance(payload, SummaryAdvertisement):
+        buffer.append(_SUMMARY_ADVERTISEMENT_TAG)
+        _write_varint(buffer, payload.summary.size)
+        _write_varint(buffer, payload.summary.hash_count)
+        buffer += payload.summary.bits.to_bytes(payload.summary.byte_size(), "little")
+    else:
+        raise Exception(f"cannot encode payload of type {type(payload).__name__}")
+
+
+def _read_payload(reader: _Reader):
+    tag = reader.byte()
+    if tag == _ROUTE_ADVERTISEMENT_TAG:
+        return RouteAdvertisement(target=reader.varint(), cost=reader.cost())
+    if tag == _ROUTE_ADVERTISEMENT_BATCH_TAG:
+        return RouteAdvertisementBatch([
+            (reader.varint(), reader.route(), reader.cost())
+            for _ in range(reader.varint())
+        ])
+    if tag == _LINK_FAILURE_ADVERTISEMENT_TAG:
+        return LinkFailureAdvertisement(failure_id=(reader.varint(), reader.varint()))
+    if tag == _ROUTE_SEARCH_TAG:
+        target = reader.varint()
+        flags = reader.byte()
+        return RouteSearchMessage(
+            target=target,
+            hops_left=reader.varint() if flags & _HOPS_LEFT_FLAG else None,
+            directed=flags & _DIRECTED_FLAG != 0,
+            search_id=(reader.varint(), reader.varint()) if flags & _SEARCH_ID_FLAG else None,
+        )
+    if tag == _SUMMARY_ADVERTISEMENT_TAG:
+        summary = BloomFilter(size=reader.varint(), hash_count=reader.varint())
+        summary.bits = int.from_bytes(reader.raw(summary.byte_size()), "little")
+        return SummaryAdvertisement(summary)
+    raise Exception(f"unknown payload tag: {tag}")
+
+
+def encode(datagram: stacking.Datagram) -> bytes:
+    if not isinstance(datagram, stacking.Datagram):
+        raise Exception(f"cannot encode message of type {type(datagram).__name__}")
+    buffer = bytearray()
+    buffer.append(
+        (_ORIGIN_FLAG if datagram.origin is not None else 0)
+        | (_DESTINATION_FLAG if datagram.destination is not None else 0)
+    )
+    if datagram.origin is not None:
+        _write_route(buffer, datagram.origin)
+    if datagram.destination is not None:
+        _write_route(buffer, datagram.destination)
+    _write_payload(buffer, datagram.payload)
+    return bytes(buffer)
+
+
+def decode(data: bytes) -> stacking.Datagram:
+    reader = _Reader(data)
+    flags = reader.byte()
+    origin = reader.route() if flags & _ORIGIN_FLAG else None
+    destination = reader.route() if flags & _DESTINATION_FLAG else None
+    return stacking.Datagram(payload=_read_payload(reader), origin=origin, destination=destination)
+
+
+class Measurements:
+    def __init__(self, tracker: instrumentation.Tracker):
+        self.transmitted_byte_count = tracker.get_counter(measurements.TRANSMITTED_BYTE_COUNT)
+
+
+class WireNetwork(net.Network):
+    # Delivers in-process like Network, but every message is encoded and decoded instead of deep-copied, so the
+    # transmitted bytes can be counted. Every recipient decodes its own copy of the message.
+    def __init__(self, node_count: int, tracker: instrumentation.Tracker):
+        super().__init__(node_count, tracker)
+        self.wire_measurements = Measurements(tracker)
+
+    def _send(self, sender_node_id: int, sender_port_num: int, message):
+        self._send_many(sender_node_id, [sender_port_num], message)
+
+    def _send_many(self, sender_node_id: int, sender_port_nums: list[PortNumber], message):
+        data = encode(message)
+        node = self.nodes[sender_node_id]
+        for sender_port_num in sender_port_nums:
+            port = node.ports[sender_port_num]
+            self.wire_measurements.transmitted_byte_count.increase(len(data))
+            self._transmission_queue.append(
+                Transmission(
+                    recipient_node_id=port.target_node,
+                    port_num=port.target_port_num,
+                    message=decode(data),
+                )
+            )
+        self._process_queue()
@@ -0,0 +1,39 @@
+import os
+
+import click
+
+import experimentation
+import routing_experiment
+from main import read_config
+from routing_experiment import snapshots
+
+
+# Runs one candidate of an experiment for a number of steps and stores its routing state, so that candidates with
+# `warm_start: <target>` in their config start from the converged state instead of empty route stores.
+@click.command()
+@click.option(
+    "--config",
+    default=os.getenv("CONFIG", "./config.yaml"),
+    help="location of the experiment config YAML",
+)
+@click.option("--candidate", required=True, help="name of the candidate to warm up")
+@click.option("--steps", required=True, type=int, help="number of warm-up steps")
+@click.option("--target", required=True, help="file the snapshot is written to")
+def warm_up(config: str, candidate: str, steps: int, target: str):
+    main_config = read_config(config)
+    candidate_config = experimentation.apply_patch(
+        main_config["default_candidate_config"],
+        main_config["candidates"][candidate],
+    )
+    streams = experimentation.RandomStreams(main_config["seed"] if "seed" in main_config else None)
+    click.echo(f"seed: {streams.seed}")
+    # the same streams as in the experiment, so the warm-up matches the first steps of the candidate there
+    warmed_candidate = routing_experiment.create_candidate(candidate_config, streams.derive("candidate", candidate))
+    for _ in range(steps):
+        warmed_candidate.run_step()
+    snapshots.save_snapshot(snapshots.take_snapshot(warmed_candidate.network, warmed_candidate.routers), target)
+    click.echo(f"snapshot after {steps} steps written to {target} ({os.path.getsize(target)} bytes)")
+
+
+if __name__ == '__main__':
+    warm_up()
@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import Mock
+
+from routing_experiment import stacking
+from routing_experiment.advertising import AdvertisementHandler, RouteAdvertisementBatch
+
+
+class MyTestCase(unittest.TestCase):
+    def test_batch_is_inserted_relative_to_origin(self):
+        store = Mock()
+        stack_engine = Mock()
+        stack_engine.adapter.port_cost = Mock(return_value=2)
+        batch = RouteAdvertisementBatch([(5, [], 0), (6, [3], 1)])
+
+        AdvertisementHandler(
+            auto_forward_propagations=True,
+            store=store,
+            stack_engine=stack_engine,
+        ).handle(stacking.Datagram(payload=batch, origin=[4]))
+
+        store.insert_many.assert_called_once_with([(5, [4], 2), (6, [4, 3], 3)])
+        self.assertEqual([(5, [], 0), (6, [3], 1)], batch.entries)
+        forwarded = stack_engine.send_datagram.call_args[0][0]
+        self.assertEqual([(5, [], 2), (6, [3], 3)], forwarded.payload.entries)
+
+    def test_answers_are_not_forwarded(self):
+        stack_engine = Mock()
+        stack_engine.adapter.port_cost = Mock(return_value=1)
+
+        AdvertisementHandler(
+            auto_forward_propagations=True,
+            store=Mock(),
+            stack_engine=stack_engine,
+        ).handle(stacking.Datagram(payload=RouteAdvertisementBatch([(5, [], 0)]), origin=[4], destination=[]))
+
+        stack_engine.send_datagram.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
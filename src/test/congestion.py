@@ -0,0 +1,121 @@
+import random
+import unittest
+from unittest.mock import Mock
+
+import experimentation
+import instrumentation
+from routing_experiment import congestion, setup, measurements
+
+
+def _network(
+        capacity: int,
+        drop_policy: congestion.DropPolicy,
+) -> tuple[congestion.CongestedNetwork, instrumentation.MeasurementReader]:
+    tracker, reader = instrumentation.setup()
+    network = congestion.CongestedNetwork(2, tracker, capacity, drop_policy)
+    for adapter in network.adapters:
+        adapter.register_handler(Mock())
+    network.connect(0, 1, 1, 1)
+    return network, reader
+
+
+def _config(congestion_config: dict) -> dict:
+    return {
+        "network": {
+            "node_count": 30,
+            "density": .2,
+            "congestion": congestion_config,
+        },
+        "routing": {
+            "propagation": {
+                "strategy": "shortest_route",
+            },
+            "searching": False,
+            "route_propagation": True,
+            "self_propagation": True,
+            "broadcast_forwarding_rate": .8,
+            "auto_forward_propagations": True,
+            "random_walk_broadcasting": False,
+            "advertise_link_failures": True,
+        },
+        "link_fail_rate": .01,
+    }
+
+
+class MyTestCase(unittest.TestCase):
+    def test_drops_are_drawn_from_their_own_stream(self):
+        streams = experimentation.RandomStreams(0).derive("candidate", "a")
+        candidate = setup.create_candidate(_config({"drop_policy": "red"}), streams)
+
+        self.assertEqual(streams.rnd("congestion").random(), candidate.network.drop_policy.rnd.random())
+
+    def test_ports_send_capacity_per_step_and_drop_tail(self):
+        # two messages fit into the capacity of the step, one more into the queue
+        network, reader = _network(2, congestion.DropTail(queue_limit=1))
+
+        for i in range(5):
+            network.adapters[0].send(0, i)
+        network.end_step()
+        delivered_first = [call.args[1] for call in network.adapters[1].handler.handle.call_args_list]
+        network.end_step()
+        delivered = [call.args[1] for call in network.adapters[1].handler.handle.call_args_list]
+
+        self.assertEqual([0, 1], delivered_first)
+        self.assertEqual([0, 1, 2], delivered)
+        session = reader.session()
+        self.assertEqual(5, session.get(measurements.OFFERED_TRANSMISSION_COUNT))
+        self.assertEqual(2, session.get(measurements.DROPPED_TRANSMISSION_COUNT))
+        # one message waited on one of the two ports after the first step, none after the second
+        self.assertEqual(1, session.get(measurements.QUEUED_TRANSMISSION_SUM))
+        self.assertEqual(4, session.get(measurements.QUEUE_SAMPLE_COUNT))
+
+    def test_random_early_drop_starts_below_queue_limit(self):
+        network, reader = _network(
+            1,
+            congestion.RandomEarlyDrop(
+                queue_limit=100,
+                min_threshold=2,
+                max_threshold=10,
+                max_probability=.5,
+                weight=.5,
+                rnd=random.Random(0),
+            ),
+        )
+
+        for i in range(100):
+            network.adapters[0].send(0, i)
+
+        queued = len(network.queues[(0, 0)].messages)
+        self.assertGreater(queued, 2)
+        self.assertLess(queued, 100)
+        self.assertEqual(100 - queued, reader.session().get(measurements.DROPPED_TRANSMISSION_COUNT))
+
+    def test_messages_queued_on_failed_links_are_dropped(self):
+        network, reader = _network(1, congestion.DropTail(queue_limit=10))
+
+        network.adapters[0].send(0, "first")
+        network.adapters[1].send(0, "second")
+        network.disconnect(0, 0)
+        network.end_step()
+
+        network.adapters[0].handler.handle.assert_not_called()
+        network.adapters[1].handler.handle.assert_not_called()
+        self.assertEqual(2, reader.session().get(measurements.DROPPED_TRANSMISSION_COUNT))
+
+    def test_floods_are_dropped_at_low_capacity(self):
+        drop_rates = {}
+        for capacity in [1, 1000]:
+            candidate = setup.create_candidate(
+                _config({"capacity": capacity, "queue_limit": 1}),
+                experimentation.RandomStreams(0),
+            )
+            for _ in range(5):
+                candidate.run_step()
+            drop_rates[capacity] = candidate.scrape_metrics(["drop_rate", "queue_length"])["drop_rate"]
+
+        self.assertGreater(drop_rates[1], 0)
+        self.assertEqual(0, drop_rates[1000])
+
+
+if __name__ == '__main__':
+    unittest.main()
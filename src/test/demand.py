@@ -0,0 +1,44 @@
+import random
+import unittest
+
+from routing_experiment.demand import AliasTable, RandomDemandMatrix, create_demand_matrix
+
+
+class MyTestCase(unittest.TestCase):
+    def test_alias_table_distribution(self):
+        weights = [1, 0, 3, 6]
+        table = AliasTable(weights)
+        rnd = random.Random(0)
+        counts = [0] * len(weights)
+        for _ in range(100000):
+            counts[table.sample(rnd)] += 1
+        for weight, count in zip(weights, counts):
+            self.assertAlmostEqual(weight / sum(weights), count / 100000, delta=0.01)
+
+    def test_rows_are_views_on_the_matrix(self):
+        matrix = RandomDemandMatrix(5, random.Random(0))
+        row = matrix.row(3)
+        self.assertEqual(5, len(row))
+        self.assertEqual(matrix.demand(3, 4), row[4])
+        self.assertEqual([matrix.demand(3, target) for target in range(5)], list(row.values()))
+
+    def test_random_rows_are_sampled_by_demand(self):
+        matrix = RandomDemandMatrix(4, random.Random(0))
+        rnd = random.Random(0)
+        counts = [0] * 4
+        for _ in range(100000):
+            counts[matrix.sample_target(2, rnd)] += 1
+        total = sum(matrix.row(2).values())
+        for target, count in enumerate(counts):
+            self.assertAlmostEqual(matrix.demand(2, target) / total, count / 100000, delta=0.01)
+        # only the row which was sampled has a table
+        self.assertEqual([2], list(matrix._row_tables.keys()))
+
+    def test_zipf_popularity(self):
+        matrix = create_demand_matrix({"model": "zipf", "exponent": 1.0}, 4, random.Random(0))
+        self.assertEqual([1, 1 / 2, 1 / 3, 1 / 4], sorted(matrix.row(0).values(), reverse=True))
+        self.assertEqual(list(matrix.row(0).values()), list(matrix.row(2).values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
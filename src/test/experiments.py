@@ -0,0 +1,95 @@
+import unittest
+
+import experimentation
+
+
+class _Candidate(experimentation.Candidate):
+    # routability grows by rate per step up to a ceiling
+    def __init__(self, rate: float, ceiling: float):
+        self.rate = rate
+        self.ceiling = ceiling
+        self.steps = 0
+        self.closed = False
+
+    def run_step(self):
+        self.steps += 1
+
+    def close(self):
+        self.closed = True
+
+    def scrape_metrics(self, metrics: list[str]) -> dict[str, float]:
+        return {"routability": min(self.steps * self.rate, self.ceiling), "step": self.steps}
+
+
+def _runner(
+        candidates: dict[str, _Candidate],
+        stopping: dict,
+        scrape_workers: int = 0,
+) -> experimentation.ExperimentRunner:
+    runner = experimentation.ExperimentRunner(
+        config={
+            "plotting": {
+                "groups": [],
+            },
+            "candidates": {name: {} for name in candidates},
+            "measurement": {
+                "steps": 100,
+                "samples": 20,
+                "stopping": stopping,
+                "scrape_workers": scrape_workers,
+            },
+        },
+        experiment=experimentation.Experiment(candidates),
+        figure_folder=None,
+    )
+    runner.samples = []
+    runner.emit_sample = runner.samples.append
+    return runner
+
+
+class MyTestCase(unittest.TestCase):
+    def test_converged_candidates_stop_and_repeat_their_last_sample(self):
+        candidates = {"fast": _Candidate(.1, .5), "slow": _Candidate(.01, 1)}
+        runner = _runner(candidates, {"metrics": ["routability"], "epsilon": .001, "window": 3})
+
+        runner.run()
+
+        # constant from step 5 on, converged after three equal scrapes at steps 5, 10 and 15
+        self.assertEqual(15, candidates["fast"].steps)
+        self.assertEqual(100, candidates["slow"].steps)
+        self.assertEqual(21, len(runner.samples))
+        self.assertEqual([.5] * 18, [sample["candidates"]["fast"]["routability"] for sample in runner.samples[3:]])
+        self.assertEqual(1, runner.samples[-1]["candidates"]["slow"]["routability"])
+
+    def test_run_ends_when_all_candidates_stopped(self):
+        candidates = {"a": _Candidate(.1, .5), "b": _Candidate(0, 0)}
+        runner = _runner(candidates, {"metrics": ["routability"], "window": 2})
+
+        runner.run()
+
+        self.assertEqual(10, candidates["a"].steps)
+        self.assertEqual(5, candidates["b"].steps)
+        self.assertEqual(3, len(runner.samples))
+        self.assertTrue(all(candidate.closed for candidate in candidates.values()))
+
+    def test_wall_clock_budget_stops_all_candidates(self):
+        candidates = {"a": _Candidate(.01, 1)}
+        runner = _runner(candidates, {"wall_clock_seconds": 0})
+
+        runner.run()
+
+        self.assertEqual(0, candidates["a"].steps)
+        self.assertEqual(1, len(runner.samples))
+
+    def test_scrape_workers_emit_the_same_samples_in_order(self):
+        serial = _runner({"a": _Candidate(.1, .5), "b": _Candidate(.01, 1)}, {})
+        pooled = _runner({"a": _Candidate(.1, .5), "b": _Candidate(.01, 1)}, {}, scrape_workers=2)
+
+        serial.run()
+        pooled.run()
+
+        self.assertEqual(serial.samples, pooled.samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
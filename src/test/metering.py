@@ -0,0 +1,117 @@
+import math
+import random
+import unittest
+from typing import Optional
+from unittest.mock import Mock
+
+from routing_experiment import setup, routing, metering, route_validation, demand
+from routing_experiment.net import Network, NodeId
+from routing_experiment.routing import Route
+
+
+class _BreadthFirstRouter(routing.Router):
+    def __init__(self, network: Network, source: NodeId):
+        self.routes: dict[NodeId, Route] = {source: []}
+        frontier = [source]
+        while len(frontier) != 0:
+            node = frontier.pop(0)
+            for port_num, port in network.nodes[node].ports.items():
+                if port.target_node not in self.routes:
+                    self.routes[port.target_node] = self.routes[node] + [port_num]
+                    frontier.append(port.target_node)
+
+    def has_route(self, target: NodeId) -> bool:
+        return target % 2 == 0 and target in self.routes
+
+    def route(self, target: NodeId) -> Optional[Route]:
+        return self.routes[target] if self.has_route(target) else None
+
+    def demand(self, target) -> float:
+        return target + 1
+
+
+class _TargetWeightedDemand(demand.PopularityDemandMatrix):
+    def __init__(self, node_count: int):
+        super().__init__([target + 1 for target in range(node_count)])
+
+
+class MyTestCase(unittest.TestCase):
+    def _create_calculator(self, estimation: Optional[metering.Estimation]) -> metering.MetricsCalculator:
+        network = setup.generate_network(
+            config={
+                "node_count": 30,
+                "density": .1,
+            },
+            rnd=random.Random(0),
+            tracker=Mock(),
+            cost_generator=setup.cost_generator_same,
+        )
+        routers = [_BreadthFirstRouter(network, node_id) for node_id in range(len(network.nodes))]
+        return metering._create_metrics_calculator(network, routers, Mock(), estimation)
+
+    def test_estimates_match_exact_metrics(self):
+        exact = self._create_calculator(None).scrape(["routability", "demanded_routability", "routability_error"])
+        estimated = self._create_calculator(
+            metering.Estimation(
+                min_samples=500,
+                max_samples=20000,
+                target_error=0.005,
+                demand_matrix=_TargetWeightedDemand(30),
+                rnd=random.Random(0),
+            ),
+        ).scrape(["routability", "demanded_routability", "routability_error", "demanded_routability_error"])
+
+        self.assertEqual(0, exact["routability_error"])
+        self.assertLessEqual(estimated["routability_error"], 0.005)
+        self.assertAlmostEqual(exact["routability"], estimated["routability"], delta=4 * 0.005)
+        self.assertAlmostEqual(exact["demanded_routability"], estimated["demanded_routability"], delta=4 * 0.005)
+
+    def test_sample_size_is_bounded(self):
+        calculator = self._create_calculator(
+            metering.Estimation(
+                min_samples=10,
+                max_samples=40,
+                target_error=0,
+                demand_matrix=_TargetWeightedDemand(30),
+                rnd=random.Random(0),
+            ),
+        )
+        draw = Mock(return_value=(1, 1))
+
+        calculator.estimation.estimate(draw, default=0)
+
+        self.assertEqual(40, draw.call_count)
+
+    def test_sampled_distances_match_the_distance_matrix(self):
+        calculator = self._create_calculator(None)
+        distances = calculator._distances()
+        for source in range(len(calculator.network.nodes)):
+            for target in range(len(calculator.network.nodes)):
+                self.assertEqual(distances[source][target], calculator._distance(source, target))
+                self.assertEqual(distances[source][target] != math.inf, calculator._connected(source, target))
+
+    def test_batch_evaluation_matches_hop_by_hop_walk(self):
+        calculator = self._create_calculator(None)
+        network = calculator.network
+        rnd = random.Random(0)
+        sources, targets, routes = [], [], []
+        for _ in range(200):
+            source = rnd.randrange(len(network.nodes))
+            route = [rnd.randrange(-1, 8) for _ in range(rnd.randrange(6))]
+            sources.append(source)
+            targets.append(rnd.randrange(len(network.nodes)))
+            routes.append(route)
+
+        valid, cost = route_validation.evaluate(
+            route_validation.Topology(network),
+            route_validation.RouteBatch(sources, targets, routes),
+        )
+
+        for i, (source, target, route) in enumerate(zip(sources, targets, routes)):
+            self.assertEqual(calculator._route_correct(source, route, target), valid[i])
+            if valid[i]:
+                self.assertEqual(calculator._route_cost(source, route), cost[i])
+
+
+if __name__ == '__main__':
+    unittest.main()
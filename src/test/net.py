@@ -0,0 +1,81 @@
+import random
+import time
+import unittest
+from unittest.mock import Mock
+
+import instrumentation
+from routing_experiment import stacking, measurements, setup
+from routing_experiment.net import Network
+
+
+class MyTestCase(unittest.TestCase):
+    def test_links_follow_connections(self):
+        network = Network(4, Mock())
+        for adapter in network.adapters:
+            adapter.register_handler(Mock())
+        network.connect(0, 1, 1, 1)
+        network.connect(1, 2, 1, 1)
+        network.connect(2, 3, 1, 1)
+        network.connect(3, 0, 1, 1)
+
+        network.disconnect(1, 0)
+        network.disconnect(3, 1)
+
+        self.assertEqual(2, len(network.links))
+        self.assertEqual({(1, 1), (2, 1)}, set(network.links))
+        for position, link in enumerate(network.links):
+            self.assertEqual(position, network._link_positions[link])
+            node_id, port_num = link
+            self.assertIn(port_num, network.nodes[node_id].ports)
+
+    def test_failing_links_are_sampled_independently(self):
+        rnd = random.Random(0)
+        draws = 2000
+        hits = [0] * 1000
+        total = 0
+        for _ in range(draws):
+            indices = list(setup._sample_independent_indices(1000, .05, rnd))
+            self.assertEqual(sorted(set(indices)), indices)
+            total += len(indices)
+            for index in indices:
+                hits[index] += 1
+
+        self.assertAlmostEqual(.05 * 1000, total / draws, delta=1)
+        # the first and the last links fail as often as the others
+        self.assertAlmostEqual(.05, sum(hits[:100]) / (100 * draws), delta=.005)
+        self.assertAlmostEqual(.05, sum(hits[-100:]) / (100 * draws), delta=.005)
+        self.assertEqual([], list(setup._sample_independent_indices(1000, 0, rnd)))
+        self.assertEqual(list(range(1000)), list(setup._sample_independent_indices(1000, 1, rnd)))
+        self.assertEqual([], list(setup._sample_independent_indices(0, .5, rnd)))
+
+    def test_send_many_shares_one_payload_copy(self):
+        network = Network(3, Mock())
+        for adapter in network.adapters:
+            adapter.register_handler(Mock())
+        network.connect(0, 1, 1, 1)
+        network.connect(0, 2, 1, 1)
+        message = stacking.Datagram(payload=["payload"], origin=[])
+
+        network.adapters[0].send_many([0, 1], message)
+
+        received_1 = network.adapters[1].handler.handle.call_args[0][1]
+        received_2 = network.adapters[2].handler.handle.call_args[0][1]
+        self.assertIsNot(received_1, received_2)
+        self.assertIs(received_1.payload, received_2.payload)
+        self.assertIsNot(message.payload, received_1.payload)
+        self.assertEqual(["payload"], received_1.payload)
+
+    def test_steps_are_timed_from_begin_to_end(self):
+        tracker, reader = instrumentation.setup()
+        network = Network(2, tracker)
+        for _ in range(2):
+            network.begin_step()
+            network.end_step()
+            # e.g. link churn or the steps of other candidates
+            time.sleep(.1)
+
+        self.assertLess(reader.session().get(measurements.STEP_WALL_SECONDS_SUM), .05)
+
+
+if __name__ == '__main__':
+    unittest.main()
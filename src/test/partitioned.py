@@ -0,0 +1,79 @@
+import random
+import unittest
+from unittest.mock import Mock
+
+import experimentation
+from routing_experiment import graphs, setup, partitioned
+from routing_experiment.net import Network
+
+
+def _config(partitions: int) -> dict:
+    return {
+        "network": {
+            "node_count": 40,
+            "density": .05,
+        },
+        "routing": {
+            "propagation": {
+                "strategy": "shortest_route",
+            },
+            "searching": False,
+            "route_propagation": True,
+            "self_propagation": True,
+            "broadcast_forwarding_rate": .8,
+            "auto_forward_propagations": False,
+            "advertise_link_failures": True,
+        },
+        "link_fail_rate": .01,
+        "partitions": partitions,
+    }
+
+
+class MyTestCase(unittest.TestCase):
+    def test_partitions_are_balanced_and_cut_few_edges(self):
+        graph = graphs.generate_watts_strogatz_graph(200, 6, .05, random.Random(0), lambda i, j: (1, 1))
+
+        assignment = graphs.partition_ldg(graph, 4)
+
+        self.assertEqual([50, 50, 50, 50], [assignment.count(partition) for partition in range(4)])
+        rnd = random.Random(0)
+        random_assignment = [rnd.randrange(4) for _ in range(200)]
+        self.assertLess(
+            graphs.cut_edge_count(graph, assignment),
+            graphs.cut_edge_count(graph, random_assignment) / 2,
+        )
+
+    def test_replayed_operations_reproduce_topology(self):
+        replica = partitioned.ReplicaNetwork(4, Mock())
+        replica.connect(0, 1, 1, 2)
+        replica.connect(1, 2, 3, 4)
+        replica.disconnect(1, 0)
+        replica.connect(3, 1, 5, 6)
+        network = Network(4, Mock())
+        for adapter in network.adapters:
+            adapter.register_handler(Mock())
+
+        partitioned.apply_operations(network, replica.take_operations())
+
+        for node, replica_node in zip(network.nodes, replica.nodes):
+            self.assertEqual(
+                {num: (port.target_node, port.target_port_num, port.cost) for num, port in replica_node.ports.items()},
+                {num: (port.target_node, port.target_port_num, port.cost) for num, port in node.ports.items()},
+            )
+        self.assertEqual([], replica.operations)
+
+    def test_partitioned_run_matches_single_process_run(self):
+        results = {}
+        for partitions in [1, 2]:
+            candidate = setup.create_candidate(_config(partitions), experimentation.RandomStreams(0))
+            for _ in range(20):
+                candidate.run_step()
+            results[partitions] = candidate.scrape_metrics(["transmissions_per_node", "routability"])
+            candidate.close()
+
+        self.assertAlmostEqual(results[1]["transmissions_per_node"], results[2]["transmissions_per_node"], delta=3)
+        self.assertAlmostEqual(results[1]["routability"], results[2]["routability"], delta=.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
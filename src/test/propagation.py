@@ -0,0 +1,49 @@
+import random
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from routing_experiment.propagation import DeltaPropagator
+from routing_experiment.route_storage import RouteStore
+
+
+class MyTestCase(unittest.TestCase):
+    def test_delta_propagation_sends_every_route_once_per_port(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True)
+        store.insert(1, [1], 1)
+        store.insert(2, [2], 1)
+        adapter = Mock()
+        adapter.ports = Mock(return_value=[1, 2])
+        propagator = DeltaPropagator(scan_limit=16, refresh_interval=100, rnd=random.Random(0))
+
+        picks = [propagator.pick(store, adapter) for _ in range(6)]
+
+        self.assertEqual(
+            {(1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)},
+            {(port, target) for port, target, _, _ in picks},
+        )
+        self.assertIsNone(propagator.pick(store, adapter))
+
+        store.insert(1, [3], .5)
+
+        port, target, route, cost = propagator.pick(store, adapter)
+        self.assertEqual((1, [3], .5), (target, route, cost))
+        port, target, route, cost = propagator.pick(store, adapter)
+        self.assertEqual((1, [3], .5), (target, route, cost))
+        self.assertIsNone(propagator.pick(store, adapter))
+
+    def test_delta_propagation_refreshes_when_nothing_changed(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True)
+        adapter = Mock()
+        adapter.ports = Mock(return_value=[1])
+        propagator = DeltaPropagator(scan_limit=16, refresh_interval=3, rnd=random.Random(0))
+
+        picks = [propagator.pick(store, adapter) for _ in range(7)]
+
+        self.assertEqual(
+            [True, False, False, True, False, False, True],
+            [pick is not None for pick in picks],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+import experimentation
+from routing_experiment import setup
+
+
+def _config(strategy: str) -> dict:
+    return {
+        "network": {
+            "node_count": 30,
+            "density": .1,
+        },
+        "routing": {
+            "propagation": {
+                "strategy": strategy,
+                "cutoff_rate": .2,
+            },
+            "searching": True,
+            "route_propagation": True,
+            "self_propagation": True,
+            "broadcast_forwarding_rate": .8,
+            "auto_forward_propagations": True,
+            "random_walk_broadcasting": False,
+            "advertise_link_failures": True,
+        },
+        "link_fail_rate": .05,
+    }
+
+
+_METRICS = ["transmissions_per_node", "routability", "efficiency", "search_transmissions_per_successful_search"]
+
+
+class MyTestCase(unittest.TestCase):
+    def test_streams_depend_only_on_seed_and_path(self):
+        streams = experimentation.RandomStreams(7)
+        first = streams.derive("candidate", "a").rnd("node", 1).random()
+        streams.rnd("node", 1).random()
+        streams.derive("candidate", "b").rnd("node", 1).random()
+
+        self.assertEqual(first, experimentation.RandomStreams(7).derive("candidate", "a").rnd("node", 1).random())
+        self.assertEqual(first, experimentation.RandomStreams(7).rnd("candidate", "a", "node", 1).random())
+        self.assertNotEqual(first, experimentation.RandomStreams(8).derive("candidate", "a").rnd("node", 1).random())
+        self.assertNotEqual(first, streams.derive("candidate", "a").rnd("node", 2).random())
+
+    def test_candidates_reproduce_serially_and_interleaved(self):
+        streams = experimentation.RandomStreams(0)
+        configs = {"random": _config("random_route"), "shortest": _config("shortest_route")}
+
+        serial = {}
+        for name, config in configs.items():
+            candidate = setup.create_candidate(config, streams.derive("candidate", name))
+            for _ in range(10):
+                candidate.run_step()
+            serial[name] = candidate.scrape_metrics(_METRICS)
+        # in reverse order and stepping in turns, as an experiment runner does
+        candidates = {
+            name: setup.create_candidate(configs[name], streams.derive("candidate", name))
+            for name in reversed(configs)
+        }
+        for _ in range(10):
+            for candidate in candidates.values():
+                candidate.run_step()
+        interleaved = {name: candidate.scrape_metrics(_METRICS) for name, candidate in candidates.items()}
+
+        self.assertEqual(serial, interleaved)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from routing_experiment import stacking
+from routing_experiment.recovery import SeenCache, LinkFailureAdvertisementHandler, LinkFailureAdvertisement
+
+
+class MyTestCase(unittest.TestCase):
+    def test_seen_cache_expiry(self):
+        cache = SeenCache(capacity=2, ttl=2)
+        self.assertFalse(cache.check_and_add("a"))
+        self.assertTrue(cache.check_and_add("a"))
+        cache.tick()
+        cache.tick()
+        self.assertFalse(cache.check_and_add("a"))
+
+    def test_seen_cache_eviction(self):
+        cache = SeenCache(capacity=2, ttl=100)
+        cache.check_and_add("a")
+        cache.check_and_add("b")
+        cache.check_and_add("a")
+        cache.check_and_add("c")
+        self.assertTrue(cache.check_and_add("a"))
+        self.assertFalse(cache.check_and_add("b"))
+
+    def test_failure_forwarded_once(self):
+        stack_engine = Mock()
+        store = Mock()
+        store.has_routes_starting_with = Mock(return_value=True)
+        handler = LinkFailureAdvertisementHandler(
+            stack_engine=stack_engine,
+            store=store,
+            seen_cache=SeenCache(capacity=10, ttl=10),
+            measurements=MagicMock(),
+        )
+        for _ in range(2):
+            handler.handle(
+                stacking.Datagram(
+                    payload=LinkFailureAdvertisement(failure_id=(5, 0)),
+                    origin=[1, 2],
+                ),
+            )
+        store.remove_routes_starting_with.assert_called_once_with([1, 2])
+        stack_engine.send_full_broadcast.assert_called_once()
+
+    def test_failure_arriving_on_another_path_is_handled(self):
+        stack_engine = Mock()
+        store = Mock()
+        # only the routes via port 3 lead over the failed link
+        store.has_routes_starting_with = Mock(side_effect=lambda route: route == [3, 2])
+        handler = LinkFailureAdvertisementHandler(
+            stack_engine=stack_engine,
+            store=store,
+            seen_cache=SeenCache(capacity=10, ttl=10),
+            measurements=MagicMock(),
+        )
+        for origin in [[1, 2], [3, 2]]:
+            handler.handle(
+                stacking.Datagram(
+                    payload=LinkFailureAdvertisement(failure_id=(5, 0)),
+                    origin=origin,
+                ),
+            )
+        store.remove_routes_starting_with.assert_called_once_with([3, 2])
+        stack_engine.send_full_broadcast.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,15 @@
 import random
+import sys
 import typing
 import unittest
 from unittest.mock import Mock, MagicMock
 
-from routing_experiment import setup
+import instrumentation
+from routing_experiment import setup, measurements, expiry
 from routing_experiment.net import Network, NodeId, Cost
-from routing_experiment.route_storage import _Edge, _Node, RouteStore, PricedRoute
+from routing_experiment.propagation import RandomRoutePicker
+from routing_experiment.route_storage import _Edge, _Node, RouteStore, PricedRoute, _IndexedDict, LeastRecentlyUsed, \
+    LeastDemanded
 from routing_experiment.routing import Route
 from routing_experiment.setup import generate_network
 
@@ -153,6 +157,243 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(3, store.nodes[1].edges[2].priced_routes[1].cost)
         self.assertEqual(0, len(store.nodes[2].edges))
 
+    def test_footprint(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True)
+        empty_footprint = store.footprint()
+        store.insert(1, [1], 1)
+        one_route_footprint = store.footprint()
+        store.insert(2, [1, 2], 3)
+
+        self.assertLess(0, empty_footprint)
+        self.assertLess(empty_footprint, one_route_footprint)
+        self.assertLess(one_route_footprint, store.footprint())
+
+    def test_insert_many_matches_single_insertions(self):
+        rnd = random.Random(0)
+        network = generate_network(
+            config={
+                "node_count": 20,
+                "density": .3,
+            },
+            rnd=rnd,
+            tracker=Mock(),
+            cost_generator=setup.cost_generator_uniform,
+        )
+        entries = [_random_walk(network, 0, rnd) for _ in range(50)]
+        single = RouteStore(0, MagicMock(), Mock(), True, True)
+        for target, route, cost in entries:
+            single.insert(target, route, cost)
+        bulk = RouteStore(0, MagicMock(), Mock(), True, True)
+
+        bulk.insert_many(entries)
+
+        self.assertEqual(set(single.nodes.keys()), set(bulk.nodes.keys()))
+        for node_id in single.nodes:
+            self.assertEqual(single.shortest_route(node_id).cost, bulk.shortest_route(node_id).cost)
+
+    def test_lazy_distances_match_eager_distances(self):
+        rnd = random.Random(0)
+        network = generate_network(
+            config={
+                "node_count": 20,
+                "density": .3,
+            },
+            rnd=rnd,
+            tracker=Mock(),
+            cost_generator=setup.cost_generator_uniform,
+        )
+        eager = RouteStore(0, MagicMock(), Mock(), True, True)
+        counters = {}
+        lazy = RouteStore(0, instrumentation.Tracker(counters), Mock(), True, True, lazy_distances=True)
+        for i in range(50):
+            target, route, cost = _random_walk(network, 0, rnd)
+            eager.insert(target, route, cost)
+            lazy.insert(target, route, cost)
+            if i % 10 == 9:
+                eager.remove_routes_starting_with(route[:1])
+                lazy.remove_routes_starting_with(route[:1])
+                self.assertEqual(list(eager.nodes.keys()), list(lazy.nodes.keys()))
+
+        self.assertTrue(lazy.distances_outdated)
+        for node_id in eager.nodes:
+            self.assertEqual(eager.shortest_route(node_id).path, lazy.shortest_route(node_id).path)
+        self.assertFalse(lazy.distances_outdated)
+        self.assertEqual(1, counters[measurements.DISTANCE_RECOMPUTE_COUNT].value)
+        self.assertLess(0, counters[measurements.DISTANCE_RECOMPUTE_AVOIDED_COUNT].value)
+
+    def test_routes_longer_than_recursion_limit(self):
+        hops = 3 * sys.getrecursionlimit()
+        store = RouteStore(0, MagicMock(), Mock(), True, True)
+        # every prefix of the route leads to another node, so the store chains one segment per hop
+        for length in range(1, hops + 1, 97):
+            store.insert(length, [1] * length, length)
+        store.insert(hops, [1] * hops, hops)
+
+        self.assertEqual([1] * hops, store.shortest_route(hops).path)
+        self.assertTrue(store.has_routes_starting_with([1] * (hops - 1)))
+        target, route, cost = RandomRoutePicker(0, random.Random(0)).pick(store)
+        self.assertEqual([1] * target, route)
+        store.remove_routes_starting_with([1, 1])
+        self.assertEqual([0, 1], list(store.nodes.keys()))
+
+    def test_indexed_dict_keeps_key_list_in_sync(self):
+        rnd = random.Random(0)
+        indexed: _IndexedDict[int, _Edge] = _IndexedDict()
+        expected = {}
+        for _ in range(1000):
+            key = rnd.randrange(50)
+            if key in expected and rnd.random() < .5:
+                del indexed[key]
+                del expected[key]
+            else:
+                edge = _Edge()
+                indexed[key] = edge
+                expected[key] = edge
+            self.assertEqual(expected, dict(indexed.items()))
+            self.assertEqual(set(expected.keys()), set(indexed.key_list))
+            for key, edge in indexed.items():
+                self.assertEqual(key, indexed.key_list[edge.slot])
+        self.assertIn(indexed.random_key(rnd), expected)
+
+    def test_edges_keep_their_cheapest_segments(self):
+        tracker, reader = instrumentation.setup()
+        store = RouteStore(0, tracker, Mock(), True, True, max_routes_per_edge=2)
+        store.insert(1, [1], 3)
+        store.insert(1, [2], 1)
+        store.insert(1, [3], 2)
+
+        self.assertEqual([[2], [3]], [priced_route.path for priced_route in store.nodes[0].edges[1].priced_routes])
+        self.assertEqual(1, reader.session().get(measurements.EVICTED_SEGMENT_COUNT))
+
+    def test_full_store_evicts_targets_by_policy(self):
+        cases = [
+            # the most expensive target
+            (None, {1, 3}),
+            # 2 and then 1 are the least recently inserted or looked up
+            (LeastRecentlyUsed(), {3, 4}),
+            (LeastDemanded({1: 3, 2: 0, 3: 1, 4: 2}), {1, 4}),
+        ]
+        for policy, kept in cases:
+            tracker, reader = instrumentation.setup()
+            store = RouteStore(0, tracker, Mock(), True, True, max_targets=2, eviction_policy=policy)
+            store.insert(1, [1], 1)
+            store.insert(2, [2], 5)
+            store.insert(1, [1], 1)
+            store.insert(3, [3], 2)
+            store.use_route(3)
+            store.insert(4, [4], 7)
+
+            self.assertEqual(kept | {0}, set(store.nodes.keys()))
+            self.assertEqual(2, reader.session().get(measurements.EVICTED_TARGET_COUNT))
+
+    def test_eviction_follows_the_policy_for_inner_nodes(self):
+        tracker, reader = instrumentation.setup()
+        store = RouteStore(0, tracker, Mock(), True, True, max_targets=2, eviction_policy=LeastRecentlyUsed())
+        store.insert(2, [1, 2], 2)
+        store.insert(1, [1], 1)
+        store.use_route(2)
+        store.insert(3, [3], 1)
+
+        # 1 was used least recently, 2 is only routed via 1 and is lost with it
+        self.assertEqual({0, 3}, set(store.nodes.keys()))
+        self.assertEqual(2, reader.session().get(measurements.EVICTED_TARGET_COUNT))
+
+    def test_restored_segments_are_capped(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True)
+        store.insert(1, [1], 1)
+        store.insert(1, [2], 2)
+        store.insert(3, [3], 5)
+        store.insert(4, [4], 3)
+        capped = RouteStore(0, MagicMock(), Mock(), True, True, max_routes_per_edge=1, max_targets=2)
+
+        capped.restore_segments(store.export_segments())
+
+        self.assertEqual({0, 1, 4}, set(capped.nodes.keys()))
+        self.assertEqual([[1]], [priced_route.path for priced_route in capped.nodes[0].edges[1].priced_routes])
+
+    def test_eviction_keeps_targets_routed_via_inner_nodes(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True, max_targets=2)
+        store.insert(2, [1, 2], 2)
+        store.insert(1, [1], 1)
+        store.insert(3, [3], 5)
+
+        self.assertEqual({0, 1, 2}, set(store.nodes.keys()))
+        self.assertEqual([1, 2], store.shortest_route(2).path)
+
+    def test_lazy_eviction_ranks_by_the_outdated_tree(self):
+        counters = {}
+        store = RouteStore(
+            0, instrumentation.Tracker(counters), Mock(), True, True, lazy_distances=True, max_targets=2,
+        )
+        store.insert(1, [1], 1)
+        store.insert(2, [2], 5)
+        store.insert(3, [3], 2)
+
+        self.assertEqual({0, 1, 3}, set(store.nodes.keys()))
+        self.assertEqual(0, counters[measurements.DISTANCE_RECOMPUTE_COUNT].value)
+        self.assertEqual([3], store.shortest_route(3).path)
+        self.assertEqual(1, counters[measurements.DISTANCE_RECOMPUTE_COUNT].value)
+
+    def test_fresh_tree_matches_the_recomputed_tree_of_a_lazy_store(self):
+        rnd = random.Random(0)
+        network = generate_network(
+            config={
+                "node_count": 20,
+                "density": .3,
+            },
+            rnd=rnd,
+            tracker=Mock(),
+            cost_generator=setup.cost_generator_uniform,
+        )
+        store = RouteStore(0, MagicMock(), Mock(), True, True, lazy_distances=True)
+        for _ in range(50):
+            store.insert(*_random_walk(network, 0, rnd))
+
+        tree = store.fresh_tree()
+        self.assertTrue(store.distances_outdated)
+        store.ensure_distances()
+        self.assertEqual(tree, store.fresh_tree())
+
+    def test_segments_expire_unless_advertised_again(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True, segment_ttl=3)
+        store.insert(2, [1, 2], 2)
+        store.insert(3, [4], 1)
+        for _ in range(2):
+            store.advance_time()
+        store.insert(2, [1, 2], 2)
+        store.advance_time()
+
+        self.assertEqual([1, 2], store.shortest_route(2).path)
+        self.assertFalse(store.has_route(3))
+
+    def test_fresh_routes_skip_expired_segments_without_removing_them(self):
+        store = RouteStore(0, MagicMock(), Mock(), True, True, segment_ttl=3)
+        store.insert(2, [1, 2], 2)
+        store.insert(3, [4], 1)
+        for _ in range(2):
+            store.advance_time()
+        store.insert(2, [5, 6, 7], 3)
+        store.advance_time()
+
+        self.assertEqual([5, 6, 7], store.fresh_route(2).path)
+        self.assertIsNone(store.fresh_route(3))
+        self.assertEqual({2}, set(store.fresh_tree().keys()))
+        self.assertEqual({0, 2, 3}, set(store.nodes.keys()))
+        self.assertEqual([1, 2], store.nodes[0].edges[2].priced_routes[0].path)
+
+    def test_sweeper_expires_segments_which_are_not_read(self):
+        tracker, reader = instrumentation.setup()
+        store = RouteStore(0, tracker, Mock(), True, True, segment_ttl=2)
+        for target in range(1, 11):
+            store.insert(target, [target], 1)
+        sweeper = expiry.ExpirySweeper(store, nodes_per_tick=2)
+
+        for _ in range(2 + 5):
+            sweeper.execute()
+
+        self.assertEqual([0], list(store.nodes.keys()))
+        self.assertEqual(10, reader.session().get(measurements.EXPIRED_SEGMENT_COUNT))
+
 
 if __name__ == '__main__':
     unittest.main()
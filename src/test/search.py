@@ -0,0 +1,127 @@
+import random
+import unittest
+from typing import Optional
+from unittest.mock import Mock, MagicMock
+
+from routing_experiment import stacking
+from routing_experiment.demand import PopularityDemandMatrix
+from routing_experiment.recovery import SeenCache
+from routing_experiment.route_storage import PricedRoute
+from routing_experiment.search import Searcher, SearchCache, RouteSearchMessage, ExpandingRing
+
+
+def _create_searcher(store, stack_engine, cache_ttl: int = 5, ring: Optional[ExpandingRing] = None) -> Searcher:
+    return Searcher(
+        store=store,
+        stacking_engine=stack_engine,
+        rnd=random.Random(0),
+        demand_map=PopularityDemandMatrix([0.0, 1.0]).row(0),
+        cache=SearchCache(ttl=cache_ttl, request_timeout=5),
+        measurements=MagicMock(),
+        address=0,
+        seen_cache=SeenCache(capacity=100, ttl=10),
+        ring=ring,
+    )
+
+
+class MyTestCase(unittest.TestCase):
+    def test_concurrent_searches_are_coalesced(self):
+        store = Mock()
+        store.has_route = Mock(return_value=False)
+        stack_engine = Mock()
+        searcher = _create_searcher(store, stack_engine)
+        for origin in [[1], [2]]:
+            searcher.handle(stacking.Datagram(payload=RouteSearchMessage(7), origin=origin))
+        stack_engine.send_datagram.assert_called_once()
+        self.assertEqual(7, stack_engine.send_datagram.call_args[0][0].payload.target)
+
+        store.has_route = Mock(return_value=True)
+        store.use_route = Mock(return_value=PricedRoute([3, 4], 2))
+        stack_engine.adapter.ports = Mock(return_value=[1, 2])
+        searcher.execute()
+
+        answers = [call[0][0] for call in stack_engine.send_datagram.call_args_list[1:]]
+        self.assertEqual([[1], [2]], [answer.destination for answer in answers])
+        self.assertEqual([[3, 4], [3, 4]], [answer.origin for answer in answers])
+
+    def test_answers_are_cached(self):
+        store = Mock()
+        store.has_route = Mock(return_value=True)
+        store.use_route = Mock(return_value=PricedRoute([3, 4], 2))
+        stack_engine = Mock()
+        searcher = _create_searcher(store, stack_engine)
+        for origin in [[1], [2]]:
+            searcher.handle(stacking.Datagram(payload=RouteSearchMessage(7), origin=origin))
+        store.use_route.assert_called_once()
+        self.assertEqual(2, stack_engine.send_datagram.call_count)
+        answer = stack_engine.send_datagram.call_args[0][0]
+        self.assertEqual([2], answer.destination)
+        self.assertEqual([3, 4], answer.origin)
+
+    def test_unanswered_search_is_cached_as_not_found(self):
+        store = Mock()
+        store.has_route = Mock(return_value=False)
+        stack_engine = Mock()
+        searcher = _create_searcher(store, stack_engine)
+        # searched once, given up after the request timeout, then not searched again while the answer is cached
+        for _ in range(8):
+            searcher.execute()
+        stack_engine.send_datagram.assert_called_once()
+
+        # searches of other nodes are still forwarded
+        searcher.handle(stacking.Datagram(payload=RouteSearchMessage(1), origin=[1]))
+        self.assertEqual(2, stack_engine.send_datagram.call_count)
+
+    def test_hop_budget_limits_forwarding(self):
+        store = Mock()
+        store.has_route = Mock(return_value=False)
+        stack_engine = Mock()
+        searcher = _create_searcher(store, stack_engine)
+        searcher.handle(stacking.Datagram(payload=RouteSearchMessage(7, hops_left=1), origin=[1]))
+        stack_engine.send_full_broadcast.assert_not_called()
+        searcher.handle(stacking.Datagram(payload=RouteSearchMessage(7, hops_left=3), origin=[2]))
+        stack_engine.send_full_broadcast.assert_called_once()
+        self.assertEqual(2, stack_engine.send_full_broadcast.call_args[0][0].payload.hops_left)
+
+    def test_copies_of_a_hop_limited_search_are_forwarded_once(self):
+        store = Mock()
+        store.has_route = Mock(return_value=False)
+        stack_engine = Mock()
+        searcher = _create_searcher(store, stack_engine, cache_ttl=0)
+        for origin in [[1], [2]]:
+            searcher.handle(
+                stacking.Datagram(payload=RouteSearchMessage(7, hops_left=3, search_id=(5, 0)), origin=origin),
+            )
+        # a later round of the same requester is a new search
+        searcher.handle(stacking.Datagram(payload=RouteSearchMessage(7, hops_left=3, search_id=(5, 1)), origin=[2]))
+
+        self.assertEqual(
+            [(1, (5, 0)), (2, (5, 1))],
+            [
+                (call.kwargs["excluded_port"], call[0][0].payload.search_id)
+                for call in stack_engine.send_full_broadcast.call_args_list
+            ],
+        )
+
+    def test_ring_grows_while_unanswered(self):
+        # with the cache a given up search is not repeated, without it the next search starts again with radius 1
+        for cache_ttl, expected_radii in [(5, [1, 2, 4]), (0, [1, 2, 4, 1])]:
+            store = Mock()
+            store.has_route = Mock(return_value=False)
+            stack_engine = Mock()
+            searcher = _create_searcher(
+                store,
+                stack_engine,
+                cache_ttl=cache_ttl,
+                ring=ExpandingRing(initial_radius=1, max_radius=4, timeout=1),
+            )
+            for _ in range(4):
+                searcher.execute()
+            self.assertEqual(
+                expected_radii,
+                [call[0][0].payload.hops_left for call in stack_engine.send_full_broadcast.call_args_list],
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
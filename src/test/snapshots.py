@@ -0,0 +1,120 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest.mock import Mock, MagicMock
+
+import experimentation
+from routing_experiment import setup, snapshots, frozen
+from routing_experiment.route_storage import RouteStore
+
+
+def _config() -> dict:
+    return {
+        "network": {
+            "node_count": 30,
+            "density": .1,
+        },
+        "routing": {
+            "propagation": {
+                "strategy": "shortest_route",
+            },
+            "searching": False,
+            "route_propagation": True,
+            "self_propagation": True,
+            "broadcast_forwarding_rate": .8,
+            "auto_forward_propagations": True,
+            "random_walk_broadcasting": False,
+            "advertise_link_failures": True,
+        },
+        "link_fail_rate": .05,
+    }
+
+
+class MyTestCase(unittest.TestCase):
+    def test_restored_store_keeps_routes_and_key_order(self):
+        store = RouteStore(0, MagicMock(), Mock(), False, False)
+        store.insert(1, [0], 1)
+        store.insert(2, [0, 1], 2)
+        store.insert(3, [2], 5)
+        store.insert(3, [0, 1, 1], 3)
+        restored = RouteStore(0, MagicMock(), Mock(), False, False)
+
+        restored.restore_segments(store.export_segments())
+
+        self.assertEqual(store.nodes.key_list, restored.nodes.key_list)
+        for target in store.nodes.keys():
+            self.assertEqual(store.nodes[target].edges.key_list, restored.nodes[target].edges.key_list)
+            route, restored_route = store.shortest_route(target), restored.shortest_route(target)
+            self.assertEqual((route.path, route.cost), (restored_route.path, restored_route.cost))
+
+    def test_candidate_starts_from_snapshot(self):
+        warmed = setup.create_candidate(_config(), experimentation.RandomStreams(0).derive("candidate", "warm"))
+        for _ in range(10):
+            warmed.run_step()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.gz")
+            snapshots.save_snapshot(snapshots.take_snapshot(warmed.network, warmed.routers), path)
+            started = setup.create_candidate(
+                experimentation.apply_patch(_config(), {"warm_start": path}),
+                experimentation.RandomStreams(0).derive("candidate", "started"),
+            )
+
+        self.assertEqual(warmed.network.links, started.network.links)
+        for node, started_node in zip(warmed.network.nodes, started.network.nodes):
+            self.assertEqual(node.next_port_num, started_node.next_port_num)
+            self.assertEqual(
+                {num: vars(port) for num, port in node.ports.items()},
+                {num: vars(port) for num, port in started_node.ports.items()},
+            )
+        self.assertEqual(
+            warmed.scrape_metrics(["routability", "efficiency"]),
+            started.scrape_metrics(["routability", "efficiency"]),
+        )
+
+    def test_prepared_scrape_matches_scrape_on_the_frozen_state(self):
+        candidate = setup.create_candidate(_config(), experimentation.RandomStreams(0).derive("candidate", "a"))
+        for _ in range(10):
+            candidate.run_step()
+        metrics = ["routability", "efficiency", "route_store_bytes"]
+        job = pickle.loads(pickle.dumps(candidate.prepare_scrape(metrics)))
+        expected = candidate.scrape_metrics(metrics)
+        for router in candidate.routers:
+            frozen_router = frozen.freeze_router(router)
+            for target in range(len(candidate.network.nodes)):
+                self.assertEqual(router.route(target), frozen_router.route(target))
+        candidate.run_step()
+
+        self.assertEqual(expected, job())
+
+    def test_scrapes_do_not_change_the_simulation(self):
+        config = experimentation.apply_patch(_config(), {"routing": {"store": {"segment_ttl": 3}}})
+        metrics = ["routability", "efficiency"]
+        scraped = setup.create_candidate(config, experimentation.RandomStreams(0).derive("candidate", "a"))
+        unscraped = setup.create_candidate(config, experimentation.RandomStreams(0).derive("candidate", "a"))
+        for _ in range(15):
+            scraped.run_step()
+            unscraped.run_step()
+            scraped.scrape_metrics(metrics)
+            pickle.dumps(scraped.prepare_scrape(metrics))
+
+        for router, unscraped_router in zip(scraped.routers, unscraped.routers):
+            self.assertEqual(router.store.export_segments(), unscraped_router.store.export_segments())
+        self.assertEqual(scraped.scrape_metrics(metrics), unscraped.scrape_metrics(metrics))
+
+    def test_estimated_metrics_do_not_depend_on_where_they_are_scraped(self):
+        config = experimentation.apply_patch(_config(), {"metering": {"estimation": {"min_samples": 50}}})
+        metrics = ["routability", "routability_error"]
+        scraped = setup.create_candidate(config, experimentation.RandomStreams(0).derive("candidate", "a"))
+        prepared = setup.create_candidate(config, experimentation.RandomStreams(0).derive("candidate", "a"))
+        for _ in range(3):
+            for _ in range(5):
+                scraped.run_step()
+                prepared.run_step()
+            job = pickle.loads(pickle.dumps(prepared.prepare_scrape(metrics)))
+
+            self.assertEqual(scraped.scrape_metrics(metrics), job())
+
+
+if __name__ == '__main__':
+    unittest.main()
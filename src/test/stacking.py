@@ -1,3 +1,5 @@
+import math
+import random
 import unittest
 from unittest.mock import Mock
 
@@ -133,6 +135,38 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual([], send_call_args["message"].origin)
         self.assertEqual([2, 3], send_call_args["message"].destination)
 
+    def test_binomial_fan_out(self):
+        rnd = random.Random(0)
+        ports = list(range(8))
+        counts = [stacking._binomial(len(ports), .8 / len(ports), rnd) for _ in range(20000)]
+
+        for count in range(4):
+            expected = math.comb(8, count) * .1 ** count * .9 ** (8 - count)
+            self.assertAlmostEqual(expected, counts.count(count) / len(counts), delta=.01)
+        self.assertEqual(8, stacking._binomial(8, 1.5, rnd))
+        self.assertEqual(0, stacking._binomial(8, 0, rnd))
+
+    def test_send_broadcast_to_sampled_ports(self):
+        adapter = Mock()
+        adapter.ports = Mock(
+            return_value=[0, 1, 2, 3],
+        )
+        engine = stacking.StackEngine(
+            adapter=adapter,
+            rnd=random.Random(0),
+            broadcasting_forwarding_rate=4.0,
+            random_walk_broadcasting=False,
+        )
+        engine.send_datagram(
+            datagram=stacking.Datagram(
+                payload="blabla",
+                origin=[],
+            ),
+        )
+        adapter.send_many.assert_called_once()
+        self.assertEqual([0, 1, 2, 3], sorted(adapter.send_many.call_args[0][0]))
+        self.assertEqual("blabla", adapter.send_many.call_args[0][1].payload)
+
 
 if __name__ == '__main__':
     unittest.main()
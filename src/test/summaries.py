@@ -0,0 +1,97 @@
+import random
+import unittest
+from unittest.mock import Mock, MagicMock
+
+import experimentation
+from routing_experiment import stacking, setup, measurements
+from routing_experiment.demand import PopularityDemandMatrix
+from routing_experiment.recovery import SeenCache
+from routing_experiment.search import Searcher, SearchCache, RouteSearchMessage
+from routing_experiment.summaries import BloomFilter, optimal_filter_shape, NeighborSummaries, SummaryRemover
+
+
+class MyTestCase(unittest.TestCase):
+    def test_bloom_filter_false_positive_rate(self):
+        size, hash_count = optimal_filter_shape(capacity=200, false_positive_rate=0.01)
+        bloom_filter = BloomFilter(size, hash_count)
+        for key in range(0, 400, 2):
+            bloom_filter.add(key)
+
+        self.assertTrue(all(bloom_filter.might_contain(key) for key in range(0, 400, 2)))
+        false_positives = sum(1 for key in range(1, 20001, 2) if bloom_filter.might_contain(key))
+        self.assertLess(false_positives / 10000, 0.02)
+
+    def test_search_is_directed_to_matching_neighbor(self):
+        summaries = NeighborSummaries(size=64, hash_count=2, fanout=1)
+        for port, target in [(1, 5), (2, 6), (3, 7)]:
+            summaries.summaries[port] = BloomFilter(64, 2)
+            summaries.summaries[port].add(target)
+        store = Mock()
+        store.has_route = Mock(return_value=False)
+        stack_engine = Mock()
+        stack_engine.adapter.ports = Mock(return_value=[0, 1, 2, 3])
+        searcher = Searcher(
+            store=store,
+            stacking_engine=stack_engine,
+            rnd=random.Random(0),
+            demand_map=PopularityDemandMatrix([1.0, 1.0]).row(0),
+            cache=SearchCache(ttl=5, request_timeout=5),
+            measurements=MagicMock(),
+            address=0,
+            seen_cache=SeenCache(capacity=100, ttl=10),
+            summaries=summaries,
+        )
+
+        searcher.handle(stacking.Datagram(payload=RouteSearchMessage(6), origin=[0]))
+        searcher.handle(stacking.Datagram(payload=RouteSearchMessage(9), origin=[0]))
+
+        stack_engine.send_on_ports.assert_called_once()
+        self.assertEqual([2], stack_engine.send_on_ports.call_args[0][0])
+        self.assertTrue(stack_engine.send_on_ports.call_args[0][1].payload.directed)
+        stack_engine.send_datagram.assert_called_once()
+        self.assertFalse(stack_engine.send_datagram.call_args[0][0].payload.directed)
+
+    def test_directed_searches_end_without_cache(self):
+        config = {
+            "network": {
+                "node_count": 50,
+                "density": .1,
+            },
+            "routing": {
+                "propagation": {
+                    "strategy": "shortest_route",
+                },
+                "searching": True,
+                "search": {
+                    "summaries": {
+                        "interval": 5,
+                    },
+                },
+                "route_propagation": True,
+                "self_propagation": True,
+                "broadcast_forwarding_rate": .8,
+                "auto_forward_propagations": True,
+                "random_walk_broadcasting": False,
+                "advertise_link_failures": True,
+            },
+            "link_fail_rate": .05,
+        }
+        candidate = setup.create_candidate(config, experimentation.RandomStreams(0).derive("candidate", "a"))
+
+        for _ in range(12):
+            candidate.run_step()
+
+        self.assertGreater(candidate.measurement_reader.session().get(measurements.DIRECTED_SEARCH_COUNT), 0)
+
+    def test_summaries_of_disconnected_ports_are_removed(self):
+        summaries = NeighborSummaries(size=64, hash_count=2, fanout=1)
+        summaries.summaries[1] = BloomFilter(64, 2)
+        summaries.summaries[1].add(5)
+
+        SummaryRemover(summaries).execute(1)
+
+        self.assertEqual([], summaries.matching_ports(5, [0, 1], excluded_port=None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import Mock
+
+import experimentation
+import instrumentation
+from routing_experiment import setup, transport, measurements, net
+from routing_experiment.net import PortNumber
+
+
+class _Relay(net.Adapter.Handler):
+    # forwards a hop counter around a ring until it reaches zero
+    def __init__(self, adapter: net.Adapter):
+        self.adapter = adapter
+        self.received = []
+
+    def handle(self, port_num: PortNumber, message) -> None:
+        self.received.append(message)
+        if message > 0:
+            self.adapter.send(1 - port_num, message - 1)
+
+
+def _config(family: str) -> dict:
+    return {
+        "network": {
+            "node_count": 30,
+            "density": .1,
+            "transport": {
+                "type": family,
+            },
+        },
+        "routing": {
+            "propagation": {
+                "strategy": "shortest_route",
+            },
+            "searching": False,
+            "route_propagation": True,
+            "self_propagation": True,
+            "broadcast_forwarding_rate": .8,
+            "auto_forward_propagations": False,
+            "advertise_link_failures": True,
+        },
+        "link_fail_rate": .01,
+    }
+
+
+class MyTestCase(unittest.TestCase):
+    def test_socket_network_delivers_forwarded_messages(self):
+        for family in ["udp", "unix"]:
+            tracker, reader = instrumentation.setup()
+            network = transport.SocketNetwork(3, tracker, family)
+            relays = []
+            for adapter in network.adapters:
+                relays.append(_Relay(adapter))
+                adapter.register_handler(relays[-1])
+            network.connect(0, 1, 1, 1)
+            network.connect(1, 2, 1, 1)
+            network.connect(2, 0, 1, 1)
+
+            network.adapters[0].send(0, 5)
+            network.end_step()
+            network.close()
+
+            self.assertEqual([3, 0], relays[0].received)
+            self.assertEqual([5, 2], relays[1].received)
+            self.assertEqual([4, 1], relays[2].received)
+            session = reader.session()
+            self.assertEqual(6, session.get(measurements.TRANSMISSION_COUNT))
+            self.assertEqual(0, session.get(measurements.DATAGRAM_LOSS_COUNT))
+
+    def test_datagrams_on_failed_links_are_lost(self):
+        network = transport.SocketNetwork(2, Mock())
+        for adapter in network.adapters:
+            adapter.register_handler(Mock())
+        network.connect(0, 1, 1, 1)
+
+        network.adapters[0].send(0, "message")
+        network.disconnect(0, 0)
+        network.end_step()
+        network.close()
+
+        network.adapters[1].handler.handle.assert_not_called()
+
+    def test_candidate_runs_over_udp(self):
+        candidate = setup.create_candidate(_config("udp"), experimentation.RandomStreams(0))
+        for _ in range(10):
+            candidate.run_step()
+        metrics = candidate.scrape_metrics(["routability", "transmissions_per_second", "datagram_loss_rate"])
+        candidate.close()
+
+        self.assertTrue(candidate.network.loop.is_closed())
+        self.assertTrue(all(transport.is_closing() for transport in candidate.network.transports))
+        self.assertGreater(metrics["routability"], 0)
+        self.assertGreater(metrics["transmissions_per_second"], 0)
+        self.assertEqual(0, metrics["datagram_loss_rate"])
+
+
+if __name__ == '__main__':
+    unittest.main()
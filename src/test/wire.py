@@ -0,0 +1,90 @@
+import unittest
+
+import experimentation
+from routing_experiment import wire, stacking, setup
+from routing_experiment.advertising import RouteAdvertisement, RouteAdvertisementBatch
+from routing_experiment.recovery import LinkFailureAdvertisement
+from routing_experiment.search import RouteSearchMessage
+from routing_experiment.summaries import SummaryAdvertisement, BloomFilter
+
+
+def _config(wire_format: bool) -> dict:
+    return {
+        "network": {
+            "node_count": 30,
+            "density": .1,
+            "wire_format": wire_format,
+        },
+        "routing": {
+            "propagation": {
+                "strategy": "shortest_route",
+            },
+            "searching": False,
+            "route_propagation": True,
+            "self_propagation": True,
+            "broadcast_forwarding_rate": .8,
+            "auto_forward_propagations": True,
+            "random_walk_broadcasting": False,
+            "advertise_link_failures": True,
+        },
+        "link_fail_rate": .01,
+    }
+
+
+class MyTestCase(unittest.TestCase):
+    def test_datagrams_survive_encoding(self):
+        summary = BloomFilter(size=100, hash_count=3)
+        summary.add(7)
+        summary.add(300)
+        datagrams = [
+            stacking.Datagram(payload=RouteAdvertisement(target=5, cost=1.25), origin=[0, 200, 3]),
+            stacking.Datagram(
+                payload=RouteAdvertisementBatch([(1, [2, 3], .5), (70000, [], 0)]),
+                origin=[],
+            ),
+            stacking.Datagram(payload=LinkFailureAdvertisement(failure_id=(9, 130)), origin=[1]),
+            stacking.Datagram(
+                payload=RouteSearchMessage(target=3, hops_left=0, directed=True, search_id=(7, 300)),
+                origin=[4],
+            ),
+            stacking.Datagram(payload=RouteSearchMessage(target=3), origin=[], destination=[1, 2]),
+            stacking.Datagram(payload=SummaryAdvertisement(summary), origin=[]),
+        ]
+
+        for datagram in datagrams:
+            decoded = wire.decode(wire.encode(datagram))
+
+            self.assertEqual(datagram.origin, decoded.origin)
+            self.assertEqual(datagram.destination, decoded.destination)
+            self.assertIs(type(datagram.payload), type(decoded.payload))
+            self.assertEqual(vars(datagram.payload).keys(), vars(decoded.payload).keys())
+            for field, value in vars(datagram.payload).items():
+                if isinstance(value, BloomFilter):
+                    self.assertEqual(vars(value), vars(getattr(decoded.payload, field)))
+                else:
+                    self.assertEqual(value, getattr(decoded.payload, field))
+
+    def test_long_routes_cost_more_bytes(self):
+        short = wire.encode(stacking.Datagram(payload=RouteAdvertisement(target=5, cost=1), origin=[1]))
+        long = wire.encode(stacking.Datagram(payload=RouteAdvertisement(target=5, cost=1), origin=[1] * 50))
+
+        self.assertEqual(49, len(long) - len(short))
+
+    def test_wire_format_matches_in_memory_run(self):
+        results = {}
+        for wire_format in [False, True]:
+            candidate = setup.create_candidate(_config(wire_format), experimentation.RandomStreams(0))
+            for _ in range(10):
+                candidate.run_step()
+            metrics = ["transmissions_per_node", "routability"]
+            if wire_format:
+                metrics.append("bytes_per_node")
+            results[wire_format] = candidate.scrape_metrics(metrics)
+
+        self.assertEqual(results[False]["transmissions_per_node"], results[True]["transmissions_per_node"])
+        self.assertEqual(results[False]["routability"], results[True]["routability"])
+        self.assertGreater(results[True]["bytes_per_node"], results[True]["transmissions_per_node"])
+
+
+if __name__ == '__main__':
+    unittest.main()